@@ -1,11 +1,13 @@
 import database as db
 import sqlalchemy
 from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import aliased
 import cherrypy
 from cgi import escape as html_escape
 from operator import itemgetter
 import json
 import decimal
+import time
 
 
 class Decimal_JSON_Encoder(json.JSONEncoder):
@@ -114,6 +116,9 @@ def filter_query(query, filter_kwargs, table_class):
 
                 call_stack_attr = call_stack_metadata_dict[filter_kwargs[k]]
                 query = query.filter(call_stack_attr == filter_kwargs[v])
+            elif filter_kwargs[k] in ('trace_id', 'span_id') and hasattr(table_class, filter_kwargs[k]):
+                # trace ids are columns of the record tables, not metadata
+                query = query.filter(getattr(table_class, filter_kwargs[k]) == filter_kwargs[v])
             else: # General metadata filter args
                 query = query.filter(table_class.metadata_items.any(and_(db.MetaData.key == filter_kwargs[k], db.MetaData.value == filter_kwargs[v])))
     return query
@@ -256,6 +261,664 @@ def json_aggregate_item(table_class, filter_kwargs, id):
     except:
         return [],0,0
 
+# Get JSON profiler overhead totals per host and stat type
+def json_overhead(filter_kwargs):
+    hostname = aliased(db.MetaData)
+    query = db.session.query(
+            hostname.value.label('hostname'),
+            db.OverheadReport.stat_type,
+            func.count(db.OverheadReport.id).label('flushes'),
+            func.sum(db.OverheadReport.calls).label('calls'),
+            func.sum(db.OverheadReport.overhead).label('overhead'),
+            func.sum(db.OverheadReport.flush).label('flush'),
+            func.sum(db.OverheadReport.wrapped).label('wrapped')
+        )
+    query = query.join(hostname, db.OverheadReport.metadata_items)
+    query = query.filter(hostname.key == 'hostname')
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.OverheadReport)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.OverheadReport.datetime > start_date)
+    if end_date:
+        query = query.filter(db.OverheadReport.datetime < end_date)
+
+    query = query.group_by(hostname.value, db.OverheadReport.stat_type)
+
+    results = []
+    for result in query.all():
+        result = list(result)
+        overhead, flush, wrapped = result[4] or 0, result[5] or 0, result[6] or 0
+        # overhead as a percentage of the work that was profiled
+        result.append(round(100 * (overhead + flush) / wrapped, 3) if wrapped else None)
+        results.append(result)
+    return results
+
+def format_datetime(datetime):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(datetime))
+
+# Get JSON list of the profiling level changes made by client governors
+def json_governor(filter_kwargs):
+    hostname = aliased(db.MetaData)
+    query = db.session.query(
+            db.ProfilingTransition.datetime,
+            hostname.value.label('hostname'),
+            db.ProfilingTransition.stat_type,
+            db.ProfilingTransition.name,
+            db.ProfilingTransition.from_level,
+            db.ProfilingTransition.to_level,
+            db.ProfilingTransition.overhead,
+            db.ProfilingTransition.records
+        )
+    query = query.join(hostname, db.ProfilingTransition.metadata_items)
+    query = query.filter(hostname.key == 'hostname')
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.ProfilingTransition)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.ProfilingTransition.datetime > start_date)
+    if end_date:
+        query = query.filter(db.ProfilingTransition.datetime < end_date)
+
+    query = query.order_by(db.ProfilingTransition.datetime.desc())
+
+    results = []
+    for result in query.all():
+        result = list(result)
+        result[0] = format_datetime(result[0])
+        result[6] = round(100 * result[6], 3)
+        results.append(result)
+    return results
+
+# Get JSON import times per deployment version, heaviest import chains first
+def json_startup(filter_kwargs):
+    version = aliased(db.MetaData)
+    query = db.session.query(
+            version.value.label('version'),
+            db.ImportTime.chain,
+            db.ImportTime.module,
+            func.count(db.ImportTime.id).label('imports'),
+            func.avg(db.ImportTime.duration).label('duration'),
+            func.avg(db.ImportTime.exec_duration).label('exec_duration'),
+            func.max(db.ImportTime.duration).label('max_duration')
+        )
+    query = query.join(version, db.ImportTime.metadata_items)
+    query = query.filter(version.key == 'version')
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.ImportTime)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.ImportTime.datetime > start_date)
+    if end_date:
+        query = query.filter(db.ImportTime.datetime < end_date)
+
+    query = query.group_by(version.value, db.ImportTime.chain, db.ImportTime.module)
+    query = query.order_by(func.avg(db.ImportTime.duration).desc())
+
+    results = []
+    for result in query.all():
+        result = list(result)
+        # times in milliseconds
+        for i in (4, 5, 6):
+            result[i] = round(1000 * (result[i] or 0), 3)
+        results.append(result)
+    return results
+
+# the phases of a handler request, named after the cherrypy hook point each starts at
+REQUEST_PHASES = ('on_start_resource', 'before_request_body', 'before_handler',
+                  'before_finalize', 'on_end_resource')
+
+# Get JSON average time each handler's requests spent in each phase of the request
+def json_phases(filter_kwargs):
+    query = db.session.query(
+            db.CallStackName.module_name,
+            db.CallStackName.class_name,
+            db.CallStackName.fn_name,
+            db.CallStackPhase.phase,
+            func.count(db.CallStackPhase.call_stack_id).label('requests'),
+            func.avg(db.CallStackPhase.duration).label('duration')
+        )
+    query = query.join(db.CallStack, db.CallStackPhase.call_stack)
+    query = query.join(db.CallStackName, db.CallStack.name)
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.CallStack)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.CallStack.datetime > start_date)
+    if end_date:
+        query = query.filter(db.CallStack.datetime < end_date)
+
+    query = query.group_by(db.CallStackName.module_name,
+                           db.CallStackName.class_name,
+                           db.CallStackName.fn_name,
+                           db.CallStackPhase.phase)
+
+    handlers = {}
+    for module_name, class_name, fn_name, phase, requests, duration in query.all():
+        if phase not in REQUEST_PHASES:
+            continue
+        name = str(db.CallStackFullName(module_name, class_name, fn_name))
+        handler = handlers.setdefault(name, {'requests': 0, 'phases': {}})
+        # every request reaches on_start_resource, some skip later phases
+        handler['requests'] = max(handler['requests'], requests)
+        handler['phases'][phase] = duration or 0
+
+    results = []
+    for name, handler in handlers.items():
+        # times in milliseconds
+        durations = [round(1000 * handler['phases'].get(phase, 0), 3) for phase in REQUEST_PHASES]
+        slowest = REQUEST_PHASES[durations.index(max(durations))]
+        results.append([html_escape(name), handler['requests']] + durations + [round(sum(durations), 3), slowest])
+    return results
+
+# upper bounds in bytes of the response size classes, the last has none
+RESPONSE_SIZE_CLASSES = ((1024, '< 1 KB'),
+                         (10 * 1024, '1 - 10 KB'),
+                         (100 * 1024, '10 - 100 KB'),
+                         (1024 * 1024, '100 KB - 1 MB'),
+                         (10 * 1024 * 1024, '1 - 10 MB'),
+                         (None, '> 10 MB'))
+
+# Get JSON handler request durations grouped by handler and response size class
+def json_sizes(filter_kwargs):
+    size_class = sqlalchemy.case([(db.CallStack.response_bytes < limit, i)
+                                  for i, (limit, label) in enumerate(RESPONSE_SIZE_CLASSES[:-1])],
+                                 else_=len(RESPONSE_SIZE_CLASSES) - 1).label('size_class')
+    query = db.session.query(
+            db.CallStackName.module_name,
+            db.CallStackName.class_name,
+            db.CallStackName.fn_name,
+            size_class,
+            func.count(db.CallStack.id).label('requests'),
+            func.avg(db.CallStack.response_bytes).label('response_bytes'),
+            func.avg(db.CallStack.duration).label('duration'),
+            func.max(db.CallStack.duration).label('max_duration')
+        )
+    query = query.join(db.CallStackName, db.CallStack.name)
+    query = query.filter(db.CallStack.response_bytes != None)
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.CallStack)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.CallStack.datetime > start_date)
+    if end_date:
+        query = query.filter(db.CallStack.datetime < end_date)
+
+    query = query.group_by(db.CallStackName.module_name,
+                           db.CallStackName.class_name,
+                           db.CallStackName.fn_name,
+                           size_class)
+
+    results = []
+    for module_name, class_name, fn_name, size_class, requests, response_bytes, duration, max_duration in query.all():
+        name = str(db.CallStackFullName(module_name, class_name, fn_name))
+        # sizes in KB, times in milliseconds
+        results.append([html_escape(name),
+                        RESPONSE_SIZE_CLASSES[size_class][1],
+                        requests,
+                        round((response_bytes or 0) / 1024.0, 3),
+                        round(1000 * (duration or 0), 3),
+                        round(1000 * (max_duration or 0), 3)])
+    return results
+
+# Get JSON rows returned and fetch times per SQL statement, most rows fetched first
+def json_sql_rows(filter_kwargs):
+    query = db.session.query(
+            db.SQLString.sql,
+            func.count(db.SQLStatement.id).label('statements'),
+            func.avg(db.SQLStatement.duration).label('duration'),
+            func.avg(db.SQLStatement.fetch_duration).label('fetch_duration'),
+            func.avg(db.SQLStatement.rows_fetched).label('rows_fetched'),
+            func.max(db.SQLStatement.rows_fetched).label('max_rows_fetched'),
+            func.avg(db.SQLStatement.rowcount).label('rowcount'),
+            func.avg(db.SQLStatement.batch_size).label('batch_size')
+        )
+    query = query.join(db.SQLString, db.SQLStatement.sql_string)
+    query = query.filter(db.SQLStatement.rows_fetched != None)
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.SQLStatement)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.SQLStatement.datetime > start_date)
+    if end_date:
+        query = query.filter(db.SQLStatement.datetime < end_date)
+
+    query = query.group_by(db.SQLString.sql)
+    query = query.order_by(func.avg(db.SQLStatement.rows_fetched).desc())
+
+    results = []
+    for result in query.all():
+        result = list(result)
+        result[0] = html_escape(result[0])
+        # times in milliseconds
+        for i in (2, 3):
+            result[i] = round(1000 * (result[i] or 0), 3)
+        for i in (4, 6, 7):
+            result[i] = round(result[i], 1) if result[i] is not None else None
+        results.append(result)
+    return results
+
+# Get JSON sqlite lock waits per table and blocked statement type
+def json_sql_locks(filter_kwargs):
+    def lock_query(with_identifiers):
+        statement_type = aliased(db.MetaData)
+        identifier = aliased(db.MetaData)
+        query = db.session.query(
+                identifier.value if with_identifiers else sqlalchemy.literal(''),
+                statement_type.value,
+                func.count(db.SQLStatement.id).label('statements'),
+                func.sum(db.SQLStatement.lock_wait).label('total_wait'),
+                func.avg(db.SQLStatement.lock_wait).label('avg_wait'),
+                func.max(db.SQLStatement.lock_wait).label('max_wait'),
+                func.sum(db.SQLStatement.lock_retries).label('retries'),
+                func.sum(sqlalchemy.case([(db.SQLStatement.lock_timeout == True, 1)], else_=0)).label('timeouts')
+            )
+        query = query.join(statement_type, db.SQLStatement.metadata_items)
+        query = query.filter(statement_type.key == 'statement_type')
+        if with_identifiers:
+            query = query.join(identifier, db.SQLStatement.metadata_items)
+            query = query.filter(identifier.key == 'statement_identifiers')
+        else:
+            # commits name no tables
+            query = query.filter(statement_type.value == 'COMMIT')
+        query = query.filter(db.SQLStatement.lock_retries > 0)
+
+        # Filter data based on the key/value pairs picked in the side bar
+        query = filter_query(query, filter_kwargs, db.SQLStatement)
+
+        start_date = filter_kwargs.get('start_date', None)
+        end_date = filter_kwargs.get('end_date', None)
+        if start_date:
+            query = query.filter(db.SQLStatement.datetime > start_date)
+        if end_date:
+            query = query.filter(db.SQLStatement.datetime < end_date)
+
+        if with_identifiers:
+            return query.group_by(identifier.value, statement_type.value)
+        return query.group_by(statement_type.value)
+
+    results = []
+    for result in lock_query(True).all() + lock_query(False).all():
+        result = list(result)
+        result[0] = html_escape(result[0])
+        result[1] = html_escape(result[1])
+        # times in milliseconds
+        for i in (3, 4, 5):
+            result[i] = round(1000 * (result[i] or 0), 3)
+        results.append(result)
+    return results
+
+# Get JSON connection and transaction totals per host and database
+def json_transactions(filter_kwargs):
+    hostname = aliased(db.MetaData)
+    query = db.session.query(
+            hostname.value.label('hostname'),
+            db.Transaction.database,
+            db.Transaction.target,
+            db.Transaction.event,
+            func.count(db.Transaction.id).label('events'),
+            func.avg(db.Transaction.duration).label('duration'),
+            func.avg(db.Transaction.transaction_duration).label('transaction_duration'),
+            func.max(db.Transaction.transaction_duration).label('max_transaction_duration')
+        )
+    query = query.join(hostname, db.Transaction.metadata_items)
+    query = query.filter(hostname.key == 'hostname')
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.Transaction)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.Transaction.datetime > start_date)
+    if end_date:
+        query = query.filter(db.Transaction.datetime < end_date)
+
+    query = query.group_by(hostname.value, db.Transaction.database, db.Transaction.target, db.Transaction.event)
+
+    targets = {}
+    for host, database, target, event, events, duration, transaction_duration, max_transaction_duration in query.all():
+        totals = targets.setdefault((host, database, target), {})
+        totals[event] = (events, duration or 0, transaction_duration, max_transaction_duration)
+
+    results = []
+    for (host, database, target), totals in targets.items():
+        connects, connect_duration = totals.get('connect', (0, 0))[:2]
+        commits, commit_duration, commit_span, max_commit_span = totals.get('commit', (0, 0, None, None))
+        rollbacks, rollback_duration, rollback_span, max_rollback_span = totals.get('rollback', (0, 0, None, None))
+        # transactions ended by either a commit or a rollback
+        spans = [(count, span) for count, span in ((commits, commit_span), (rollbacks, rollback_span)) if span is not None]
+        span = sum(count * span for count, span in spans) / sum(count for count, span in spans) if spans else 0
+        max_span = max([value for value in (max_commit_span, max_rollback_span) if value is not None] or [0])
+        # times in milliseconds
+        results.append([host, database, html_escape(target or ''),
+                        connects, round(1000 * connect_duration, 3),
+                        commits, round(1000 * commit_duration, 3),
+                        rollbacks, round(1000 * rollback_duration, 3),
+                        round(1000 * span, 3), round(1000 * max_span, 3)])
+    return results
+
+# Get JSON EXPLAIN plans per SQL string, and when the shape of their plan last changed
+def json_sql_plans(filter_kwargs):
+    query = db.session.query(db.SQLPlan, db.SQLString.sql)
+    query = query.join(db.SQLString, db.SQLPlan.sql_string)
+    query = query.join(db.SQLStatement, db.SQLPlan.sql_statement)
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.SQLStatement)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.SQLPlan.datetime > start_date)
+    if end_date:
+        query = query.filter(db.SQLPlan.datetime < end_date)
+
+    query = query.order_by(db.SQLPlan.datetime)
+
+    strings = {}
+    for sql_plan, sql in query.all():
+        # [plans, shapes, shape changes, last change, latest plan]
+        totals = strings.setdefault(sql, [0, set(), 0, None, None])
+        totals[0] += 1
+        totals[1].add(sql_plan.shape)
+        if sql_plan.shape_changed:
+            totals[2] += 1
+            totals[3] = sql_plan.datetime
+        totals[4] = sql_plan
+
+    results = []
+    for sql, (plans, shapes, changes, last_change, latest) in strings.items():
+        results.append([html_escape(sql),
+                        plans,
+                        len(shapes),
+                        changes,
+                        format_datetime(last_change) if last_change else '',
+                        'yes' if latest.analyzed else 'no',
+                        '<pre>{0}</pre>'.format(html_escape(latest.plan))])
+    return results
+
+# Get JSON outbound HTTP request timings per host, method and path
+def json_http_requests(filter_kwargs):
+    query = db.session.query(
+            db.HTTPRequest.host,
+            db.HTTPRequest.method,
+            db.HTTPRequest.path,
+            func.count(db.HTTPRequest.id).label('requests'),
+            # requests which got no response, or a server error
+            func.sum(sqlalchemy.case([(or_(db.HTTPRequest.status == None, db.HTTPRequest.status >= 500), 1)],
+                                     else_=0)).label('failures'),
+            func.avg(db.HTTPRequest.dns).label('dns'),
+            func.avg(db.HTTPRequest.connect).label('connect'),
+            func.avg(db.HTTPRequest.ttfb).label('ttfb'),
+            func.avg(db.HTTPRequest.duration).label('duration'),
+            func.max(db.HTTPRequest.duration).label('max_duration'),
+            func.avg(db.HTTPRequest.request_bytes).label('request_bytes'),
+            func.avg(db.HTTPRequest.response_bytes).label('response_bytes')
+        )
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.HTTPRequest)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.HTTPRequest.datetime > start_date)
+    if end_date:
+        query = query.filter(db.HTTPRequest.datetime < end_date)
+
+    query = query.group_by(db.HTTPRequest.host, db.HTTPRequest.method, db.HTTPRequest.path)
+    query = query.order_by(func.avg(db.HTTPRequest.duration).desc())
+
+    results = []
+    for result in query.all():
+        result = list(result)
+        for i in (0, 1, 2):
+            result[i] = html_escape(result[i])
+        # times in milliseconds
+        for i in (5, 6, 7, 8, 9):
+            result[i] = round(1000 * (result[i] or 0), 3)
+        for i in (10, 11):
+            result[i] = round(result[i] or 0, 1)
+        results.append(result)
+    return results
+
+# Get JSON leaderboard of the most waited on locks, per site they are made on
+def json_lock_contention(filter_kwargs):
+    query = db.session.query(
+            db.LockStat.site,
+            db.LockStat.kind,
+            func.sum(db.LockStat.acquisitions).label('acquisitions'),
+            func.sum(db.LockStat.contended).label('contended'),
+            func.sum(db.LockStat.wait).label('wait'),
+            func.max(db.LockStat.max_wait).label('max_wait'),
+            func.sum(db.LockStat.hold).label('hold'),
+            func.max(db.LockStat.max_hold).label('max_hold')
+        )
+    callers_query = db.session.query(db.LockStat.site, db.LockStat.kind, db.LockStat.callers)
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.LockStat)
+    callers_query = filter_query(callers_query, filter_kwargs, db.LockStat)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.LockStat.datetime > start_date)
+        callers_query = callers_query.filter(db.LockStat.datetime > start_date)
+    if end_date:
+        query = query.filter(db.LockStat.datetime < end_date)
+        callers_query = callers_query.filter(db.LockStat.datetime < end_date)
+
+    query = query.group_by(db.LockStat.site, db.LockStat.kind)
+    query = query.order_by(func.sum(db.LockStat.wait).desc())
+
+    # each flush only sends its top call sites, total them over the flushes
+    callers = {}
+    for site, kind, site_callers in callers_query.all():
+        totals = callers.setdefault((site, kind), {})
+        for caller, count, wait in json.loads(site_callers):
+            total = totals.setdefault(caller, [0, 0.0])
+            total[0] += count
+            total[1] += wait
+
+    results = []
+    for site, kind, acquisitions, contended, wait, max_wait, hold, max_hold in query.all():
+        top_callers = sorted(callers.get((site, kind), {}).items(), key=lambda caller: caller[1][1], reverse=True)
+        results.append([html_escape(site),
+                        html_escape(kind),
+                        acquisitions,
+                        contended,
+                        round(100.0 * contended / acquisitions, 1) if acquisitions else 0,
+                        # times in milliseconds
+                        round(1000 * (wait or 0), 3),
+                        round(1000 * wait / contended, 3) if contended else 0,
+                        round(1000 * (max_wait or 0), 3),
+                        round(1000 * (hold or 0) / acquisitions, 3) if acquisitions else 0,
+                        round(1000 * (max_hold or 0), 3),
+                        '<br>'.join('{0} ({1}, {2} ms)'.format(html_escape(caller), count, round(1000 * caller_wait, 3))
+                                    for caller, (count, caller_wait) in top_callers[:5])])
+    return results
+
+# Get JSON child process timings per command
+def json_subprocesses(filter_kwargs):
+    query = db.session.query(
+            db.Subprocess.command,
+            func.count(db.Subprocess.id).label('runs'),
+            # children which couldn't be started, or exited with an error
+            func.sum(sqlalchemy.case([(or_(db.Subprocess.exit_code == None, db.Subprocess.exit_code != 0), 1)],
+                                     else_=0)).label('failures'),
+            func.sum(db.Subprocess.duration).label('total_duration'),
+            func.avg(db.Subprocess.duration).label('duration'),
+            func.max(db.Subprocess.duration).label('max_duration'),
+            func.sum(db.Subprocess.cpu).label('total_cpu'),
+            func.avg(db.Subprocess.cpu).label('cpu'),
+            func.avg(db.Subprocess.max_rss).label('max_rss'),
+            func.max(db.Subprocess.max_rss).label('peak_rss')
+        )
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.Subprocess)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.Subprocess.datetime > start_date)
+    if end_date:
+        query = query.filter(db.Subprocess.datetime < end_date)
+
+    query = query.group_by(db.Subprocess.command)
+    query = query.order_by(func.sum(db.Subprocess.duration).desc())
+
+    results = []
+    for result in query.all():
+        result = list(result)
+        result[0] = html_escape(result[0])
+        # times in milliseconds
+        for i in (3, 4, 5, 6, 7):
+            result[i] = round(1000 * (result[i] or 0), 3)
+        for i in (8, 9):
+            result[i] = round(result[i] or 0, 1)
+        results.append(result)
+    return results
+
+# Get JSON list of traces, the handler requests of each joined into a tree of the services they called
+def json_traces(filter_kwargs):
+    query = db.session.query(db.CallStack.id).filter(
+            db.CallStack.trace_id != None,
+            # handler records, function records have no status
+            db.CallStack.status != None)
+
+    # Filter data based on the key/value pairs picked in the side bar
+    query = filter_query(query, filter_kwargs, db.CallStack)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.CallStack.datetime > start_date)
+    if end_date:
+        query = query.filter(db.CallStack.datetime < end_date)
+
+    association = db.call_stack_metadata_association_table
+    stacks = query.subquery()
+    spans = {}
+    for call_stack in db.session.query(db.CallStack).join(db.CallStack.name).filter(db.CallStack.id.in_(stacks)):
+        spans[call_stack.id] = {'datetime': call_stack.datetime,
+                                'duration': call_stack.duration or 0.0,
+                                # apps mounted elsewhere can have the same routes
+                                'name': '{0} {1}'.format(call_stack.name.class_name, call_stack.name.fn_name),
+                                'status': call_stack.status,
+                                'trace_id': call_stack.trace_id,
+                                'span_id': call_stack.span_id,
+                                'parent_span': call_stack.parent_span}
+    hostnames = db.session.query(association.c.call_stack_id, db.MetaData.value)
+    hostnames = hostnames.join(db.MetaData, db.MetaData.id == association.c.metadata_id)
+    hostnames = hostnames.filter(association.c.call_stack_id.in_(stacks), db.MetaData.key == 'hostname')
+    for call_stack_id, hostname in hostnames:
+        spans[call_stack_id]['hostname'] = hostname
+
+    # the SQL, outbound requests and child processes run in each span
+    work = {}
+    span_ids = db.session.query(db.CallStack.span_id).filter(db.CallStack.id.in_(stacks))
+    for label, table in (('sql', db.SQLStatement), ('http', db.HTTPRequest), ('subprocess', db.Subprocess)):
+        work_query = db.session.query(table.span_id, func.count(table.id), func.sum(table.duration))
+        work_query = work_query.filter(table.span_id.in_(span_ids.subquery()))
+        for span, count, duration in work_query.group_by(table.span_id):
+            work.setdefault(span, []).append('{0} {1} {2} ms'.format(count, label, round(1000 * (duration or 0), 3)))
+
+    traces = {}
+    for span in spans.values():
+        if span['span_id'] is not None:
+            traces.setdefault(span['trace_id'], {})[span['span_id']] = span
+
+    results = []
+    for trace_id, trace in traces.items():
+        children = {}
+        for span in trace.values():
+            # a span whose caller wasn't traced, or hasn't been flushed yet, is a root
+            parent = span['parent_span'] if span['parent_span'] in trace else None
+            children.setdefault(parent, []).append(span)
+        start = min(span['datetime'] for span in trace.values())
+        end = max(span['datetime'] + span['duration'] for span in trace.values())
+
+        lines = []
+        def add_spans(parent, depth):
+            for span in sorted(children.get(parent, []), key=itemgetter('datetime')):
+                # time not spent waiting on the services it called
+                own = span['duration'] - sum(child['duration'] for child in children.get(span['span_id'], []))
+                line = '{0}{1} {2} ({3}): {4} ms, own {5} ms, at +{6} ms'.format(
+                        '&nbsp;' * 4 * depth,
+                        html_escape(span.get('hostname', '')),
+                        html_escape(span['name']),
+                        span['status'],
+                        round(1000 * span['duration'], 3),
+                        round(1000 * max(own, 0.0), 3),
+                        round(1000 * (span['datetime'] - start), 3))
+                if span['span_id'] in work:
+                    line += ' [{0}]'.format(', '.join(work[span['span_id']]))
+                lines.append(line)
+                add_spans(span['span_id'], depth + 1)
+        add_spans(None, 0)
+
+        roots = sorted(children[None], key=itemgetter('datetime'))
+        results.append([html_escape(trace_id),
+                        format_datetime(start),
+                        len(set(span.get('hostname') for span in trace.values())),
+                        len(trace),
+                        round(1000 * (end - start), 3),
+                        html_escape(roots[0]['name']),
+                        '<br>'.join(lines)])
+    return results
+
+# Get JSON list of deep captures and how many records each has captured so far
+def json_deep_captures(filter_kwargs):
+    query = db.session.query(db.DeepCapture)
+
+    start_date = filter_kwargs.get('start_date', None)
+    end_date = filter_kwargs.get('end_date', None)
+    if start_date:
+        query = query.filter(db.DeepCapture.datetime > start_date)
+    if end_date:
+        query = query.filter(db.DeepCapture.datetime < end_date)
+
+    query = query.order_by(db.DeepCapture.datetime.desc())
+
+    now = time.time()
+    results = []
+    for deep_capture in query.all():
+        # captured records are tagged with the capture's id
+        tag = db.session.query(db.MetaData).filter_by(key='deep_capture', value=str(deep_capture.id)).first()
+        call_stacks = len(tag.call_stacks) if tag else 0
+        sql_statements = len(tag.sql_statements) if tag else 0
+        link = '<a href="/{0}?key_0=deep_capture&value_0={1}">{2}</a>'
+        results.append([deep_capture.id,
+                        format_datetime(deep_capture.datetime),
+                        html_escape(deep_capture.handler),
+                        deep_capture.requests,
+                        html_escape(deep_capture.match),
+                        'active' if deep_capture.expires > now else 'expired',
+                        link.format('callstacks', deep_capture.id, call_stacks),
+                        link.format('sqlstatements', deep_capture.id, sql_statements)])
+    return results
+
 class AggregateAPI(object):
     @cherrypy.expose
     @cherrypy.tools.json_out(handler=json_handler)
@@ -284,5 +947,86 @@ class AggregateAPI(object):
         else:
             return json_aggregate(db.FileAccess, filter_kwargs, table_kwargs)
 
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def overhead(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_overhead(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def profilinglevels(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_governor(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def deepcaptures(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_deep_captures(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def startupimports(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_startup(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def requestphases(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_phases(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def responsesizes(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_sizes(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def sqlrows(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_sql_rows(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def transactions(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_transactions(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def sqlplans(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_sql_plans(filter_kwargs)
 
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def sqllocks(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_sql_locks(filter_kwargs)
 
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def httprequests(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_http_requests(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def lockcontention(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_lock_contention(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def subprocesses(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_subprocesses(filter_kwargs)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out(handler=json_handler)
+    def traces(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        return json_traces(filter_kwargs)
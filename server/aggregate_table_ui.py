@@ -85,3 +85,137 @@ class AggregatePages(object):
             
             mytemplate = Template(filename=os.path.join(self.templates_dir,'aggregatefileaccesses.html'), lookup=self.template_lookup)
             return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def overhead(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'overhead.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def profilinglevels(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'profilinglevels.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def deepcaptures(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'deepcaptures.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def startupimports(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'startupimports.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def requestphases(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'requestphases.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def responsesizes(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'responsesizes.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def sqlrows(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'sqlrows.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def transactions(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'transactions.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def sqlplans(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'sqlplans.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def sqllocks(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'sqllocks.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def httprequests(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'httprequests.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def lockcontention(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'lockcontention.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def subprocesses(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'subprocesses.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def traces(self, **kwargs):
+        table_kwargs, filter_kwargs = parse_kwargs(kwargs)
+        for k in filter_kwargs:
+            filter_kwargs[k] = str(filter_kwargs[k])
+
+        mytemplate = Template(filename=os.path.join(self.templates_dir,'traces.html'), lookup=self.template_lookup)
+        return mytemplate.render(kwargs=filter_kwargs)
+
+    @cherrypy.expose
+    def profiled(self, id):
+        # requests profiled with the X-CPF-Profile header are tagged with profile_id
+        tag = db.session.query(db.MetaData).filter_by(key='profile_id', value=id).first()
+        if tag is None or not tag.call_stacks:
+            raise cherrypy.HTTPError(404, 'No profile with that id yet, it is sent on the client\'s next flush.')
+        raise cherrypy.HTTPRedirect('/tables/callstacks/{0}'.format(tag.call_stacks[0].id))
@@ -0,0 +1,28 @@
+"""add call stack sizes
+
+Revision ID: 1e6f9b2d8a47
+Revises: d72b18e4c6f5
+Create Date: 2026-10-19 20:31:15.084000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1e6f9b2d8a47'
+down_revision = 'd72b18e4c6f5'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('call_stacks', sa.Column('request_bytes', sa.Integer))
+    op.add_column('call_stacks', sa.Column('response_bytes', sa.Integer))
+    op.add_column('call_stacks', sa.Column('status', sa.Integer))
+    op.add_column('call_stacks', sa.Column('query_params', sa.Integer))
+
+
+def downgrade():
+    op.drop_column('call_stacks', 'query_params')
+    op.drop_column('call_stacks', 'status')
+    op.drop_column('call_stacks', 'response_bytes')
+    op.drop_column('call_stacks', 'request_bytes')
@@ -0,0 +1,37 @@
+"""add overhead reports
+
+Revision ID: 4a7e2c91d3f0
+Revises: 25606b7db808
+Create Date: 2026-10-19 10:12:31.402000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4a7e2c91d3f0'
+down_revision = '25606b7db808'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'overhead_reports',
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('datetime', sa.Float),
+                    sa.Column('stat_type', sa.String),
+                    sa.Column('calls', sa.Integer),
+                    sa.Column('overhead', sa.Float),
+                    sa.Column('wrapped', sa.Float),
+                    sa.Column('flush', sa.Float)
+                    )
+    op.create_table(
+                    'overhead_report_metadata_association',
+                    sa.Column('overhead_report_id', sa.Integer, sa.ForeignKey('overhead_reports.id'), primary_key=True),
+                    sa.Column('metadata_id', sa.Integer, sa.ForeignKey('metadata_items.id'), primary_key=True)
+                    )
+
+
+def downgrade():
+    op.drop_table('overhead_report_metadata_association')
+    op.drop_table('overhead_reports')
@@ -0,0 +1,32 @@
+"""add sql plans
+
+Revision ID: 4c8e1f6a2d53
+Revises: f3a7c2e9b815
+Create Date: 2026-10-19 22:31:47.205000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4c8e1f6a2d53'
+down_revision = 'f3a7c2e9b815'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'sql_plans',
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('sql_string_id', sa.Integer, sa.ForeignKey('sql_strings.id')),
+                    sa.Column('sql_statement_id', sa.Integer, sa.ForeignKey('sql_statements.id')),
+                    sa.Column('datetime', sa.Float),
+                    sa.Column('plan', sa.String),
+                    sa.Column('shape', sa.String),
+                    sa.Column('analyzed', sa.Boolean),
+                    sa.Column('shape_changed', sa.Boolean)
+                    )
+
+
+def downgrade():
+    op.drop_table('sql_plans')
@@ -0,0 +1,30 @@
+"""add call stack spans
+
+Revision ID: 5f0b2d9c7e41
+Revises: c41d7e0a9b35
+Create Date: 2026-10-19 17:05:33.902000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5f0b2d9c7e41'
+down_revision = 'c41d7e0a9b35'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'call_stack_spans',
+                    sa.Column('call_stack_id', sa.Integer, sa.ForeignKey('call_stacks.id'), primary_key=True),
+                    sa.Column('index', sa.Integer, primary_key=True),
+                    sa.Column('name', sa.String),
+                    sa.Column('start', sa.Float),
+                    sa.Column('duration', sa.Float),
+                    sa.Column('depth', sa.Integer)
+                    )
+
+
+def downgrade():
+    op.drop_table('call_stack_spans')
@@ -0,0 +1,28 @@
+"""add sql statement rows
+
+Revision ID: 6b4d0a8e3f12
+Revises: 1e6f9b2d8a47
+Create Date: 2026-10-19 21:14:52.390000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '6b4d0a8e3f12'
+down_revision = '1e6f9b2d8a47'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('sql_statements', sa.Column('rowcount', sa.Integer))
+    op.add_column('sql_statements', sa.Column('rows_fetched', sa.Integer))
+    op.add_column('sql_statements', sa.Column('fetch_duration', sa.Float))
+    op.add_column('sql_statements', sa.Column('batch_size', sa.Integer))
+
+
+def downgrade():
+    op.drop_column('sql_statements', 'batch_size')
+    op.drop_column('sql_statements', 'fetch_duration')
+    op.drop_column('sql_statements', 'rows_fetched')
+    op.drop_column('sql_statements', 'rowcount')
@@ -0,0 +1,38 @@
+"""add profiling transitions
+
+Revision ID: 7d03b5e8a1c6
+Revises: 4a7e2c91d3f0
+Create Date: 2026-10-19 11:40:05.118000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7d03b5e8a1c6'
+down_revision = '4a7e2c91d3f0'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'profiling_transitions',
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('datetime', sa.Float),
+                    sa.Column('stat_type', sa.String),
+                    sa.Column('name', sa.String),
+                    sa.Column('from_level', sa.String),
+                    sa.Column('to_level', sa.String),
+                    sa.Column('overhead', sa.Float),
+                    sa.Column('records', sa.Integer)
+                    )
+    op.create_table(
+                    'profiling_transition_metadata_association',
+                    sa.Column('profiling_transition_id', sa.Integer, sa.ForeignKey('profiling_transitions.id'), primary_key=True),
+                    sa.Column('metadata_id', sa.Integer, sa.ForeignKey('metadata_items.id'), primary_key=True)
+                    )
+
+
+def downgrade():
+    op.drop_table('profiling_transition_metadata_association')
+    op.drop_table('profiling_transitions')
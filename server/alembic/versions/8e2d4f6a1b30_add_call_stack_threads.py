@@ -0,0 +1,29 @@
+"""add call stack threads
+
+Revision ID: 8e2d4f6a1b30
+Revises: 5f0b2d9c7e41
+Create Date: 2026-10-19 18:12:07.415000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8e2d4f6a1b30'
+down_revision = '5f0b2d9c7e41'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'call_stack_threads',
+                    sa.Column('call_stack_id', sa.Integer, sa.ForeignKey('call_stacks.id'), primary_key=True),
+                    sa.Column('index', sa.Integer, primary_key=True),
+                    sa.Column('name', sa.String),
+                    sa.Column('wall', sa.Float),
+                    sa.Column('cpu', sa.Float)
+                    )
+
+
+def downgrade():
+    op.drop_table('call_stack_threads')
@@ -0,0 +1,26 @@
+"""add sql statement lock waits
+
+Revision ID: 9d2f5b7c3e60
+Revises: 4c8e1f6a2d53
+Create Date: 2026-10-19 23:05:16.482000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9d2f5b7c3e60'
+down_revision = '4c8e1f6a2d53'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('sql_statements', sa.Column('lock_wait', sa.Float))
+    op.add_column('sql_statements', sa.Column('lock_retries', sa.Integer))
+    op.add_column('sql_statements', sa.Column('lock_timeout', sa.Boolean))
+
+
+def downgrade():
+    op.drop_column('sql_statements', 'lock_timeout')
+    op.drop_column('sql_statements', 'lock_retries')
+    op.drop_column('sql_statements', 'lock_wait')
@@ -0,0 +1,26 @@
+"""add call stack streams
+
+Revision ID: a9c3e5f71d28
+Revises: 8e2d4f6a1b30
+Create Date: 2026-10-19 19:03:41.260000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a9c3e5f71d28'
+down_revision = '8e2d4f6a1b30'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('call_stacks', sa.Column('first_chunk', sa.Float))
+    op.add_column('call_stacks', sa.Column('stream_duration', sa.Float))
+    op.add_column('call_stacks', sa.Column('stream_bytes', sa.Integer))
+
+
+def downgrade():
+    op.drop_column('call_stacks', 'stream_bytes')
+    op.drop_column('call_stacks', 'stream_duration')
+    op.drop_column('call_stacks', 'first_chunk')
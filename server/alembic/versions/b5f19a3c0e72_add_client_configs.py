@@ -0,0 +1,28 @@
+"""add client configs
+
+Revision ID: b5f19a3c0e72
+Revises: 7d03b5e8a1c6
+Create Date: 2026-10-19 13:02:47.551000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b5f19a3c0e72'
+down_revision = '7d03b5e8a1c6'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'client_configs',
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('datetime', sa.Float),
+                    sa.Column('match', sa.String),
+                    sa.Column('config', sa.String)
+                    )
+
+
+def downgrade():
+    op.drop_table('client_configs')
@@ -0,0 +1,43 @@
+"""add http requests
+
+Revision ID: b7e3a9d1c428
+Revises: 9d2f5b7c3e60
+Create Date: 2026-10-19 23:38:02.771000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3a9d1c428'
+down_revision = '9d2f5b7c3e60'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'http_requests',
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('datetime', sa.Float),
+                    sa.Column('host', sa.String),
+                    sa.Column('method', sa.String),
+                    sa.Column('path', sa.String),
+                    sa.Column('status', sa.Integer),
+                    sa.Column('error', sa.String),
+                    sa.Column('dns', sa.Float),
+                    sa.Column('connect', sa.Float),
+                    sa.Column('ttfb', sa.Float),
+                    sa.Column('duration', sa.Float),
+                    sa.Column('request_bytes', sa.Integer),
+                    sa.Column('response_bytes', sa.Integer)
+                    )
+    op.create_table(
+                    'http_request_metadata_association',
+                    sa.Column('http_request_id', sa.Integer, sa.ForeignKey('http_requests.id'), primary_key=True),
+                    sa.Column('metadata_id', sa.Integer, sa.ForeignKey('metadata_items.id'), primary_key=True)
+                    )
+
+
+def downgrade():
+    op.drop_table('http_request_metadata_association')
+    op.drop_table('http_requests')
@@ -0,0 +1,38 @@
+"""add import times
+
+Revision ID: c41d7e0a9b35
+Revises: e3a8d61f2b94
+Create Date: 2026-10-19 16:40:12.318000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e0a9b35'
+down_revision = 'e3a8d61f2b94'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'import_times',
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('datetime', sa.Float),
+                    sa.Column('module', sa.String),
+                    sa.Column('parent', sa.String),
+                    sa.Column('chain', sa.String),
+                    sa.Column('depth', sa.Integer),
+                    sa.Column('duration', sa.Float),
+                    sa.Column('exec_duration', sa.Float)
+                    )
+    op.create_table(
+                    'import_time_metadata_association',
+                    sa.Column('import_time_id', sa.Integer, sa.ForeignKey('import_times.id'), primary_key=True),
+                    sa.Column('metadata_id', sa.Integer, sa.ForeignKey('metadata_items.id'), primary_key=True)
+                    )
+
+
+def downgrade():
+    op.drop_table('import_time_metadata_association')
+    op.drop_table('import_times')
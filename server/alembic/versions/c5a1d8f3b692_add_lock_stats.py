@@ -0,0 +1,41 @@
+"""add lock stats
+
+Revision ID: c5a1d8f3b692
+Revises: b7e3a9d1c428
+Create Date: 2026-10-19 23:52:17.408213
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c5a1d8f3b692'
+down_revision = 'b7e3a9d1c428'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'lock_stats',
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('datetime', sa.Float),
+                    sa.Column('site', sa.String),
+                    sa.Column('kind', sa.String),
+                    sa.Column('acquisitions', sa.Integer),
+                    sa.Column('contended', sa.Integer),
+                    sa.Column('wait', sa.Float),
+                    sa.Column('max_wait', sa.Float),
+                    sa.Column('hold', sa.Float),
+                    sa.Column('max_hold', sa.Float),
+                    sa.Column('callers', sa.String)
+                    )
+    op.create_table(
+                    'lock_stat_metadata_association',
+                    sa.Column('lock_stat_id', sa.Integer, sa.ForeignKey('lock_stats.id'), primary_key=True),
+                    sa.Column('metadata_id', sa.Integer, sa.ForeignKey('metadata_items.id'), primary_key=True)
+                    )
+
+
+def downgrade():
+    op.drop_table('lock_stat_metadata_association')
+    op.drop_table('lock_stats')
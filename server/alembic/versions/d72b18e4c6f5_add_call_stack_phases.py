@@ -0,0 +1,27 @@
+"""add call stack phases
+
+Revision ID: d72b18e4c6f5
+Revises: a9c3e5f71d28
+Create Date: 2026-10-19 19:48:22.731000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd72b18e4c6f5'
+down_revision = 'a9c3e5f71d28'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'call_stack_phases',
+                    sa.Column('call_stack_id', sa.Integer, sa.ForeignKey('call_stacks.id'), primary_key=True),
+                    sa.Column('phase', sa.String, primary_key=True),
+                    sa.Column('duration', sa.Float)
+                    )
+
+
+def downgrade():
+    op.drop_table('call_stack_phases')
@@ -0,0 +1,38 @@
+"""add subprocesses
+
+Revision ID: d8b4f2a6e173
+Revises: c5a1d8f3b692
+Create Date: 2026-10-19 23:58:41.062734
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd8b4f2a6e173'
+down_revision = 'c5a1d8f3b692'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'subprocesses',
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('datetime', sa.Float),
+                    sa.Column('command', sa.String),
+                    sa.Column('exit_code', sa.Integer),
+                    sa.Column('error', sa.String),
+                    sa.Column('duration', sa.Float),
+                    sa.Column('cpu', sa.Float),
+                    sa.Column('max_rss', sa.Integer)
+                    )
+    op.create_table(
+                    'subprocess_metadata_association',
+                    sa.Column('subprocess_id', sa.Integer, sa.ForeignKey('subprocesses.id'), primary_key=True),
+                    sa.Column('metadata_id', sa.Integer, sa.ForeignKey('metadata_items.id'), primary_key=True)
+                    )
+
+
+def downgrade():
+    op.drop_table('subprocess_metadata_association')
+    op.drop_table('subprocesses')
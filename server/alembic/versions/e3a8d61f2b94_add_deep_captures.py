@@ -0,0 +1,30 @@
+"""add deep captures
+
+Revision ID: e3a8d61f2b94
+Revises: b5f19a3c0e72
+Create Date: 2026-10-19 15:21:09.114000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e3a8d61f2b94'
+down_revision = 'b5f19a3c0e72'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'deep_captures',
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('datetime', sa.Float),
+                    sa.Column('expires', sa.Float),
+                    sa.Column('match', sa.String),
+                    sa.Column('handler', sa.String),
+                    sa.Column('requests', sa.Integer)
+                    )
+
+
+def downgrade():
+    op.drop_table('deep_captures')
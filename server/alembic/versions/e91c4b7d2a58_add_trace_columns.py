@@ -0,0 +1,36 @@
+"""add trace columns
+
+Revision ID: e91c4b7d2a58
+Revises: d8b4f2a6e173
+Create Date: 2026-10-20 00:41:09.517302
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e91c4b7d2a58'
+down_revision = 'd8b4f2a6e173'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# the record tables which are tagged with the trace and span they were made in
+TABLES = ('call_stacks', 'sql_statements', 'file_accesses', 'transactions', 'http_requests', 'subprocesses')
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('trace_id', sa.String))
+        op.add_column(table, sa.Column('span_id', sa.String))
+        op.create_index('ix_{0}_trace_id'.format(table), table, ['trace_id'])
+        op.create_index('ix_{0}_span_id'.format(table), table, ['span_id'])
+    op.add_column('call_stacks', sa.Column('parent_span', sa.String))
+
+
+def downgrade():
+    op.drop_column('call_stacks', 'parent_span')
+    for table in TABLES:
+        op.drop_index('ix_{0}_span_id'.format(table), table)
+        op.drop_index('ix_{0}_trace_id'.format(table), table)
+        op.drop_column(table, 'span_id')
+        op.drop_column(table, 'trace_id')
@@ -0,0 +1,38 @@
+"""add transactions
+
+Revision ID: f3a7c2e9b815
+Revises: 6b4d0a8e3f12
+Create Date: 2026-10-19 21:52:08.617000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f3a7c2e9b815'
+down_revision = '6b4d0a8e3f12'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+                    'transactions',
+                    sa.Column('id', sa.Integer, primary_key=True),
+                    sa.Column('datetime', sa.Float),
+                    sa.Column('event', sa.String),
+                    sa.Column('database', sa.String),
+                    sa.Column('target', sa.String),
+                    sa.Column('duration', sa.Float),
+                    sa.Column('transaction_duration', sa.Float),
+                    sa.Column('statements', sa.Integer)
+                    )
+    op.create_table(
+                    'transaction_metadata_association',
+                    sa.Column('transaction_id', sa.Integer, sa.ForeignKey('transactions.id'), primary_key=True),
+                    sa.Column('metadata_id', sa.Integer, sa.ForeignKey('metadata_items.id'), primary_key=True)
+                    )
+
+
+def downgrade():
+    op.drop_table('transaction_metadata_association')
+    op.drop_table('transactions')
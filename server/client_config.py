@@ -0,0 +1,53 @@
+import cherrypy
+import json
+import time
+import database as db
+
+
+class ClientConfigHandler(object):
+    '''
+    Profiling config for cherry_pyformance clients to pick up at runtime.
+
+    Operators POST a JSON object of {"match": {metadata key: value, ...},
+    "config": {section: {key: value, ...}, ...}}. Clients GET with their
+    metadata as query parameters and receive the config sections of every
+    item whose match they satisfy, later items overriding earlier ones.
+    '''
+    exposed = True
+
+    @cherrypy.tools.json_out()
+    def GET(self, all=False, **metadata):
+        client_configs = db.session.query(db.ClientConfig).order_by(db.ClientConfig.id).all()
+        if all:
+            return [client_config.to_dict() for client_config in client_configs]
+
+        config = {}
+        for client_config in client_configs:
+            if client_config.matches(metadata):
+                for section, values in client_config._config().iteritems():
+                    config.setdefault(section, {}).update(values)
+        return config
+
+    @cherrypy.tools.json_in()
+    @cherrypy.tools.json_out()
+    def POST(self):
+        body = cherrypy.serving.request.json
+        if not isinstance(body.get('config'), dict):
+            raise cherrypy.HTTPError(400, 'A config object is required')
+
+        client_config = db.ClientConfig(time.time(), body.get('match', {}), body['config'])
+        db.session.add(client_config)
+        db.session.commit()
+        return client_config.to_dict()
+
+    @cherrypy.tools.json_out()
+    def DELETE(self, id):
+        client_config = db.session.query(db.ClientConfig).get(id)
+        if not client_config:
+            raise cherrypy.NotFound
+        db.session.delete(client_config)
+        db.session.commit()
+        return client_config.to_dict()
+
+
+client_config_handler = ClientConfigHandler()
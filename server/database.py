@@ -1,5 +1,5 @@
 import sqlalchemy
-from sqlalchemy import Table, Column, Integer, String, Float, ForeignKey, UniqueConstraint
+from sqlalchemy import Table, Column, Integer, String, Float, Boolean, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import scoped_session, sessionmaker, relationship, composite
 from sqlalchemy.ext.declarative import declarative_base
 from threading import Thread
@@ -8,6 +8,7 @@ import os
 from collections import defaultdict
 from operator import attrgetter
 import pstats
+import json
 from alembic.config import Config
 from alembic import command as al_command
 
@@ -63,15 +64,41 @@ class CallStack(Base):
     datetime = Column(Float)
     duration = Column(Float)
     pstat_uuid = Column(String)
+    # only for calls which returned a generator
+    first_chunk = Column(Float)
+    stream_duration = Column(Float)
+    stream_bytes = Column(Integer)
+    # only for handler requests
+    request_bytes = Column(Integer)
+    response_bytes = Column(Integer)
+    status = Column(Integer)
+    query_params = Column(Integer)
+    # the trace and span the record was made in, see the client's trace_context.py
+    trace_id = Column(String, index=True)
+    span_id = Column(String, index=True)
+    # the span of the request which called this handler's service
+    parent_span = Column(String)
 
     name = relationship('CallStackName', cascade='all', backref='call_stacks')
     metadata_items = relationship('MetaData', secondary=call_stack_metadata_association_table, cascade='all', backref='call_stacks')
+    spans = relationship('CallStackSpan', cascade='all', backref='call_stack')
+    threads = relationship('CallStackThread', cascade='all', backref='call_stack')
+    phases = relationship('CallStackPhase', cascade='all', backref='call_stack')
 
     def __init__(self, profile):
         self.datetime = profile['datetime']
         self.duration = profile['duration']
         self.pstat_uuid = profile['pstat_uuid']
-
+        self.first_chunk = profile.get('first_chunk')
+        self.stream_duration = profile.get('stream_duration')
+        self.stream_bytes = profile.get('stream_bytes')
+        self.request_bytes = profile.get('request_bytes')
+        self.response_bytes = profile.get('response_bytes')
+        self.status = profile.get('status')
+        self.query_params = profile.get('query_params')
+        self.trace_id = profile.get('trace_id')
+        self.span_id = profile.get('span_id')
+        self.parent_span = profile.get('parent_span')
 
     def to_dict(self):
         name = self.name
@@ -80,9 +107,25 @@ class CallStack(Base):
                     'datetime':self.datetime,
                     'duration':self.duration,
                     'pstat_uuid':self.pstat_uuid}
+        if self.stream_duration is not None:
+            response.update({'first_chunk':self.first_chunk,
+                             'stream_duration':self.stream_duration,
+                             'stream_bytes':self.stream_bytes})
+        if self.status is not None:
+            response.update({'request_bytes':self.request_bytes,
+                             'response_bytes':self.response_bytes,
+                             'status':self.status,
+                             'query_params':self.query_params})
+        if self.trace_id is not None:
+            response.update({'trace_id':self.trace_id,
+                             'span_id':self.span_id,
+                             'parent_span':self.parent_span})
         return dict(response.items() + self._metadata().items())
     
     def _stats(self):
+        if self.pstat_uuid is None:
+            # timing only call stacks have no profile
+            return None
         return pstats.Stats(os.path.join(os.getcwd(),'pstats',self.pstat_uuid))
 
     def _metadata(self):
@@ -130,6 +173,66 @@ class CallStackName(Base):
         self.class_name = class_name
         self.fn_name = fn_name
 
+class CallStackSpan(Base):
+    '''
+    A wrapped function called while the call stack was being profiled,
+    start is the offset from the start of the call stack.
+    '''
+    __tablename__ = 'call_stack_spans'
+    call_stack_id = Column(Integer, ForeignKey('call_stacks.id'), primary_key=True)
+    index = Column(Integer, primary_key=True)
+    name = Column(String)
+    start = Column(Float)
+    duration = Column(Float)
+    depth = Column(Integer)
+
+    def __init__(self, index, span):
+        self.index = index
+        self.name, self.start, self.duration, self.depth = span
+
+    def to_dict(self):
+        return {'name':self.name,
+                'start':self.start,
+                'duration':self.duration,
+                'depth':self.depth}
+
+class CallStackThread(Base):
+    '''
+    A thread started while the call stack was being profiled. Its profile
+    is merged into the call stack's, wall and cpu are its own times.
+    '''
+    __tablename__ = 'call_stack_threads'
+    call_stack_id = Column(Integer, ForeignKey('call_stacks.id'), primary_key=True)
+    index = Column(Integer, primary_key=True)
+    name = Column(String)
+    wall = Column(Float)
+    cpu = Column(Float)
+
+    def __init__(self, index, thread):
+        self.index = index
+        self.name = thread['name']
+        self.wall = thread['wall']
+        self.cpu = thread['cpu']
+
+    def to_dict(self):
+        return {'name':self.name,
+                'wall':self.wall,
+                'cpu':self.cpu}
+
+class CallStackPhase(Base):
+    '''
+    Time a handler's request spent from one cherrypy hook point to the
+    next, the phase is named after the hook point it started at.
+    '''
+    __tablename__ = 'call_stack_phases'
+    call_stack_id = Column(Integer, ForeignKey('call_stacks.id'), primary_key=True)
+    phase = Column(String, primary_key=True)
+    duration = Column(Float)
+
+    def __init__(self, phase, duration):
+        self.phase = phase
+        self.duration = duration
+
 #========================================#
 
 sql_statement_metadata_association_table = Table('sql_statement_metadata_association', Base.metadata,
@@ -143,6 +246,18 @@ class SQLStatement(Base):
     sql_string_id = Column(Integer, ForeignKey('sql_strings.id'))
     datetime = Column(Float)
     duration = Column(Float)
+    # rows the statement changed or returned, if the driver knows
+    rowcount = Column(Integer)
+    rows_fetched = Column(Integer)
+    fetch_duration = Column(Float)
+    # number of parameter sets given to executemany
+    batch_size = Column(Integer)
+    # sqlite lock waits, see the client's sqlite_locks.py
+    lock_wait = Column(Float)
+    lock_retries = Column(Integer)
+    lock_timeout = Column(Boolean)
+    trace_id = Column(String, index=True)
+    span_id = Column(String, index=True)
 
     sql_string = relationship('SQLString', cascade='all', backref='sql_statements')
     sql_stack_items = relationship('SQLStackAssociation', cascade='all', backref='sql_statements')
@@ -152,6 +267,15 @@ class SQLStatement(Base):
     def __init__(self, profile):
         self.datetime = profile['datetime']
         self.duration = profile['duration']
+        self.rowcount = profile.get('rowcount')
+        self.rows_fetched = profile.get('rows_fetched')
+        self.fetch_duration = profile.get('fetch_duration')
+        self.batch_size = profile.get('batch_size')
+        self.lock_wait = profile.get('lock_wait')
+        self.lock_retries = profile.get('lock_retries')
+        self.lock_timeout = profile.get('lock_timeout')
+        self.trace_id = profile.get('trace_id')
+        self.span_id = profile.get('span_id')
 
     def to_dict(self):
         sql = self.sql_string.sql
@@ -160,6 +284,15 @@ class SQLStatement(Base):
                     'datetime':self.datetime,
                     'duration':self.duration,
                     'args':self._args()}
+        if self.rows_fetched is not None:
+            response.update({'rowcount':self.rowcount,
+                             'rows_fetched':self.rows_fetched,
+                             'fetch_duration':self.fetch_duration})
+        if self.batch_size is not None:
+            response['batch_size'] = self.batch_size
+        if self.trace_id is not None:
+            response.update({'trace_id':self.trace_id,
+                             'span_id':self.span_id})
         return dict(response.items() + self._metadata().items())
 
     def _metadata(self):
@@ -204,6 +337,44 @@ class SQLString(Base):
         return 'SQLString({0})'.format(truncated_sql)
 
 
+class SQLPlan(Base):
+    '''
+    The EXPLAIN plan of a slow statement. shape is a hash of the plan's
+    operations without their costs or timings, shape_changed is True when
+    it differs from the shape of the sql string's previous plan.
+    '''
+    __tablename__ = 'sql_plans'
+    id = Column(Integer, primary_key=True)
+    sql_string_id = Column(Integer, ForeignKey('sql_strings.id'))
+    sql_statement_id = Column(Integer, ForeignKey('sql_statements.id'))
+    datetime = Column(Float)
+    plan = Column(String)
+    shape = Column(String)
+    analyzed = Column(Boolean)
+    shape_changed = Column(Boolean)
+
+    sql_string = relationship('SQLString', backref='sql_plans')
+    sql_statement = relationship('SQLStatement', backref='sql_plans')
+
+    def __init__(self, profile, shape, shape_changed):
+        self.datetime = profile['datetime']
+        self.plan = profile['plan']
+        self.analyzed = profile.get('plan_analyzed', False)
+        self.shape = shape
+        self.shape_changed = shape_changed
+
+    def to_dict(self):
+        return {'id':self.id,
+                'datetime':self.datetime,
+                'plan':self.plan,
+                'shape':self.shape,
+                'analyzed':self.analyzed,
+                'shape_changed':self.shape_changed}
+
+    def __repr__(self):
+        return 'SQLPlan({0})'.format(self.shape)
+
+
 class SQLStackAssociation(Base):
     __tablename__ = 'sql_stack_association'
     sql_statement_id = Column(Integer, ForeignKey('sql_statements.id'), primary_key=True)
@@ -271,6 +442,8 @@ class FileAccess(Base):
     duration = Column(Float)
     data_written = Column(Integer)
     mode = Column(String)
+    trace_id = Column(String, index=True)
+    span_id = Column(String, index=True)
     
     filename = relationship('FileName', cascade='all', backref='file_accesses')
     metadata_items = relationship('MetaData', secondary=file_access_metadata_association_table, cascade='all', backref='file_accesses')
@@ -281,6 +454,8 @@ class FileAccess(Base):
         self.duration = profile['duration']
         self.data_written = profile['data_written']
         self.mode = profile['mode']
+        self.trace_id = profile.get('trace_id')
+        self.span_id = profile.get('span_id')
       
     def to_dict(self):
         filename = self.filename.filename
@@ -290,6 +465,9 @@ class FileAccess(Base):
                     'datetime':self.datetime,
                     'duration':self.duration,
                     'data_written':self.data_written}
+        if self.trace_id is not None:
+            response.update({'trace_id':self.trace_id,
+                             'span_id':self.span_id})
         return dict(response.items() + self._metadata().items())
                 
     def _metadata(self):
@@ -320,6 +498,496 @@ class FileName(Base):
 
 #========================================#
 
+overhead_report_metadata_association_table = Table('overhead_report_metadata_association', Base.metadata,
+    Column('overhead_report_id', Integer, ForeignKey('overhead_reports.id'), primary_key=True), 
+    Column('metadata_id', Integer, ForeignKey('metadata_items.id'), primary_key=True)
+)
+
+class OverheadReport(Base):
+    __tablename__ = 'overhead_reports'
+    id = Column(Integer, primary_key=True)
+    datetime = Column(Float)
+    stat_type = Column(String)
+    calls = Column(Integer)
+    overhead = Column(Float)
+    wrapped = Column(Float)
+    flush = Column(Float)
+
+    metadata_items = relationship('MetaData', secondary=overhead_report_metadata_association_table, cascade='all', backref='overhead_reports')
+
+    def __init__(self, stat_type, datetime, overhead):
+        self.stat_type = stat_type
+        self.datetime = datetime
+        self.calls = overhead['calls']
+        self.overhead = overhead['overhead']
+        self.wrapped = overhead['wrapped']
+        self.flush = overhead['flush']
+
+    def to_dict(self):
+        response = {'id':self.id,
+                    'stat_type':self.stat_type,
+                    'datetime':self.datetime,
+                    'calls':self.calls,
+                    'overhead':self.overhead,
+                    'wrapped':self.wrapped,
+                    'flush':self.flush}
+        return dict(response.items() + self._metadata().items())
+
+    def _metadata(self):
+        list_dict = defaultdict(list)
+        for key, value in [meta._to_tuple() for meta in self.metadata_items]:
+            list_dict[key].append(value)
+        # if list only one item, set to that one item
+        list_dict = dict(list_dict)
+        for k,v in list_dict.items():
+            if len(v)==1:
+                list_dict[k] = v[0]
+        return list_dict
+
+    def __repr__(self):
+        return 'OverheadReport({0}, {1!s})'.format(self.stat_type,int(self.datetime))
+
+#========================================#
+
+profiling_transition_metadata_association_table = Table('profiling_transition_metadata_association', Base.metadata,
+    Column('profiling_transition_id', Integer, ForeignKey('profiling_transitions.id'), primary_key=True), 
+    Column('metadata_id', Integer, ForeignKey('metadata_items.id'), primary_key=True)
+)
+
+class ProfilingTransition(Base):
+    __tablename__ = 'profiling_transitions'
+    id = Column(Integer, primary_key=True)
+    datetime = Column(Float)
+    stat_type = Column(String)
+    name = Column(String)
+    from_level = Column(String)
+    to_level = Column(String)
+    overhead = Column(Float)
+    records = Column(Integer)
+
+    metadata_items = relationship('MetaData', secondary=profiling_transition_metadata_association_table, cascade='all', backref='profiling_transitions')
+
+    def __init__(self, profile):
+        self.datetime = profile['datetime']
+        self.stat_type = profile['stat_type']
+        self.name = profile['name']
+        self.from_level = profile['from_level']
+        self.to_level = profile['to_level']
+        self.overhead = profile['overhead']
+        self.records = profile['records']
+
+    def to_dict(self):
+        response = {'id':self.id,
+                    'datetime':self.datetime,
+                    'stat_type':self.stat_type,
+                    'name':self.name,
+                    'from_level':self.from_level,
+                    'to_level':self.to_level,
+                    'overhead':self.overhead,
+                    'records':self.records}
+        return dict(response.items() + self._metadata().items())
+
+    def _metadata(self):
+        list_dict = defaultdict(list)
+        for key, value in [meta._to_tuple() for meta in self.metadata_items]:
+            list_dict[key].append(value)
+        # if list only one item, set to that one item
+        list_dict = dict(list_dict)
+        for k,v in list_dict.items():
+            if len(v)==1:
+                list_dict[k] = v[0]
+        return list_dict
+
+    def __repr__(self):
+        return 'ProfilingTransition({0}, {1} -> {2})'.format(self.name,self.from_level,self.to_level)
+
+#========================================#
+
+import_time_metadata_association_table = Table('import_time_metadata_association', Base.metadata,
+    Column('import_time_id', Integer, ForeignKey('import_times.id'), primary_key=True), 
+    Column('metadata_id', Integer, ForeignKey('metadata_items.id'), primary_key=True)
+)
+
+class ImportTime(Base):
+    __tablename__ = 'import_times'
+    id = Column(Integer, primary_key=True)
+    datetime = Column(Float)
+    module = Column(String)
+    parent = Column(String)
+    chain = Column(String)
+    depth = Column(Integer)
+    duration = Column(Float)
+    exec_duration = Column(Float)
+
+    metadata_items = relationship('MetaData', secondary=import_time_metadata_association_table, cascade='all', backref='import_times')
+
+    def __init__(self, profile):
+        self.datetime = profile['datetime']
+        self.module = profile['module']
+        self.parent = profile['parent']
+        self.chain = profile['chain']
+        self.depth = profile['depth']
+        self.duration = profile['duration']
+        self.exec_duration = profile['exec_duration']
+
+    def to_dict(self):
+        response = {'id':self.id,
+                    'datetime':self.datetime,
+                    'module':self.module,
+                    'parent':self.parent,
+                    'chain':self.chain,
+                    'depth':self.depth,
+                    'duration':self.duration,
+                    'exec_duration':self.exec_duration}
+        return dict(response.items() + self._metadata().items())
+
+    def _metadata(self):
+        list_dict = defaultdict(list)
+        for key, value in [meta._to_tuple() for meta in self.metadata_items]:
+            list_dict[key].append(value)
+        # if list only one item, set to that one item
+        list_dict = dict(list_dict)
+        for k,v in list_dict.items():
+            if len(v)==1:
+                list_dict[k] = v[0]
+        return list_dict
+
+    def __repr__(self):
+        return 'ImportTime({0}, {1!s})'.format(self.module,self.duration)
+
+#========================================#
+
+transaction_metadata_association_table = Table('transaction_metadata_association', Base.metadata,
+    Column('transaction_id', Integer, ForeignKey('transactions.id'), primary_key=True), 
+    Column('metadata_id', Integer, ForeignKey('metadata_items.id'), primary_key=True)
+)
+
+class Transaction(Base):
+    __tablename__ = 'transactions'
+    id = Column(Integer, primary_key=True)
+    datetime = Column(Float)
+    event = Column(String)
+    database = Column(String)
+    target = Column(String)
+    duration = Column(Float)
+    transaction_duration = Column(Float)
+    statements = Column(Integer)
+    trace_id = Column(String, index=True)
+    span_id = Column(String, index=True)
+
+    metadata_items = relationship('MetaData', secondary=transaction_metadata_association_table, cascade='all', backref='transactions')
+
+    def __init__(self, profile):
+        self.datetime = profile['datetime']
+        self.event = profile['event']
+        self.database = profile['database']
+        self.target = profile['target']
+        self.duration = profile['duration']
+        self.transaction_duration = profile['transaction_duration']
+        self.statements = profile['statements']
+        self.trace_id = profile.get('trace_id')
+        self.span_id = profile.get('span_id')
+
+    def to_dict(self):
+        response = {'id':self.id,
+                    'datetime':self.datetime,
+                    'event':self.event,
+                    'database':self.database,
+                    'target':self.target,
+                    'duration':self.duration,
+                    'transaction_duration':self.transaction_duration,
+                    'statements':self.statements}
+        if self.trace_id is not None:
+            response.update({'trace_id':self.trace_id,
+                             'span_id':self.span_id})
+        return dict(response.items() + self._metadata().items())
+
+    def _metadata(self):
+        list_dict = defaultdict(list)
+        for key, value in [meta._to_tuple() for meta in self.metadata_items]:
+            list_dict[key].append(value)
+        # if list only one item, set to that one item
+        list_dict = dict(list_dict)
+        for k,v in list_dict.items():
+            if len(v)==1:
+                list_dict[k] = v[0]
+        return list_dict
+
+    def __repr__(self):
+        return 'Transaction({0}, {1})'.format(self.event, self.target)
+
+#========================================#
+
+http_request_metadata_association_table = Table('http_request_metadata_association', Base.metadata,
+    Column('http_request_id', Integer, ForeignKey('http_requests.id'), primary_key=True), 
+    Column('metadata_id', Integer, ForeignKey('metadata_items.id'), primary_key=True)
+)
+
+class HTTPRequest(Base):
+    __tablename__ = 'http_requests'
+    id = Column(Integer, primary_key=True)
+    datetime = Column(Float)
+    host = Column(String)
+    method = Column(String)
+    path = Column(String)
+    status = Column(Integer)
+    error = Column(String)
+    dns = Column(Float)
+    connect = Column(Float)
+    ttfb = Column(Float)
+    duration = Column(Float)
+    request_bytes = Column(Integer)
+    response_bytes = Column(Integer)
+    trace_id = Column(String, index=True)
+    span_id = Column(String, index=True)
+
+    metadata_items = relationship('MetaData', secondary=http_request_metadata_association_table, cascade='all', backref='http_requests')
+
+    def __init__(self, profile):
+        self.datetime = profile['datetime']
+        self.host = profile['host']
+        self.method = profile['method']
+        self.path = profile['path']
+        self.status = profile['status']
+        self.error = profile.get('error')
+        self.dns = profile['dns']
+        self.connect = profile['connect']
+        self.ttfb = profile['ttfb']
+        self.duration = profile['duration']
+        self.request_bytes = profile['request_bytes']
+        self.response_bytes = profile['response_bytes']
+        self.trace_id = profile.get('trace_id')
+        self.span_id = profile.get('span_id')
+
+    def to_dict(self):
+        response = {'id':self.id,
+                    'datetime':self.datetime,
+                    'host':self.host,
+                    'method':self.method,
+                    'path':self.path,
+                    'status':self.status,
+                    'error':self.error,
+                    'dns':self.dns,
+                    'connect':self.connect,
+                    'ttfb':self.ttfb,
+                    'duration':self.duration,
+                    'request_bytes':self.request_bytes,
+                    'response_bytes':self.response_bytes}
+        if self.trace_id is not None:
+            response.update({'trace_id':self.trace_id,
+                             'span_id':self.span_id})
+        return dict(response.items() + self._metadata().items())
+
+    def _metadata(self):
+        list_dict = defaultdict(list)
+        for key, value in [meta._to_tuple() for meta in self.metadata_items]:
+            list_dict[key].append(value)
+        # if list only one item, set to that one item
+        list_dict = dict(list_dict)
+        for k,v in list_dict.items():
+            if len(v)==1:
+                list_dict[k] = v[0]
+        return list_dict
+
+    def __repr__(self):
+        return 'HTTPRequest({0} {1}{2})'.format(self.method, self.host, self.path)
+
+#========================================#
+
+lock_stat_metadata_association_table = Table('lock_stat_metadata_association', Base.metadata,
+    Column('lock_stat_id', Integer, ForeignKey('lock_stats.id'), primary_key=True), 
+    Column('metadata_id', Integer, ForeignKey('metadata_items.id'), primary_key=True)
+)
+
+class LockStat(Base):
+    __tablename__ = 'lock_stats'
+    id = Column(Integer, primary_key=True)
+    datetime = Column(Float)
+    site = Column(String)
+    kind = Column(String)
+    acquisitions = Column(Integer)
+    contended = Column(Integer)
+    wait = Column(Float)
+    max_wait = Column(Float)
+    hold = Column(Float)
+    max_hold = Column(Float)
+    callers = Column(String)
+
+    metadata_items = relationship('MetaData', secondary=lock_stat_metadata_association_table, cascade='all', backref='lock_stats')
+
+    def __init__(self, profile):
+        self.datetime = profile['datetime']
+        self.site = profile['site']
+        self.kind = profile['kind']
+        self.acquisitions = profile['acquisitions']
+        self.contended = profile['contended']
+        self.wait = profile['wait']
+        self.max_wait = profile['max_wait']
+        self.hold = profile['hold']
+        self.max_hold = profile['max_hold']
+        # [call site, contended acquisitions, wait] of its most waited on call sites
+        self.callers = json.dumps(profile['callers'])
+
+    def to_dict(self):
+        response = {'id':self.id,
+                    'datetime':self.datetime,
+                    'site':self.site,
+                    'kind':self.kind,
+                    'acquisitions':self.acquisitions,
+                    'contended':self.contended,
+                    'wait':self.wait,
+                    'max_wait':self.max_wait,
+                    'hold':self.hold,
+                    'max_hold':self.max_hold,
+                    'callers':json.loads(self.callers)}
+        return dict(response.items() + self._metadata().items())
+
+    def _metadata(self):
+        list_dict = defaultdict(list)
+        for key, value in [meta._to_tuple() for meta in self.metadata_items]:
+            list_dict[key].append(value)
+        # if list only one item, set to that one item
+        list_dict = dict(list_dict)
+        for k,v in list_dict.items():
+            if len(v)==1:
+                list_dict[k] = v[0]
+        return list_dict
+
+    def __repr__(self):
+        return 'LockStat({0}, {1}, {2})'.format(self.site, self.acquisitions, self.wait)
+
+#========================================#
+
+subprocess_metadata_association_table = Table('subprocess_metadata_association', Base.metadata,
+    Column('subprocess_id', Integer, ForeignKey('subprocesses.id'), primary_key=True), 
+    Column('metadata_id', Integer, ForeignKey('metadata_items.id'), primary_key=True)
+)
+
+class Subprocess(Base):
+    __tablename__ = 'subprocesses'
+    id = Column(Integer, primary_key=True)
+    datetime = Column(Float)
+    command = Column(String)
+    exit_code = Column(Integer)
+    error = Column(String)
+    duration = Column(Float)
+    cpu = Column(Float)
+    max_rss = Column(Integer)
+    trace_id = Column(String, index=True)
+    span_id = Column(String, index=True)
+
+    metadata_items = relationship('MetaData', secondary=subprocess_metadata_association_table, cascade='all', backref='subprocesses')
+
+    def __init__(self, profile):
+        self.datetime = profile['datetime']
+        self.command = profile['command']
+        self.exit_code = profile['exit_code']
+        self.error = profile.get('error')
+        self.duration = profile['duration']
+        self.cpu = profile['cpu']
+        self.max_rss = profile['max_rss']
+        self.trace_id = profile.get('trace_id')
+        self.span_id = profile.get('span_id')
+
+    def to_dict(self):
+        response = {'id':self.id,
+                    'datetime':self.datetime,
+                    'command':self.command,
+                    'exit_code':self.exit_code,
+                    'error':self.error,
+                    'duration':self.duration,
+                    'cpu':self.cpu,
+                    'max_rss':self.max_rss}
+        if self.trace_id is not None:
+            response.update({'trace_id':self.trace_id,
+                             'span_id':self.span_id})
+        return dict(response.items() + self._metadata().items())
+
+    def _metadata(self):
+        list_dict = defaultdict(list)
+        for key, value in [meta._to_tuple() for meta in self.metadata_items]:
+            list_dict[key].append(value)
+        # if list only one item, set to that one item
+        list_dict = dict(list_dict)
+        for k,v in list_dict.items():
+            if len(v)==1:
+                list_dict[k] = v[0]
+        return list_dict
+
+    def __repr__(self):
+        return 'Subprocess({0}, {1}, {2})'.format(self.command, self.exit_code, self.duration)
+
+#========================================#
+
+class ClientConfig(Base):
+    __tablename__ = 'client_configs'
+    id = Column(Integer, primary_key=True)
+    datetime = Column(Float)
+    match = Column(String)
+    config = Column(String)
+
+    def __init__(self, datetime, match, config):
+        self.datetime = datetime
+        self.match = json.dumps(match)
+        self.config = json.dumps(config)
+
+    def matches(self, metadata):
+        '''True if every key/value in the match is in the client's metadata'''
+        for key, value in json.loads(self.match).iteritems():
+            if str(metadata.get(key)) != str(value):
+                return False
+        return True
+
+    def _config(self):
+        return json.loads(self.config)
+
+    def to_dict(self):
+        return {'id':self.id,
+                'datetime':self.datetime,
+                'match':json.loads(self.match),
+                'config':self._config()}
+
+    def __repr__(self):
+        return 'ClientConfig({0}, {1})'.format(self.id,self.match)
+
+#========================================#
+
+class DeepCapture(Base):
+    __tablename__ = 'deep_captures'
+    id = Column(Integer, primary_key=True)
+    datetime = Column(Float)
+    expires = Column(Float)
+    match = Column(String)
+    handler = Column(String)
+    requests = Column(Integer)
+
+    def __init__(self, datetime, expires, match, handler, requests):
+        self.datetime = datetime
+        self.expires = expires
+        self.match = json.dumps(match)
+        self.handler = handler
+        self.requests = requests
+
+    def matches(self, metadata):
+        '''True if every key/value in the match is in the client's metadata'''
+        for key, value in json.loads(self.match).iteritems():
+            if str(metadata.get(key)) != str(value):
+                return False
+        return True
+
+    def to_dict(self):
+        return {'id':self.id,
+                'datetime':self.datetime,
+                'expires':self.expires,
+                'match':json.loads(self.match),
+                'handler':self.handler,
+                'requests':self.requests}
+
+    def __repr__(self):
+        return 'DeepCapture({0}, {1}, {2!s})'.format(self.id,self.handler,self.requests)
+
+#========================================#
+
 class MetaData(Base):
     __tablename__ = 'metadata_items'
     id = Column(Integer, primary_key=True)
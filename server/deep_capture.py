@@ -0,0 +1,57 @@
+import cherrypy
+import time
+import database as db
+
+
+class DeepCaptureHandler(object):
+    '''
+    Requests for cherry_pyformance clients to fully profile the next few
+    requests to a handler.
+
+    Operators POST a JSON object of {"match": {metadata key: value, ...},
+    "handler": "/core/x", "requests": 50, "expires": 3600}. Clients GET with
+    their metadata as query parameters on each flush and receive every
+    unexpired capture whose match they satisfy. Each matching host captures
+    the next "requests" calls to the handler with full cProfile and SQL
+    stacks, tagging the records with deep_capture = id.
+    '''
+    exposed = True
+
+    @cherrypy.tools.json_out()
+    def GET(self, all=False, **metadata):
+        deep_captures = db.session.query(db.DeepCapture).order_by(db.DeepCapture.id)
+        if all:
+            return [deep_capture.to_dict() for deep_capture in deep_captures.all()]
+
+        deep_captures = deep_captures.filter(db.DeepCapture.expires > time.time())
+        return [deep_capture.to_dict() for deep_capture in deep_captures.all() if deep_capture.matches(metadata)]
+
+    @cherrypy.tools.json_in()
+    @cherrypy.tools.json_out()
+    def POST(self):
+        body = cherrypy.serving.request.json
+        if not body.get('handler'):
+            raise cherrypy.HTTPError(400, 'A handler is required')
+        try:
+            requests = int(body.get('requests', 10))
+            expires = float(body.get('expires', 3600))
+        except (TypeError, ValueError):
+            raise cherrypy.HTTPError(400, 'requests and expires must be numbers')
+
+        now = time.time()
+        deep_capture = db.DeepCapture(now, now + expires, body.get('match', {}), body['handler'], requests)
+        db.session.add(deep_capture)
+        db.session.commit()
+        return deep_capture.to_dict()
+
+    @cherrypy.tools.json_out()
+    def DELETE(self, id):
+        deep_capture = db.session.query(db.DeepCapture).get(id)
+        if not deep_capture:
+            raise cherrypy.NotFound
+        db.session.delete(deep_capture)
+        db.session.commit()
+        return deep_capture.to_dict()
+
+
+deep_capture_handler = DeepCaptureHandler()
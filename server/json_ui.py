@@ -33,7 +33,7 @@ class JSONAPI(object):
             if item:
                 response = item.to_dict()
                 stats_object = item._stats()
-                stats = stats_object.stats
+                stats = stats_object.stats if stats_object else {}
                 response['stats_keys'] = [str(key) for key in stats.keys()]
                 response['stats_values'] = [str(val) for val in stats.values()]
                 return response
@@ -50,9 +50,32 @@ class JSONAPI(object):
         if not callstack:
             raise cherrypy.NotFound
         uuid = callstack.pstat_uuid
+        if uuid is None:
+            # timing only call stack, nothing to expand
+            return {'stats':{},'callees':{},'total_tt':callstack.duration}
         return retrieve_pstat(uuid)
 
 
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def callstackspans(self, callstack_id):
+        callstack = db.session.query(db.CallStack).get(callstack_id)
+        if not callstack:
+            raise cherrypy.NotFound
+        spans = sorted(callstack.spans, key=lambda span: span.index)
+        return {'duration':callstack.duration,
+                'spans':[span.to_dict() for span in spans]}
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def callstackthreads(self, callstack_id):
+        callstack = db.session.query(db.CallStack).get(callstack_id)
+        if not callstack:
+            raise cherrypy.NotFound
+        threads = sorted(callstack.threads, key=lambda thread: thread.index)
+        return {'duration':callstack.duration,
+                'threads':[thread.to_dict() for thread in threads]}
+
     @cherrypy.expose
     @cherrypy.tools.json_out()
     def sqlstatements(self, id=None, **kwargs):
@@ -113,7 +136,7 @@ class JSONAPI(object):
         results_list = []
         if 'get_keys' in kwargs:
             table_name = kwargs['get_keys']
-            table_metadata_keys = self.table_metadata_keys_dict[table_name]
+            table_metadata_keys = self.table_metadata_keys_dict.get(table_name, [[],['statement_identifiers','statement_type']])
             extra_keys = table_metadata_keys[0]
             remove_keys = table_metadata_keys[1]
             
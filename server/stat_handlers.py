@@ -6,6 +6,9 @@ import os
 import cPickle
 import pstats
 import uuid
+import time
+import json
+import hashlib
 from threading import Thread
 from Queue import Queue
 from sqlparse import tokens as sql_tokens, parse as parse_sql
@@ -43,6 +46,7 @@ def worker():
     while True:
         item = stat_handler_queue.get()
         fn = item[0]
+        parse_overhead(item[1])
         fn(item[1])
         stat_handler_queue.task_done()
         
@@ -91,18 +95,26 @@ def parse_fn_packet(packet):
     metadata_list = get_metadata_list(packet['metadata'], db_session)
     
     for profile in packet['stats']:
-        # pull and unpickle pstats
-        stats = cPickle.loads(str(profile['profile']))
-        # need to make it a bogus stats object for it to initialise
-        # (needs a create_stats method and stats attr)
-        stats = BogusStats(stats)
-        stats = pstats.Stats(stats)
-        profile['duration'] = stats.total_tt
-        _id = str(uuid.uuid4())
-        while os.path.isfile(os.path.join(os.getcwd(),'pstats',_id)):
+        if profile['profile'] is None:
+            # a timing only record, the client has already measured the duration
+            profile['pstat_uuid'] = None
+        else:
+            # pull and unpickle pstats
+            stats = cPickle.loads(str(profile['profile']))
+            # need to make it a bogus stats object for it to initialise
+            # (needs a create_stats method and stats attr)
+            stats = BogusStats(stats)
+            stats = pstats.Stats(stats)
+            profile['duration'] = stats.total_tt
+            # threads started while it was profiled are part of its call tree,
+            # but not of its duration
+            for thread in profile.get('threads', []):
+                stats.add(pstats.Stats(BogusStats(cPickle.loads(str(thread['profile'])))))
             _id = str(uuid.uuid4())
-        profile['pstat_uuid'] = _id
-        stats.dump_stats('pstats\\'+_id)
+            while os.path.isfile(os.path.join(os.getcwd(),'pstats',_id)):
+                _id = str(uuid.uuid4())
+            profile['pstat_uuid'] = _id
+            stats.dump_stats('pstats\\'+_id)
 
         # callstack names
         call_stack_name = get_or_create(db_session,
@@ -114,7 +126,16 @@ def parse_fn_packet(packet):
         # Add call stack
         call_stack = db.CallStack(profile)
         call_stack.name = call_stack_name
-        call_stack.metadata_items = metadata_list
+        # records can carry their own metadata on top of the packet's, e.g. deep captures
+        call_stack.metadata_items = list(set(metadata_list + get_metadata_list(profile.get('metadata', {}), db_session)))
+        # wrapped functions called while this was profiled, in the order they started
+        for i, span in enumerate(sorted(profile.get('spans', []), key=lambda span: span[1])):
+            call_stack.spans.append(db.CallStackSpan(i, span))
+        for i, thread in enumerate(profile.get('threads', [])):
+            call_stack.threads.append(db.CallStackThread(i, thread))
+        # handler requests, the time spent in each phase of the request
+        for phase, duration in profile.get('phases', {}).items():
+            call_stack.phases.append(db.CallStackPhase(phase, duration))
         # add to session
         db_session.add(call_stack)
 
@@ -129,7 +150,7 @@ def parse_sql_packet(packet):
     
     for profile in packet['stats']:
         # get-or-set all arguments (do not map relationship yet)
-        sql_arg_list = get_arg_list(db_session, profile['args'])
+        sql_arg_list = get_arg_list(db_session, profile['args'], 'paramstyle' in profile)
 
         # get-or-set all stack items (do not map relationship yet)
         sql_stack_item_list = get_stack_list(db_session, profile['stack'])
@@ -147,7 +168,8 @@ def parse_sql_packet(packet):
         sql_identifiers = get_metadata_list({'statement_identifiers':sql_identifiers,
                                              'statement_type':statement_type},
                                             db_session)
-        metadata_list = global_metadata_list + sql_identifiers
+        metadata_list = list(set(global_metadata_list + sql_identifiers +
+                                 get_metadata_list(profile.get('metadata', {}), db_session)))
 
         # get-or-set the sql string
         sql_string = get_or_create(db_session,
@@ -175,12 +197,55 @@ def parse_sql_packet(packet):
         # add the sql string
         sql_statement.sql_string = sql_string
 
+        # add the EXPLAIN plan, if the statement was slow enough to have one
+        if 'plan' in profile:
+            add_sql_plan(db_session, profile, sql_string, sql_statement)
+
         # Add sql statement to session
         db_session.add(sql_statement)
     
     db_session.commit()
 
 
+# keys of a postgres plan node which describe what it does, not what it cost
+PLAN_SHAPE_KEYS = ('Node Type', 'Parent Relationship', 'Strategy', 'Join Type',
+                   'Relation Name', 'Index Name', 'Scan Direction')
+
+def plan_shape(plan):
+    """
+    Returns a hash of a plan's operations, which changes when the
+    database picks a different plan but not when its costs change.
+    """
+    if plan and isinstance(plan[0], list):
+        # sqlite [id, parent, detail] rows, ids can differ between the same plans
+        depths = {0: -1}
+        shape = []
+        for plan_id, parent, detail in plan:
+            depths[plan_id] = depths.get(parent, -1) + 1
+            shape.append([depths[plan_id], detail])
+    else:
+        def node_shape(node):
+            shape = dict((key, node[key]) for key in PLAN_SHAPE_KEYS if key in node)
+            shape['Plans'] = [node_shape(child) for child in node.get('Plans', [])]
+            return shape
+        shape = [node_shape(output['Plan']) for output in plan]
+    return hashlib.md5(json.dumps(shape, sort_keys=True)).hexdigest()
+
+def add_sql_plan(db_session, profile, sql_string, sql_statement):
+    shape = plan_shape(json.loads(profile['plan']))
+    previous = None
+    if sql_string.id is not None:
+        previous = db_session.query(db.SQLPlan)\
+                             .filter(db.SQLPlan.sql_string_id == sql_string.id)\
+                             .filter(db.SQLPlan.datetime < profile['datetime'])\
+                             .order_by(db.SQLPlan.datetime.desc())\
+                             .first()
+    sql_plan = db.SQLPlan(profile, shape, previous is not None and previous.shape != shape)
+    sql_plan.sql_string = sql_string
+    sql_plan.sql_statement = sql_statement
+    db_session.add(sql_plan)
+
+
 def parse_file_packet(packet):
     db_session = db.session
                     
@@ -195,13 +260,120 @@ def parse_file_packet(packet):
         # Add file access row
         file_access = db.FileAccess(profile)
         file_access.filename = filename
-        file_access.metadata_items = metadata_list
+        file_access.metadata_items = list(set(metadata_list + get_metadata_list(profile.get('metadata', {}), db_session)))
         # add to session
         db_session.add(file_access)
 
     db_session.commit()
     
 
+def parse_governor_packet(packet):
+    db_session = db.session
+                    
+    # Get flush metadata
+    metadata_list = get_metadata_list(packet['metadata'], db_session)
+    
+    for profile in packet['stats']:
+        transition = db.ProfilingTransition(profile)
+        transition.metadata_items = metadata_list
+        # add to session
+        db_session.add(transition)
+
+    db_session.commit()
+
+
+def parse_startup_packet(packet):
+    db_session = db.session
+                    
+    # Get flush metadata
+    metadata_list = get_metadata_list(packet['metadata'], db_session)
+    
+    for profile in packet['stats']:
+        import_time = db.ImportTime(profile)
+        import_time.metadata_items = metadata_list
+        # add to session
+        db_session.add(import_time)
+
+    db_session.commit()
+
+
+def parse_transaction_packet(packet):
+    db_session = db.session
+
+    # Get flush metadata
+    metadata_list = get_metadata_list(packet['metadata'], db_session)
+
+    for profile in packet['stats']:
+        transaction = db.Transaction(profile)
+        transaction.metadata_items = list(set(metadata_list + get_metadata_list(profile.get('metadata', {}), db_session)))
+        # add to session
+        db_session.add(transaction)
+
+    db_session.commit()
+
+
+def parse_http_packet(packet):
+    db_session = db.session
+
+    # Get flush metadata
+    metadata_list = get_metadata_list(packet['metadata'], db_session)
+
+    for profile in packet['stats']:
+        http_request = db.HTTPRequest(profile)
+        http_request.metadata_items = list(set(metadata_list + get_metadata_list(profile.get('metadata', {}), db_session)))
+        # add to session
+        db_session.add(http_request)
+
+    db_session.commit()
+
+
+def parse_lock_packet(packet):
+    db_session = db.session
+
+    # Get flush metadata
+    metadata_list = get_metadata_list(packet['metadata'], db_session)
+
+    for profile in packet['stats']:
+        lock_stat = db.LockStat(profile)
+        lock_stat.metadata_items = list(set(metadata_list + get_metadata_list(profile.get('metadata', {}), db_session)))
+        # add to session
+        db_session.add(lock_stat)
+
+    db_session.commit()
+
+
+def parse_subprocess_packet(packet):
+    db_session = db.session
+
+    # Get flush metadata
+    metadata_list = get_metadata_list(packet['metadata'], db_session)
+
+    for profile in packet['stats']:
+        subprocess = db.Subprocess(profile)
+        subprocess.metadata_items = list(set(metadata_list + get_metadata_list(profile.get('metadata', {}), db_session)))
+        # add to session
+        db_session.add(subprocess)
+
+    db_session.commit()
+
+
+def parse_overhead(packet):
+    '''
+    Takes the profiler overhead totals off the packet's metadata, if the
+    client sent any, and stores them against the rest of the metadata.
+    '''
+    overhead = packet['metadata'].pop('overhead', None)
+    if not overhead:
+        return
+    db_session = db.session
+
+    report = db.OverheadReport(packet['type'], time.time(), overhead)
+    report.metadata_items = get_metadata_list(dict(packet['metadata']), db_session)
+    db_session.add(report)
+
+    db_session.commit()
+
+
 def get_metadata_list(metadata_dictionary, db_session):
     metadata_list = []
     for metadata_key in metadata_dictionary.keys():
@@ -216,16 +388,23 @@ def get_metadata_list(metadata_dictionary, db_session):
     return list(set(metadata_list))
 
 
-def get_arg_list(db_session, args):
+def get_arg_list(db_session, args, paired=False):
     arg_list = []
-    if isinstance(args, list): # sqlite
+    if paired: # [key, value] pairs keyed by the driver's paramstyle
+        for key,val in args:
+            sql_arg = get_or_create(db_session,
+                                    db.SQLArg,
+                                    key=key,
+                                    value=val)
+            arg_list.append(sql_arg)
+    elif isinstance(args, list): # sqlite, from older clients
         for val in args:
             sql_arg = get_or_create(db_session,
                                     db.SQLArg,
                                     key='?',
                                     value=val)
             arg_list.append(sql_arg)
-    elif isinstance(args, dict): # postgres
+    elif isinstance(args, dict): # postgres, from older clients
         for key,val in args.iteritems():
             sql_arg = get_or_create(db_session,
                                     db.SQLArg,
@@ -256,3 +435,9 @@ function_stat_handler = StatHandler(parse_fn_packet)
 handler_stat_handler = StatHandler(parse_fn_packet)
 sql_stat_handler = StatHandler(parse_sql_packet)
 file_stat_handler = StatHandler(parse_file_packet)
+governor_stat_handler = StatHandler(parse_governor_packet)
+startup_stat_handler = StatHandler(parse_startup_packet)
+transaction_stat_handler = StatHandler(parse_transaction_packet)
+http_stat_handler = StatHandler(parse_http_packet)
+lock_stat_handler = StatHandler(parse_lock_packet)
+subprocess_stat_handler = StatHandler(parse_subprocess_packet)
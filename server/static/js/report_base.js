@@ -0,0 +1,23 @@
+var oTable;
+
+$(document).ready(function() {
+	oTable = $('#main').dataTable({
+			"aaSorting": [[ sort_column, "desc" ]],
+			"bProcessing": true,
+			"bDeferRender": true,
+			"sPaginationType": "full_numbers",
+			"bAutoWidth": false,
+			"sDom": 'rt<"dataTables_bottom"fpli><"clear">',
+			"oLanguage": {
+				"sInfo": "_START_ to _END_ of _TOTAL_",
+				"sInfoEmpty": "0 to 0 of 0"
+			}
+	});
+
+	$('#filters').on('load change', function(e, kwargs) {
+		$.getJSON('/api/' + url_name, kwargs, function(data) {
+			oTable.fnClearTable();
+			oTable.fnAddData(data);
+		});
+	});
+});
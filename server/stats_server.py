@@ -29,7 +29,11 @@ from table_ui import Tables
 from aggregate_json_ui import AggregateAPI
 from aggregate_table_ui import AggregatePages
 
-from stat_handlers import function_stat_handler, handler_stat_handler, sql_stat_handler, file_stat_handler
+from client_config import client_config_handler
+from deep_capture import deep_capture_handler
+from stat_handlers import function_stat_handler, handler_stat_handler, sql_stat_handler, file_stat_handler, \
+                          governor_stat_handler, startup_stat_handler, transaction_stat_handler, \
+                          http_stat_handler, lock_stat_handler, subprocess_stat_handler
 
 
 # add gzip to allowed content types for decompressing JSON if compressed.
@@ -68,6 +72,15 @@ def start_cherrypy(host, port):
     cherrypy.tree.mount(handler_stat_handler,  '/handler',    method_dispatch_cfg )
     cherrypy.tree.mount(sql_stat_handler,      '/database',   method_dispatch_cfg )
     cherrypy.tree.mount(file_stat_handler,     '/file',       method_dispatch_cfg )
+    cherrypy.tree.mount(governor_stat_handler, '/governor',   method_dispatch_cfg )
+    cherrypy.tree.mount(startup_stat_handler,  '/startup',    method_dispatch_cfg )
+    cherrypy.tree.mount(transaction_stat_handler, '/transaction', method_dispatch_cfg )
+    cherrypy.tree.mount(http_stat_handler,     '/http',       method_dispatch_cfg )
+    cherrypy.tree.mount(lock_stat_handler,     '/lock',       method_dispatch_cfg )
+    cherrypy.tree.mount(subprocess_stat_handler, '/subprocess', method_dispatch_cfg )
+
+    cherrypy.tree.mount(client_config_handler, '/clientconfig', method_dispatch_cfg )
+    cherrypy.tree.mount(deep_capture_handler,  '/deepcapture',  method_dispatch_cfg )
 
     cherrypy.tree.mount(Tables(),              '/tables')
     cherrypy.tree.mount(JSONAPI(),             '/tables/api')
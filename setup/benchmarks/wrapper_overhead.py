@@ -0,0 +1,67 @@
+"""
+Per-call overhead of the function wrapper over a bare call.
+
+A module level function and a method are wrapped with decorate_function,
+the governor is pinned to each level, and every call is timed with timeit
+against the same call unwrapped. Full cProfile calls are dominated by the
+profiler and the flush thread, so only the off and timing levels are
+measured.
+
+Run from the setup directory, with cherrypy importable:
+    python benchmarks/wrapper_overhead.py [calls] [repeats]
+
+Calls defaults to 200000 and repeats to 5; the best of the repeats is
+reported. The script only uses decorate_function and the governor's levels,
+so it runs unchanged against older wrappers, e.g. check out the parent of
+the commit that replaced StatWrapper to compare the two.
+"""
+import os
+import sys
+import timeit
+
+import cherry_pyformance
+
+
+def target():
+    pass
+
+
+class Target(object):
+
+    def method(self):
+        pass
+
+
+def per_call(statement, setup, calls, repeats):
+    timer = timeit.Timer(statement, setup)
+    return min(timer.repeat(repeats, calls)) / calls
+
+
+def main(calls=200000, repeats=5):
+    config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+    cherry_pyformance.initialise(config, {'handlers': {},
+                                          'ignored_handlers': {},
+                                          'functions': {}})
+    from cherry_pyformance import governor
+    from cherry_pyformance.function_profiler import decorate_function, function_stats_buffer
+
+    setup = 'from __main__ import target, Target; instance = Target()'
+    statements = {'function': 'target()', 'method': 'instance.method()'}
+    bare = dict((name, per_call(statement, setup, calls, repeats))
+                for name, statement in statements.items())
+
+    decorate_function(__name__, 'target')
+    decorate_function(__name__, 'Target.method')
+    print 'level   target    overhead'
+    for level in (governor.OFF, governor.TIMING):
+        # older wrappers leave the class out of a method's name
+        for governor_name in ('__main__.target', '__main__.method', '__main__.Target.method'):
+            governor.levels[('function', governor_name)] = level
+        for name in ('function', 'method'):
+            wrapped = per_call(statements[name], setup, calls, repeats)
+            function_stats_buffer.clear()
+            print '{0:<7} {1:<9} {2:.2f}us'.format(level, name, (wrapped - bare[name]) * 1e6)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -29,15 +29,22 @@ def get_stat(item, stat):
         return 0
 
 
+def get_server_address():
+    """
+    Returns the address of the stats server from the output config.
+    """
+    location = str(cfg['output']['location']).strip().rstrip('/')
+    return location if '://' in location else 'http://'+location
+
+
 def create_output_fn():
     """
     Creates an output function for dealing with the stats_buffer on flush.
     Uses the configuration to determine the method (write or POST) and
     location to push the data to and constructs a function based on this.
     """
-    location = str(cfg['output']['location'])
+    address = get_server_address()
     # Need to change to getBool
-    address = location if location.startswith('http://') else 'http://'+location
     compress = True if cfg['output']['compress']=='true' else False
     if compress:
         import zlib
@@ -63,10 +70,15 @@ def create_output_fn():
     return push_stats_fn
 
 
-def load_config(config_file_path=None):
+def get_config_file_path(config_file_path=None):
     if config_file_path is None:
         # Get the directory where the executing script lives in and copy the default config in there if nothing is supplied.
         config_file_path = os.path.join(os.path.dirname(inspect.stack()[-1][1]), "cherrypyformance_config.cfg")
+    return config_file_path
+
+
+def load_config(config_file_path=None):
+    config_file_path = get_config_file_path(config_file_path)
     config = ConfigParser.ConfigParser()
     
     config.read(config_file_path)
@@ -93,10 +105,7 @@ def setup_logging():
     return stat_logger
 
 
-def initialise(config_file_path=None, config_overwrites = None, start_now = False):
-    global cfg
-    cfg = load_config(config_file_path)
-    cfg['active'] = True
+def apply_overwrites(config, config_overwrites):
     #the config file contains default application monitoring, which can be shared by all instances of the same application
     #ie, endpoints to monitor / ignore
     #config overwrites can be specified by the appication afterwards for things that may change between rutimes
@@ -104,7 +113,20 @@ def initialise(config_file_path=None, config_overwrites = None, start_now = Fals
     #    frequency of logging
     if config_overwrites and type(config_overwrites) is dict:
         for k,v in config_overwrites.iteritems():
-            cfg[k] = v
+            config[k] = v
+    return config
+
+
+def initialise(config_file_path=None, config_overwrites = None, start_now = False):
+    config = load_config(config_file_path)
+    # the profilers import cfg by name, so it's filled in place
+    cfg.clear()
+    cfg.update(config)
+    cfg['active'] = True
+    apply_overwrites(cfg, config_overwrites)
+    # kept so the config can be reloaded at runtime, see reconfigure.py
+    cfg['config_file_path'] = get_config_file_path(config_file_path)
+    cfg['config_overwrites'] = config_overwrites
 
     global stat_logger
     stat_logger = setup_logging()
@@ -117,13 +139,35 @@ def initialise(config_file_path=None, config_overwrites = None, start_now = Fals
                               'type': 'default_type',
                               'stats': []}
 
+    import startup_profiler
+    if cfg.get('startup', {}).get('startup_enabled', 'false') == 'true':
+        # time the imports from here on, as early as possible
+        startup_profiler.install()
+    if startup_profiler.installed():
+        # only imports made while starting up are timed
+        if start_now:
+            startup_profiler.uninstall()
+        else:
+            cherrypy.engine.subscribe('start', startup_profiler.uninstall, 100)
+
+    if cfg.get('threads', {}).get('profile_threads', 'false') == 'true':
+        from thread_profiler import hook_threads
+        # threads started while a handler or function is profiled are profiled too
+        hook_threads()
+
+    if cfg.get('locks', {}).get('locks_enabled', 'false') == 'true':
+        from lock_profiler import hook_locks
+        # before functions are wrapped, modules imported from here on get the profiled locks
+        hook_locks()
+
     if cfg['functions']:
         from function_profiler import decorate_functions
         # call this now and later, that way if imports overwrite our wraps
-        # then we re-wrap them again at engine start.
-        if start_now:
-            decorate_functions()
-        else:
+        # then we re-wrap them again at engine start. Calling it now also
+        # installs the import hook, so modules imported from here on are
+        # wrapped as they load.
+        decorate_functions()
+        if not start_now:
             cherrypy.engine.subscribe('start', decorate_functions, 0)
 
     if cfg['handlers']:
@@ -144,7 +188,35 @@ def initialise(config_file_path=None, config_overwrites = None, start_now = Fals
         else:
             cherrypy.engine.subscribe('start', decorate_connections, 0)
 
-    if cfg['files']['files_enabled']:
+    if cfg.get('reconfigure', {}).get('source', 'none') != 'none':
+        from reconfigure import poll_config
+        # poll once everything has been wrapped at engine start, then
+        # keep polling for changes.
+        if start_now:
+            poll_config()
+        else:
+            cherrypy.engine.subscribe('start', poll_config, 90)
+        poll_mon = Monitor(cherrypy.engine, poll_config,
+            frequency=int(cfg['reconfigure'].get('poll_interval', 60)),
+            name='Poll profiling config')
+        poll_mon.subscribe()
+        if start_now:
+            poll_mon.start()
+
+    if cfg.get('http', {}).get('http_enabled', 'false') == 'true' or \
+            cfg.get('trace', {}).get('trace_enabled', 'false') == 'true':
+        from http_profiler import decorate_http
+        # httplib's classes are patched in place, so no need to wait for engine start.
+        # traced requests send the trace header on through the same wrappers.
+        decorate_http()
+
+    if cfg.get('subprocess', {}).get('subprocess_enabled', 'false') == 'true':
+        from subprocess_profiler import decorate_subprocess
+        decorate_subprocess()
+
+    from file_profiler import files_enabled
+    from deep_capture import capture_possible
+    if files_enabled() or capture_possible():
         from file_profiler import decorate_open
         # this is very unlikely to be overwritten, call asap.
         decorate_open()
@@ -0,0 +1,110 @@
+"""
+Adaptive deep capture of slow requests.
+
+With [adaptive] adaptive_enabled = true, handlers under the stats tool are
+only timed. A rolling estimate of a high quantile of each handler's
+latency (the p99 by default) is kept from those timings, and when a
+request takes longer than threshold times that estimate the next
+capture_requests calls to the handler are fully cProfiled. The slow
+request is tagged with latency_breach and the profiled requests after it
+with adaptive_capture, so the call trees of anomalous requests can be
+found without paying for cProfile on every call.
+"""
+from threading import Lock
+
+from cherry_pyformance import cfg
+
+
+# script name and route of a handler -> RollingQuantile
+estimates = {}
+# script name and route of a handler -> number of calls still to fully profile
+pending_captures = {}
+_adaptive_lock = Lock()
+
+
+class RollingQuantile(object):
+    """
+    A streaming estimate of a quantile which follows changes in latency.
+
+    The first warmup values are kept and the exact quantile taken from them,
+    after that each new value nudges the estimate up or down (stochastic
+    gradient descent on the quantile loss). The size of each nudge follows
+    a moving average of how far values are from their moving mean, so the
+    estimate settles at any scale of latency using constant memory.
+    """
+
+    RATE = 0.01
+
+    def __init__(self, quantile, warmup):
+        self.quantile = quantile
+        self.warmup = warmup
+        self.estimate = None
+        self.mean = 0.0
+        self.deviation = 0.0
+        self._values = []
+
+    def ready(self):
+        return self.estimate is not None
+
+    def add(self, value):
+        if self.estimate is None:
+            self._values.append(value)
+            if len(self._values) >= self.warmup:
+                values = sorted(self._values)
+                self.estimate = values[int(self.quantile * (len(values) - 1))]
+                self.mean = sum(values) / len(values)
+                self.deviation = sum(abs(v - self.mean) for v in values) / len(values)
+                self._values = None
+            return
+        self.mean += self.RATE * (value - self.mean)
+        self.deviation += self.RATE * (abs(value - self.mean) - self.deviation)
+        step = self.deviation
+        if value > self.estimate:
+            self.estimate += step * self.quantile
+        else:
+            self.estimate -= step * (1 - self.quantile)
+        if self.estimate < 0:
+            self.estimate = 0.0
+
+
+def enabled():
+    return cfg.get('adaptive', {}).get('adaptive_enabled', 'false') == 'true'
+
+
+def take_capture(path):
+    """
+    Returns True if this call to path should be fully profiled because a
+    recent call breached the latency baseline.
+    """
+    with _adaptive_lock:
+        remaining = pending_captures.get(path, 0)
+        if remaining <= 0:
+            return False
+        if remaining == 1:
+            del pending_captures[path]
+        else:
+            pending_captures[path] = remaining - 1
+        return True
+
+
+def observe(path, duration):
+    """
+    Adds a timed call to path to its latency estimate. If the call was over
+    threshold times the estimate, the next calls are queued for capture and
+    the ratio of the duration to the estimate is returned, otherwise None.
+    """
+    section = cfg['adaptive']
+    with _adaptive_lock:
+        estimate = estimates.get(path)
+        if estimate is None:
+            estimate = RollingQuantile(float(section.get('quantile', 0.99)),
+                                       int(section.get('warmup', 100)))
+            estimates[path] = estimate
+        ratio = None
+        if estimate.ready() and estimate.estimate > 0:
+            if duration > float(section.get('threshold', 3)) * estimate.estimate:
+                ratio = duration / estimate.estimate
+                if path not in pending_captures:
+                    pending_captures[path] = int(section.get('capture_requests', 3))
+        estimate.add(duration)
+        return ratio
@@ -0,0 +1,191 @@
+"""
+On-demand deep capture of requests to a handler.
+
+An operator asks the stats server (see its /deepcapture endpoint) for full
+cProfile and SQL stacks on the next N requests to a handler, from hosts
+matching some metadata. With [deep_capture] deep_capture_enabled = true
+the captures are polled on each flush. A new capture switches the stats
+tool on for the handler, the next N requests to it are profiled in full
+whatever the governor says, every SQL statement they run is recorded with
+its stack, and all of those records are tagged with deep_capture = id.
+Once the requests have been captured, or the capture is removed from the
+server, the handler goes back to how it was profiled before.
+
+A single request to a handler with the stats tool on can also ask to be
+deep captured by sending the X-CPF-Profile header with the value of
+profile_header_secret. Its records are tagged with a new profile_id, which
+is sent back in the X-CPF-Profile-Id response header and can be looked up
+on the server at /profiled?id=<profile_id>.
+"""
+import hmac
+import json
+import socket
+import threading
+import uuid
+from urllib import urlencode
+from urllib2 import urlopen, URLError
+
+import cherrypy
+
+from cherry_pyformance import cfg, stat_logger, get_server_address
+
+
+# full request path -> capture dict, with the number of requests still to capture
+captures = {}
+# ids of the captures this process has already picked up
+_seen = set()
+_capture_lock = threading.Lock()
+_local = threading.local()
+
+PROFILE_HEADER = 'X-CPF-Profile'
+PROFILE_ID_HEADER = 'X-CPF-Profile-Id'
+
+
+def enabled():
+    return cfg.get('deep_capture', {}).get('deep_capture_enabled', 'false') == 'true'
+
+
+def capture_possible():
+    """
+    Returns True if requests can be deep captured, by the server, the
+    profile header or adaptive capture. Captured requests record every
+    backend, so those which are switched off still need wrapping.
+    """
+    from adaptive import enabled as adaptive_enabled
+    return (enabled() or bool(cfg.get('deep_capture', {}).get('profile_header_secret', '')) or
+            adaptive_enabled())
+
+
+def current_capture():
+    """
+    Returns the metadata to tag records with if the request being handled
+    on this thread is deep captured, otherwise None.
+    """
+    return getattr(_local, 'capture', None)
+
+
+def set_current_capture(capture):
+    _local.capture = capture
+
+
+def _compare_digest(a, b):
+    """
+    Compares two strings in a time which doesn't depend on where they first
+    differ, for pythons before 2.7.7 which have no hmac.compare_digest.
+    """
+    if len(a) != len(b):
+        return False
+    result = 0
+    for x, y in zip(a, b):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+compare_digest = getattr(hmac, 'compare_digest', _compare_digest)
+
+
+def requested_profile(request):
+    """
+    Returns a new profile id if the request asked to be deep captured with
+    the profile header and the right secret, otherwise None.
+    """
+    secret = cfg.get('deep_capture', {}).get('profile_header_secret', '')
+    value = request.headers.get(PROFILE_HEADER)
+    if not secret or value is None:
+        return None
+    if not compare_digest(str(value), secret):
+        return None
+    return uuid.uuid4().hex
+
+
+def _split_path(path):
+    """
+    Splits a full request path into the script name of the app mounted on
+    it and the path of the handler within that app.
+    """
+    root = cherrypy.tree.script_name(path)
+    if root is None:
+        raise KeyError(path)
+    return root, path[len(root):] or '/'
+
+
+def start_capture(capture_id, path, requests):
+    from handler_profiler import set_handler_state
+    root, handler = _split_path(path)
+    app = cherrypy.tree.apps[root]
+    with _capture_lock:
+        if path in captures:
+            # already capturing this handler, keep its original state
+            previous = captures[path]['previous']
+        else:
+            previous = app.config.get(handler, {}).get('tools.stats.on')
+        captures[path] = {'id': capture_id,
+                          'remaining': requests,
+                          'root': root,
+                          'handler': handler,
+                          'previous': previous}
+    set_handler_state(root, handler, True)
+    stat_logger.info('Deep capturing the next {0} requests to {1}'.format(requests, path))
+
+
+def stop_capture(path):
+    from handler_profiler import set_handler_state
+    with _capture_lock:
+        capture = captures.pop(path, None)
+    if capture is None:
+        return
+    set_handler_state(capture['root'], capture['handler'], capture['previous'])
+    stat_logger.info('Finished deep capture {0} of {1}'.format(capture['id'], path))
+
+
+def take_capture(path):
+    """
+    Counts a request to path against its capture. Returns the capture id
+    if the request should be deep captured, otherwise None.
+    """
+    with _capture_lock:
+        capture = captures.get(path)
+        if capture is None or capture['remaining'] <= 0:
+            return None
+        capture['remaining'] -= 1
+        return capture['id']
+
+
+def finish_capture(path):
+    """
+    Called at the end of a captured request, reverts the handler once its
+    capture has no requests left.
+    """
+    capture = captures.get(path)
+    if capture is not None and capture['remaining'] <= 0:
+        stop_capture(path)
+
+
+def poll_captures():
+    """
+    Picks up new deep captures for this host from the stats server, and
+    stops any which have been removed or have expired.
+    """
+    params = dict(cfg['metadata'])
+    params['hostname'] = socket.gethostname()
+    address = '{0}/deepcapture?{1}'.format(get_server_address(), urlencode(params))
+    try:
+        server_captures = json.loads(urlopen(address, timeout=10).read())
+    except (URLError, socket.error, ValueError) as e:
+        stat_logger.error('Could not poll deep captures: {0}'.format(e))
+        return
+
+    active_ids = set()
+    for capture in server_captures:
+        active_ids.add(capture['id'])
+        if capture['id'] in _seen:
+            continue
+        _seen.add(capture['id'])
+        try:
+            start_capture(capture['id'], str(capture['handler']), int(capture['requests']))
+        except KeyError:
+            stat_logger.warning('No app mounted for {0}, could not deep capture it.'.format(capture['handler']))
+
+    for path, capture in captures.items():
+        if capture['id'] not in active_ids:
+            stop_capture(path)
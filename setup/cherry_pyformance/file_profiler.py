@@ -1,6 +1,9 @@
 import __builtin__
 import time
 from cherry_pyformance import cfg, stat_logger
+from overhead import add_overhead, timer
+from deep_capture import current_capture
+from trace_context import current_trace, stamp
 import os
 
 
@@ -8,9 +11,14 @@ import os
 file_stats_buffer = {}
 
 
+def files_enabled():
+    # the value may carry an inline comment, e.g. "true # Turn on/off ..."
+    return cfg.get('files', {}).get('files_enabled', 'false').split('#')[0].strip() == 'true'
+
+
 class FileWrapper(object):
 
-    def __init__(self, file, datetime, time_to_open):
+    def __init__(self, file, datetime, time_to_open, capture, trace):
         self.open_time = time.clock()
         self.file = file
         self.fullname = os.path.abspath(file.name)
@@ -21,6 +29,9 @@ class FileWrapper(object):
         self.mode = file.mode
         self.datetime = datetime
         self.time_to_open = time_to_open
+        # the deep capture and trace of the request which opened the file
+        self.capture = capture
+        self.trace = trace
         self.written = 0
         self.closed = False
         self.encoding = file.encoding
@@ -72,16 +83,23 @@ class FileWrapper(object):
     def __exit__(self, *args, **kwargs):
         self.close_time = time.clock()
         self.file.close()
+        start = timer()
         if cfg['files']['ignored_directories']:
             for file_path in cfg['files']['ignored_directories'].split(','):
                 if file_path in self.fullname.replace('\\','/'):
+                    add_overhead('file', timer() - start, calls=0)
                     return
-        file_stats_buffer[id(self)] = {'datetime':self.datetime,
-                                       'duration':self.close_time-self.open_time,
-                                       'time_to_open':self.time_to_open,
-                                       'data_written':self.written,
-                                       'filename':self.relname,
-                                       'mode':self.mode}
+        record = {'datetime':self.datetime,
+                  'duration':self.close_time-self.open_time,
+                  'time_to_open':self.time_to_open,
+                  'data_written':self.written,
+                  'filename':self.relname,
+                  'mode':self.mode}
+        if self.capture is not None:
+            record['metadata'] = dict(self.capture)
+        stamp(record, self.trace)
+        file_stats_buffer[id(self)] = record
+        add_overhead('file', timer() - start, calls=0)
 
 
 class OpenFn(object):
@@ -89,15 +107,27 @@ class OpenFn(object):
     def __init__(self, old_open):
         self.old_open = old_open
 
-    def __call__(self, filename, mode='r'):
+    def __call__(self, *args, **kwargs):
+        start = timer()
+        capture = current_capture()
+        # every file a deep captured request opens is recorded
+        if capture is None and not files_enabled():
+            return self.old_open(*args, **kwargs)
         datetime = time.time()
         before_open = time.clock()
-        f = self.old_open(filename, mode)
+        wrapped_start = timer()
+        f = self.old_open(*args, **kwargs)
+        wrapped_end = timer()
         time_to_open = time.clock() - before_open
-        return FileWrapper(f, datetime, time_to_open)
+        wrapper = FileWrapper(f, datetime, time_to_open, capture, current_trace())
+        add_overhead('file', (wrapped_start - start) + (timer() - wrapped_end),
+                     wrapped_end - wrapped_start)
+        return wrapper
 
 def decorate_open():
     _open = __builtin__.open
+    if isinstance(_open, OpenFn):
+        return
     stat_logger.info('Wrapping file access functions')
     __builtin__.open = OpenFn(_open)
 
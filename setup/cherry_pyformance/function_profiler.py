@@ -9,103 +9,244 @@ flushed out to json on the filesystem or pushed to the
 stats server where the data will be analysed and displayed.
 """
 import cProfile
+import imp
 import inspect
 import time
 import sys
+from fnmatch import fnmatchcase
+from functools import wraps
 from threading import Thread
 import cPickle
 import traceback
 
 from cherry_pyformance import cfg, get_stat, stat_logger
+from overhead import add_overhead, profile_call_cost, profiled_calls, timer
+from governor import profile_mode, FULL, TIMING, OFF
+import profile_context
+from trace_context import stamp
+from stream_profiler import ProfiledStream, is_stream
 
 
 
 function_stats_buffer = {}
 
+# (module_str, func_str) -> (owner, attribute, original function) for every
+# function that has been wrapped, so that the wrapping can be undone.
+wrapped_functions = {}
+# stands in for the original of a method wrapped on a class which inherits it
+INHERITED = object()
+
 #=====================================================#
 
-class StatWrapper(object):
+def stat_wrapper(function, inner_func=None, class_name=None):
     """
-    A wrapper class which takes profile data of the wrapped function when called.
-    
+    Returns a wrapper function which takes profile data of function when called.
+
     If an inner_func is supplied (implying the function is actually a decorated
     version of inner_func), the inner_func's details (module name etc.) are used
     on the stat record, but the decorated version is used for profiling.
+    Methods are given the class_name they're wrapped on, so a method and its
+    override have their own records and governor levels.
+
+    The wrapper is a plain function, so it binds as a method just like the
+    function it wraps. It keeps the function it wraps in _cpf_wrapped, which
+    is how is_stat_wrapper knows not to wrap it again.
     """
-    
-    def __init__(self, function, inner_func=None):
-        self.function = function
-        # hide the wrapper from itself if there is recursive profiling 
-        self.func_closure = [function]
-        # If there is an inner_func, get some metadata from there
-        # otherwise, use function's metadata
-        self._inner_func = inner_func if inner_func else function
-
-        self.__name__ = self._inner_func.__name__
-        self.module_name = inspect.getmodule(self._inner_func).__name__
-        class_name = self._inner_func.__class__.__name__
-        self.class_name = class_name if class_name != 'function' else None
-
-    def __call__(self, *args, **kwargs):
-        _id = id(time.time())
+    # If there is an inner_func, get some metadata from there
+    # otherwise, use function's metadata
+    inner_func = inner_func if inner_func else function
+    function_name = inner_func.__name__
+    module_name = inspect.getmodule(inner_func).__name__
+    if class_name is None:
+        class_name = inner_func.__class__.__name__
+        class_name = class_name if class_name != 'function' else None
+        # the name the governor knows this function by
+        governor_name = '.'.join([module_name, function_name])
+    else:
+        governor_name = '.'.join([module_name, class_name, function_name])
+
+    @wraps(inner_func)
+    def wrapper(*args, **kwargs):
+        start = timer()
+        mode = profile_mode('function', governor_name)
+        if mode == OFF:
+            wrapped_start = timer()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                wrapped_end = timer()
+                add_overhead('function', (wrapped_start - start) + (timer() - wrapped_end),
+                             wrapped_end - wrapped_start, name=governor_name)
+        outer = profile_context.active()
+        if mode == TIMING or outer is not None:
+            datetime = float(time.time())
+            if outer is not None:
+                depth = profile_context.enter_span()
+            wrapped_start = timer()
+            result = None
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                wrapped_end = timer()
+                if outer is not None:
+                    # a profiler is already running on this thread, starting another
+                    # would corrupt it. Add a span to its record instead.
+                    profile_context.exit_span(outer, governor_name, wrapped_start, wrapped_end, depth)
+                # a timing only record, there is no profile to pickle so it's ready to flush
+                record = {'datetime': datetime,
+                          'profile': None,
+                          'duration': wrapped_end - wrapped_start,
+                          'module': module_name,
+                          'class': class_name,
+                          'function': function_name}
+                if is_stream(result):
+                    # a generator, the record is ready once it has been iterated
+                    del record['duration']
+                stamp(record)
+                function_stats_buffer[id(record)] = record
+                add_overhead('function', (wrapped_start - start) + (timer() - wrapped_end),
+                             wrapped_end - wrapped_start, name=governor_name)
+            if is_stream(result):
+                def finish(total):
+                    record['duration'] = total
+                result = ProfiledStream(result, record, False, wrapped_start, wrapped_end - wrapped_start, finish)
+            return result
+
         # initialise the item on the buffer
-        function_stats_buffer[_id] = {'datetime': float(time.time()),
-                                      'profile': cProfile.Profile()}
-        output = function_stats_buffer[_id]['profile'].runcall(self.function, *args, **kwargs)
-        Thread(target=self._after, args=(_id,)).start()
-        return output
-
-    def _after(self, _id):
-        """
-        Pushes the stats collected to the buffer.
-        """
-        if _id in function_stats_buffer:
-            function_stats_buffer[_id]['module'] = self.module_name
-            function_stats_buffer[_id]['class'] = self.class_name
-            function_stats_buffer[_id]['function'] = self.__name__
-            
-            stats = function_stats_buffer[_id]['profile']
-            stats.create_stats()
-            # pickle stats and put back on the buffer for flushing
-            pickled_stats = cPickle.dumps(stats.stats)
-            function_stats_buffer[_id]['profile'] = pickled_stats
+        record = {'datetime': float(time.time()),
+                  'profile': cProfile.Profile(),
+                  'module': module_name,
+                  'class': class_name,
+                  'function': function_name}
+        stamp(record)
+        _id = id(record)
+        function_stats_buffer[_id] = record
+        profile_context.start(record)
+        wrapped_start = timer()
+        result = None
+        try:
+            result = record['profile'].runcall(function, *args, **kwargs)
+        finally:
+            wrapped_end = timer()
+            profile_context.stop()
+            # a generator's profile is pickled once it has been iterated
+            if not is_stream(result):
+                Thread(target=_after, args=(_id, wrapped_end - wrapped_start, governor_name)).start()
+            add_overhead('function', (wrapped_start - start) + (timer() - wrapped_end),
+                         wrapped_end - wrapped_start, name=governor_name)
+        if is_stream(result):
+            def finish(total):
+                Thread(target=_after, args=(_id, total, governor_name)).start()
+            result = ProfiledStream(result, record, True, wrapped_start, wrapped_end - wrapped_start, finish)
+        return result
+
+    wrapper._cpf_wrapped = function
+    return wrapper
+
+
+def _after(_id, wrapped, governor_name):
+    """
+    Pushes the stats collected to the buffer.
+    """
+    if _id in function_stats_buffer:
+        start = timer()
+        stats = function_stats_buffer[_id]['profile']
+        stats.create_stats()
+        # pickle stats and put back on the buffer for flushing
+        pickled_stats = cPickle.dumps(stats.stats)
+        function_stats_buffer[_id]['profile'] = pickled_stats
+        # the profiler's own cost is hidden inside the wrapped time,
+        # so estimate it from the number of calls it recorded.
+        profiler_cost = min(profiled_calls(stats.stats) * profile_call_cost(), wrapped)
+        add_overhead('function', timer() - start + profiler_cost, -profiler_cost, calls=0,
+                     name=governor_name)
+
+
+def is_stat_wrapper(function):
+    """
+    True if function, or the function in a classmethod or staticmethod, has
+    already been wrapped by stat_wrapper.
+    """
+    function = getattr(function, '__func__', function)
+    return hasattr(function, '_cpf_wrapped')
 
 #=====================================================#
 
 def get_wrapped(function):
     inner_func = function
     # recursively look through the func_closure items and look for callables.
-    while inner_func.func_closure is not None:
+    while getattr(inner_func, 'func_closure', None) is not None:
         for item in inner_func.func_closure:
-            # have to test if it's a function first as that's how we trick ourself
-            # by putting the function in a func_closure attr. See StatWrapper __init__.
-            # After test for the default: cell objects
-            if hasattr(item,'__call__'):
-                inner_func = item
-                break
+            # test the cell contents for callables
             if hasattr(item.cell_contents,'__call__'):
                 inner_func = item.cell_contents
                 # break the for loop if one is found. Not a perfect solution, but will work 99% of cases
                 # seldom will decorators have multiple callables in the closure items - I hope
                 break
+        else:
+            # a closure with no callables in it, this is the innermost function
+            break
 
-    # if nothing changes, don't bother passing both functions to the StatWrapper __init__
+    # if nothing changes, don't bother passing both functions to stat_wrapper
     if inner_func is function:
         inner_func = None
     return function, inner_func
 
 
+def find_attribute(owner, attribute):
+    """
+    Returns owner.attribute as it is stored, without binding or unbinding a
+    method, and whether owner inherits it from a base class.
+    """
+    if inspect.isclass(owner):
+        for klass in inspect.getmro(owner):
+            if attribute in vars(klass):
+                return vars(klass)[attribute], klass is not owner
+    elif hasattr(owner, '__dict__') and attribute in vars(owner):
+        return vars(owner)[attribute], False
+    return getattr(owner, attribute), False
+
+
+def wrap_attribute(owner, attribute):
+    """
+    Replaces owner.attribute with a stat_wrapper of it, keeping it the same
+    kind of method if owner is a class. Returns the original attribute,
+    INHERITED if owner had none of its own, or None if it was already
+    wrapped.
+    """
+    original, inherited = find_attribute(owner, attribute)
+    if is_stat_wrapper(original):
+        if not inherited:
+            return None
+        # wrapped on a base class, wrap what it wraps under this class' name
+        function = getattr(original, '__func__', original)._cpf_wrapped
+        if isinstance(original, (classmethod, staticmethod)):
+            function = type(original)(function)
+        original = function
+
+    class_name = owner.__name__ if inspect.isclass(owner) else None
+    if isinstance(original, (classmethod, staticmethod)):
+        outer_func, inner_func = get_wrapped(original.__func__)
+        wrapped = type(original)(stat_wrapper(outer_func, inner_func, class_name))
+    else:
+        outer_func, inner_func = get_wrapped(original)
+        wrapped = stat_wrapper(outer_func, inner_func, class_name)
+    setattr(owner, attribute, wrapped)
+    return INHERITED if inherited else original
+
+
 def decorate_function(module_str,func_str):
     """
     Takes the string of a module, i.e. "serv.core.some_module.some_function"
     and acquires the actual function (or method) object. It does this by splitting
     the string, importing the root module, recursively uses getattr to acquire
-    the submodules. Finally it replaces the object with an instance of StatWrapper
-    which wraps that function.
+    the submodules. Finally it replaces the object with a stat_wrapper of that
+    function. Methods are replaced with the same kind of method (instance,
+    class or static) and functions which are already wrapped are left alone.
 
     If the function in question is wrapped with a decorator, the decorator function's
     closure items are scanned for the raw function. This is also used in generating
-    the StatWrapper object so that the original, unwrapped functions name and module
+    the stat_wrapper so that the original, unwrapped functions name and module
     name can be used on the stat record.
 
     How the function in the argument is imported will affect when this function must be
@@ -127,43 +268,214 @@ def decorate_function(module_str,func_str):
 
         path = func_str.split('.')
 
-        attribute = path[0]
-        function = getattr(module, attribute)
         # loop through the submodules to get their instances
-        for attribute in path[1:]:
-            module = function
-            function = getattr(function, attribute)
-
-        # at this point we need to test if the function is wrapped
-        outer_func, inner_func = get_wrapped(function)
-        
-        # replace the function instance with a wrapped one.
-        setattr(module, attribute, StatWrapper(outer_func, inner_func))
+        for attribute in path[:-1]:
+            module = getattr(module, attribute)
+        attribute = path[-1]
+
+        # replace the function instance with a wrapped one, unless it already
+        # is one, i.e. from the import hook or an earlier engine start.
+        original = wrap_attribute(module, attribute)
+        # keep hold of the very first original, in case this is a re-wrap
+        if original is not None and (module_str, func_str) not in wrapped_functions:
+            wrapped_functions[(module_str, func_str)] = (module, attribute, original)
     except Exception:
         stat_logger.warning('Failed to wrap function {0} for stats profiling'.format('.'.join([module_str,func_str])))
 
+
+def undecorate_function(module_str, func_str):
+    """
+    Puts back the original function replaced by decorate_function. Only the
+    attribute decorate_function replaced is restored, any names bound to the
+    wrapper elsewhere (i.e. "from a.b import c") keep profiling.
+    """
+    if (module_str, func_str) in wrapped_functions:
+        module, attribute, function = wrapped_functions.pop((module_str, func_str))
+        if function is INHERITED:
+            delattr(module, attribute)
+        else:
+            setattr(module, attribute, function)
+
+
+def function_targets(function_dict):
+    """
+    Returns the set of (module, function) pairs listed in a [functions]
+    config section. Either may be a glob pattern.
+    """
+    targets = set()
+    for module in function_dict.keys():
+        function_string = function_dict[module]
+        if function_string:
+            for function in function_string.split(','):
+                targets.add((module, function))
+    return targets
+
+
+def is_pattern(name):
+    return any(char in name for char in '*?[')
+
+
+def _match(name, pattern):
+    # patterns only match private names if they ask for them
+    if is_pattern(pattern) and name.startswith('_') and not pattern.startswith('_'):
+        return False
+    return fnmatchcase(name, pattern)
+
+
+def _match_path(func_str, func_pattern):
+    names = func_str.split('.')
+    patterns = func_pattern.split('.')
+    return len(names) == len(patterns) and all(_match(n, p) for n, p in zip(names, patterns))
+
+
+def target_matches(module_str, func_str, targets):
+    """
+    True if the function func_str in module_str is one of the targets.
+    """
+    for module_pattern, func_pattern in targets:
+        if _match(module_str, module_pattern) and _match_path(func_str, func_pattern):
+            return True
+    return False
+
+
+def _defined_in(obj, module):
+    return getattr(obj, '__module__', None) == module.__name__
+
+
+def matching_functions(module, func_pattern):
+    """
+    Returns the func_strs of the functions, and methods of classes, defined
+    in module which match func_pattern. An exact func_pattern is returned
+    as is, it doesn't have to be defined in the module.
+    """
+    if not is_pattern(func_pattern):
+        return [func_pattern]
+    patterns = func_pattern.split('.')
+    matches = []
+    for name, obj in vars(module).items():
+        if not _match(name, patterns[0]) or not _defined_in(obj, module):
+            continue
+        if len(patterns) == 1 and inspect.isfunction(obj):
+            matches.append(name)
+        elif len(patterns) == 2 and inspect.isclass(obj):
+            for method_name, method in vars(obj).items():
+                # class and static methods keep their function in __func__
+                if _match(method_name, patterns[1]) and inspect.isfunction(getattr(method, '__func__', method)):
+                    matches.append('.'.join([name, method_name]))
+    return matches
+
+
+def wrap_module(module, targets):
+    """
+    Wraps every function in module that is one of the targets.
+    """
+    for module_pattern, func_pattern in targets:
+        if _match(module.__name__, module_pattern):
+            for func_str in matching_functions(module, func_pattern):
+                decorate_function(module.__name__, func_str)
+
+
+def wrap_loaded_modules(targets):
+    """
+    Wraps the targets in every module that has already been imported.
+    """
+    for module in sys.modules.values():
+        # sys.modules has None entries for failed relative imports
+        if module is not None:
+            wrap_module(module, targets)
+
+
+def apply_function_targets(targets):
+    """
+    Makes the wrapped functions match a new set of targets: unwraps the
+    functions which are no longer targeted and wraps those that are newly
+    targeted in modules that have already been imported. The import hook
+    picks up the rest as they're imported.
+    """
+    for module_str, func_str in wrapped_functions.keys():
+        if not target_matches(module_str, func_str, targets):
+            undecorate_function(module_str, func_str)
+    wrap_loaded_modules(targets)
+
+
+class FunctionImportHook(object):
+    """
+    A sys.meta_path hook which wraps the functions in [functions] as their
+    modules are imported.
+
+    The hook only claims modules whose names match a target. It finds and
+    loads them as the normal import would, then wraps them before the import
+    statement which asked for them gets them back. This means modules never
+    have to be imported just so they can be wrapped and that
+    "from a.b import c" binds the wrapped c, as long as a.b wasn't imported
+    before the hook was installed. Modules which imp can't find, such as
+    those in zipped eggs, are left to the normal import machinery and
+    wrapped with the loaded modules on the next decorate_functions.
+    """
+
+    def __init__(self, targets):
+        self.targets = targets
+
+    def find_module(self, fullname, path=None):
+        if not any(_match(fullname, module_pattern) for module_pattern, func_pattern in self.targets):
+            return None
+        try:
+            found = imp.find_module(fullname.rpartition('.')[2], path)
+        except ImportError:
+            # let the normal import machinery find it, or fail in the normal way
+            return None
+        return FunctionLoader(self, found)
+
+
+class FunctionLoader(object):
+
+    def __init__(self, hook, found):
+        self.hook = hook
+        self.found = found
+
+    def load_module(self, fullname):
+        file, pathname, description = self.found
+        try:
+            # errors raised by the module itself propagate as normal
+            module = imp.load_module(fullname, file, pathname, description)
+        finally:
+            if file is not None:
+                file.close()
+        try:
+            wrap_module(module, self.hook.targets)
+        except Exception:
+            # never break an import because of profiling
+            pass
+        return module
+
+
+def install_import_hook(targets):
+    """
+    Installs the import hook for targets, or gives the installed one the new
+    targets.
+    """
+    for hook in sys.meta_path:
+        if isinstance(hook, FunctionImportHook):
+            hook.targets = targets
+            return
+    # after the startup profiler's hook, which times the modules this one loads
+    sys.meta_path.append(FunctionImportHook(targets))
+
 #=====================================================#
 
 def decorate_functions():
     """
-    A function to apply the StatWrapper to other functions in the config.
+    A function to apply the stat_wrapper to other functions in the config.
     
-    This function must be called after the apps have been mounted to the
-    tree, otherwise there will be no config to alter. However normally
-    this module is imported before the engine is setup, so that initialising
-    functions can be profiled. Therefore this function is hooked to the
-    'start' call on the cherrypy bus with a high priority.
+    Functions in modules that have already been imported are wrapped now,
+    the rest are wrapped by the import hook when their modules are imported.
+    Wrapping is done at initialise and again on the 'start' call on the
+    cherrypy bus, in case imports in between have overwritten our wraps.
     """
 
     # decorate all functions supplied in config
     stat_logger.info('Wrapping functions for stats gathering')
-    function_dict = cfg['functions']
-    if function_dict:
-        module_list = function_dict.keys()
-        for module in module_list:
-            function_string = function_dict[module]
-            if function_string:
-                function_list = function_string.split(',')
-                for function in function_list:
-                    decorate_function(module,function)
+    targets = function_targets(cfg['functions'])
+    install_import_hook(targets)
+    wrap_loaded_modules(targets)
 
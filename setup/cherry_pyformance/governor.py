@@ -0,0 +1,157 @@
+"""
+An overhead governor which degrades profiling depth under load.
+
+Every profiled handler and function runs at one of four levels:
+full cProfile, sampled cProfile (one in every sample_rate calls is
+profiled, the rest are only timed), timing only or off. On each flush the
+governor compares the overhead measured since the last flush (see
+overhead.py) and the number of buffered records against the budgets in
+the [governor] section of the config. Over budget, the most expensive
+targets are stepped down a level until the projected overhead fits, under
+budget they are stepped back up one level at a time. Every change of level
+is put on the governor_stats_buffer and pushed to the server.
+"""
+import time
+from itertools import count
+from threading import Lock
+
+from cherry_pyformance import cfg, stat_logger
+from overhead import pop_name_totals, timer
+
+FULL = 'full'
+SAMPLED = 'sampled'
+TIMING = 'timing'
+OFF = 'off'
+
+LEVELS = (FULL, SAMPLED, TIMING, OFF)
+
+# only step back up when the overhead is below this fraction of the budget,
+# stops targets flip-flopping between two levels.
+STEP_UP_RATIO = 0.5
+
+governor_stats_buffer = {}
+
+# (stat_type, name) -> level, targets which aren't here are at FULL
+levels = {}
+# level -> measured overhead per call at that level
+level_costs = {}
+
+# (stat_type, name) -> count of calls to sampled targets
+_sample_counts = {}
+_transition_ids = count()
+_last_evaluated = [timer()]
+_governor_lock = Lock()
+
+
+def enabled():
+    return cfg.get('governor', {}).get('governor_enabled', 'false') == 'true'
+
+
+def profile_mode(stat_type, name):
+    """
+    Returns how a single call to the named handler or function should be
+    profiled: FULL, TIMING or OFF. Sampled targets return FULL for one in
+    every sample_rate calls and TIMING otherwise.
+    """
+    level = levels.get((stat_type, name), FULL)
+    if level == SAMPLED:
+        key = (stat_type, name)
+        # next on a count is atomic, so concurrent calls each get their own number
+        counter = _sample_counts.get(key) or _sample_counts.setdefault(key, count(1))
+        if next(counter) % int(cfg['governor'].get('sample_rate', 10)) == 0:
+            return FULL
+        return TIMING
+    return level
+
+
+def _step(level, steps):
+    index = LEVELS.index(level) + steps
+    return LEVELS[min(max(index, 0), len(LEVELS) - 1)]
+
+
+def _cost(level):
+    if level == OFF:
+        return 0.0
+    # a level we haven't measured yet is assumed to be free, if that's
+    # wrong it'll be stepped back down on the next evaluation.
+    return level_costs.get(level, 0.0)
+
+
+def _transition(key, old_level, new_level, fraction, records):
+    levels[key] = new_level
+    if new_level == FULL:
+        del levels[key]
+    governor_stats_buffer[next(_transition_ids)] = {'datetime': time.time(),
+                                                     'stat_type': key[0],
+                                                     'name': key[1],
+                                                     'from_level': old_level,
+                                                     'to_level': new_level,
+                                                     'overhead': fraction,
+                                                     'records': records}
+    stat_logger.info('Profiling of {0} {1} changed from {2} to {3}'.format(key[0], key[1], old_level, new_level))
+
+
+def evaluate(records):
+    """
+    Steps the profiling levels of targets up or down, based on the overhead
+    recorded since the last evaluation and the number of records currently
+    on the stats buffers.
+    """
+    with _governor_lock:
+        now = timer()
+        elapsed = now - _last_evaluated[0]
+        _last_evaluated[0] = now
+        totals = pop_name_totals()
+        if not enabled() or elapsed <= 0:
+            return
+
+        budget = float(cfg['governor'].get('overhead_budget', 0.02))
+        buffer_budget = int(cfg['governor'].get('buffer_budget', 10000))
+
+        # update the measured cost per call of each level
+        level_totals = {}
+        for key, (calls, overhead) in totals.iteritems():
+            if key[1] is None or not calls:
+                continue
+            level = levels.get(key, FULL)
+            level_total = level_totals.setdefault(level, [0, 0.0])
+            level_total[0] += calls
+            level_total[1] += overhead
+        for level, (calls, overhead) in level_totals.iteritems():
+            cost = overhead / calls
+            level_costs[level] = cost if level not in level_costs else 0.8 * level_costs[level] + 0.2 * cost
+
+        total_overhead = sum(overhead for calls, overhead in totals.itervalues())
+        fraction = total_overhead / elapsed
+        # only named handlers and functions can be stepped
+        targets = [(overhead, calls, key) for key, (calls, overhead) in totals.iteritems() if key[1] is not None]
+
+        if fraction > budget or records > buffer_budget:
+            projected_overhead = total_overhead
+            projected_records = records
+            # step down the most expensive targets first
+            for overhead, calls, key in sorted(targets, reverse=True):
+                if projected_overhead / elapsed <= budget and projected_records <= buffer_budget:
+                    break
+                level = levels.get(key, FULL)
+                if level == OFF:
+                    continue
+                new_level = _step(level, 1)
+                projected_overhead -= max(overhead - calls * _cost(new_level), 0.0)
+                if new_level == OFF:
+                    projected_records -= calls
+                _transition(key, level, new_level, fraction, records)
+
+        elif fraction < budget * STEP_UP_RATIO and records < buffer_budget * STEP_UP_RATIO:
+            projected_overhead = total_overhead
+            # step up the cheapest degraded targets first
+            for overhead, calls, key in sorted(targets):
+                level = levels.get(key, FULL)
+                if level == FULL:
+                    continue
+                new_level = _step(level, -1)
+                added = calls * max(_cost(new_level) - _cost(level), 0.0)
+                if (projected_overhead + added) / elapsed >= budget * STEP_UP_RATIO:
+                    break
+                projected_overhead += added
+                _transition(key, level, new_level, fraction, records)
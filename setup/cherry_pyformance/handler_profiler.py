@@ -9,6 +9,7 @@ flushed out to json on the filesystem or pushed to the
 stats server where the data will be analysed and displayed.
 """
 import cherrypy
+from cherrypy.lib.httputil import parse_query_string, valid_status
 import cProfile
 import inspect
 import time
@@ -16,9 +17,22 @@ import cPickle
 import traceback
 
 from cherry_pyformance import cfg, stat_logger
+from overhead import add_overhead, profile_call_cost, profiled_calls, timer
+from governor import profile_mode, FULL, TIMING, OFF
+import deep_capture
+import adaptive
+import routes
+import profile_context
+import trace_context
+from stream_profiler import ProfiledStream, close_stream, is_stream
 
 handler_stats_buffer = {}
 
+# the hook points of a request, in the order cherrypy runs them. The time
+# from each one to the next reached is recorded as the phase named after it.
+PHASES = ('on_start_resource', 'before_request_body', 'before_handler',
+          'before_finalize', 'on_end_resource', 'on_end_request')
+
 #=====================================================#
 
 class StatsTool(cherrypy.Tool):
@@ -38,7 +52,61 @@ class StatsTool(cherrypy.Tool):
         # Hooks the profile wrapper onto self._point
         # then also hooks self.record_stop after the response has been dealt
         cherrypy.Tool._setup(self)
-        cherrypy.serving.request.hooks.attach('on_end_request', self.record_stop)
+        request = cherrypy.serving.request
+        request.hooks.attach('on_end_request', self.record_stop)
+        # stamp each hook point before the other tools' hooks on it run
+        request._cpf_phases = []
+        for point in PHASES[:-1]:
+            request.hooks.attach(point, self.record_phase, priority=0, phase=point)
+        # the body is final once the before_finalize tools (e.g. gzip) have run
+        request.hooks.attach('on_end_resource', self.count_body, priority=100)
+
+    def record_phase(self, phase):
+        cherrypy.serving.request._cpf_phases.append((phase, timer()))
+
+    def count_body(self):
+        """
+        Streamed responses have no Content-Length, so their body is counted
+        as it is written out.
+        """
+        request = cherrypy.serving.request
+        response = cherrypy.serving.response
+        if response.headers.get('Content-Length') is None:
+            request._cpf_body_bytes = 0
+            response.body = self._counted(request, response.body)
+
+    def _counted(self, request, body):
+        try:
+            for chunk in body:
+                request._cpf_body_bytes += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    def _sizes(self, request, response):
+        """
+        Returns the request and response sizes and status of the request.
+        """
+        request_bytes = request.headers.get('Content-Length')
+        response_bytes = getattr(request, '_cpf_body_bytes', None)
+        if response_bytes is None:
+            response_bytes = response.headers.get('Content-Length')
+        return {'request_bytes': int(request_bytes) if request_bytes else None,
+                'response_bytes': int(response_bytes) if response_bytes is not None else None,
+                'status': valid_status(response.status)[0],
+                'query_params': len(parse_query_string(request.query_string))}
+
+    def _phases(self, request, end):
+        """
+        Returns the time spent in each phase of the request, from the
+        stamps made at its hook points up to end.
+        """
+        stamps = getattr(request, '_cpf_phases', []) + [('on_end_request', end)]
+        phases = {}
+        for (point, stamp), (next_point, next_stamp) in zip(stamps, stamps[1:]):
+            phases[point] = phases.get(point, 0.0) + (next_stamp - stamp)
+        return phases
 
     def callable(self):
         """
@@ -46,26 +114,88 @@ class StatsTool(cherrypy.Tool):
         on the handler_stats_buffer based on request metadata, then fires the handler
         while collecting its profile information.
         """
+        start = timer()
         request = cherrypy.serving.request
         handler = request.handler
         # Check if handler exists (might not for static requests)
         if handler:
+            if trace_context.enabled():
+                # the trace is passed on to outbound requests even if the handler isn't profiled
+                trace = trace_context.start_span(request.headers.get(trace_context.header_name()))
+                trace_context.set_current_trace(trace)
+                request._cpf_trace = trace
+                cherrypy.serving.response.headers[trace_context.header_name()] = trace_context.header_value(trace)
+            # deep captured requests, requests which ask for it with the profile
+            # header and adaptive captures are fully profiled whatever the governor says
+            path = request.script_name + request.path_info
+            route = routes.normalise(request.path_info)
+            # adaptive estimates are kept per route, record_stop observes the same key
+            request._cpf_adaptive_key = request.script_name + route
+            capture = None
+            if deep_capture.captures:
+                capture_id = deep_capture.take_capture(path)
+                if capture_id is not None:
+                    capture = {'deep_capture': capture_id}
+            if capture is None:
+                profile_id = deep_capture.requested_profile(request)
+                if profile_id is not None:
+                    capture = {'profile_id': profile_id}
+                    cherrypy.serving.response.headers[deep_capture.PROFILE_ID_HEADER] = profile_id
+            if capture is None and adaptive.enabled() and adaptive.take_capture(request._cpf_adaptive_key):
+                capture = {'adaptive_capture': 'true'}
+            if capture is None:
+                mode = profile_mode('handler', route)
+                # with adaptive capture, handlers are only timed until they get slow
+                if mode == FULL and adaptive.enabled():
+                    mode = TIMING
+            else:
+                mode = FULL
+            if mode == OFF:
+                add_overhead('handler', timer() - start, name=route)
+                return
             # Take the id of the request, this guarantees no cross-contamination
             # of stats as each record is tied to the id of an instance of a request.
             # These are guaranteed to be unique, even if two of the same request are
             # fired at the same time.
             req_id = id(request)
-            # initialise the item on the buffer
+            # initialise the item on the buffer, timing only records have no profile
             handler_stats_buffer[req_id] = {'datetime': float(time.time()),
-                                            'profile': cProfile.Profile()}
+                                            'profile': cProfile.Profile() if mode == FULL else None}
+            if capture is not None:
+                handler_stats_buffer[req_id]['metadata'] = capture
             # At this point the profile key of the object on the stats buffer has no
             # profile stats in it. It needs to be put in the buffer now as multiple
             # handler calls could be occuring simultaneously during the lifetime of
             # the tool instance.
             def wrapper(*args, **kwargs):
                 # profile the handler
-                return handler_stats_buffer[req_id]['profile'].runcall(handler, *args, **kwargs)
+                record = handler_stats_buffer[req_id]
+                wrapped_start = timer()
+                # lets the sql profiler tag statements run by a deep captured request
+                deep_capture.set_current_capture(capture)
+                try:
+                    if mode == TIMING:
+                        result = handler(*args, **kwargs)
+                    else:
+                        # wrapped functions called by the handler add spans to its record
+                        profile_context.start(record)
+                        result = record['profile'].runcall(handler, *args, **kwargs)
+                finally:
+                    if mode != TIMING:
+                        profile_context.stop()
+                    deep_capture.set_current_capture(None)
+                    record['_wrapped'] = timer() - wrapped_start
+                if is_stream(result):
+                    # the body is profiled as it is written out, which
+                    # finishes before record_stop is called
+                    def finish(total):
+                        record['_wrapped'] = total
+                    result = ProfiledStream(result, record, mode != TIMING, wrapped_start,
+                                            record['_wrapped'], finish)
+                    record['_stream'] = result
+                return result
             cherrypy.serving.request.handler = wrapper
+            handler_stats_buffer[req_id]['_overhead'] = timer() - start
 
     def record_stop(self):
         """
@@ -73,21 +203,55 @@ class StatsTool(cherrypy.Tool):
         are this request are called from the buffer, pickled and put back
         on the buffer. The result should be json serialisable.
         """
+        start = timer()
         request = cherrypy.serving.request
         req_id = id(request)
+        trace = getattr(request, '_cpf_trace', None)
+        if trace is not None:
+            trace_context.set_current_trace(None)
         if req_id in handler_stats_buffer:
             _module = inspect.getmodule(request.app.root.__class__).__name__
             _class = request.app.root.__class__.__name__
-            _method = request.path_info
+            # named after the route, not the path, which may hold ids
+            _method = routes.normalise(request.path_info)
+            handler_stats_buffer[req_id]['phases'] = self._phases(request, start)
+            handler_stats_buffer[req_id].update(self._sizes(request, cherrypy.serving.response))
             handler_stats_buffer[req_id]['module'] = _module
             handler_stats_buffer[req_id]['class'] = _class
             handler_stats_buffer[req_id]['function'] = _method
             
+            # a body which wasn't written out in full, e.g. the client went away
+            close_stream(handler_stats_buffer[req_id])
+
+            # keep the overhead accounting off the record that gets pushed
+            overhead = handler_stats_buffer[req_id].pop('_overhead', 0.0)
+            wrapped = handler_stats_buffer[req_id].pop('_wrapped', 0.0)
+
+            captured = 'metadata' in handler_stats_buffer[req_id]
+            if trace is not None:
+                trace_context.stamp_span(handler_stats_buffer[req_id], trace)
+
+            if 'deep_capture' in handler_stats_buffer[req_id].get('metadata', {}):
+                deep_capture.finish_capture(request.script_name + request.path_info)
+
             stats = handler_stats_buffer[req_id]['profile']
+            if stats is None:
+                # timing only, the record is ready to flush once it has a duration
+                handler_stats_buffer[req_id]['duration'] = wrapped
+                if adaptive.enabled() and not captured:
+                    if adaptive.observe(request._cpf_adaptive_key, wrapped) is not None:
+                        handler_stats_buffer[req_id].setdefault('metadata', {})['latency_breach'] = 'true'
+                add_overhead('handler', overhead + (timer() - start), wrapped, name=_method)
+                return
             stats.create_stats()
             # pickle stats and put back on the buffer for flushing
             pickled_stats = cPickle.dumps(stats.stats)
             handler_stats_buffer[req_id]['profile'] = pickled_stats
+            # the profiler's own cost is hidden inside the wrapped time,
+            # so estimate it from the number of calls it recorded.
+            profiler_cost = min(profiled_calls(stats.stats) * profile_call_cost(), wrapped)
+            add_overhead('handler', overhead + (timer() - start) + profiler_cost, wrapped - profiler_cost,
+                         name=_method)
 
 #=====================================================#
 
@@ -121,3 +285,34 @@ def decorate_handlers():
         stat_logger.warning('Stats configuration incorrect. Could not obtain handlers to wrap.')
     except Exception:
         stat_logger.warning('Failed to wrap cherrypy handler for stats profiling.')
+
+
+def handler_states(handlers, ignored_handlers):
+    """
+    Returns a dict of (root, handler) -> whether the stats tool should be on,
+    from [handlers] and [ignored_handlers] config sections.
+    """
+    states = {}
+    for section, state in ((handlers, True), (ignored_handlers, False)):
+        for root in section.keys():
+            if section[root]:
+                for handler in section[root].split(','):
+                    states[(str(root), str(handler))] = state
+    return states
+
+
+def set_handler_state(root, handler, state):
+    """
+    Turns the stats tool on or off for a handler of a mounted app while the
+    engine is running. A state of None removes the setting, so the handler
+    goes back to whatever its parent path has.
+    """
+    if not hasattr(cherrypy.tools, 'stats'):
+        cherrypy.tools.stats = StatsTool()
+    if root == '/': # Can't have empty key in config file
+        root = ''
+    app = cherrypy.tree.apps[root]
+    if state is None:
+        app.config.get(handler, {}).pop('tools.stats.on', None)
+    else:
+        app.merge({handler:{'tools.stats.on':state}})
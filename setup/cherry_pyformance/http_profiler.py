@@ -0,0 +1,244 @@
+"""
+Profiling of outbound HTTP requests.
+
+With [http] http_enabled = true, the methods of httplib.HTTPConnection and
+HTTPResponse are wrapped, which covers urllib2 and anything else built on
+httplib, HTTPS included. Each request is put on the http_stats_buffer and
+pushed to the server as the 'http' stat type, with:
+
+    host            host[:port] the request was sent to
+    method, path    the path has its query string dropped and its ids
+                    collapsed, see routes.collapse
+    status          the response status, None if there was no response
+    error           the exception the request failed with, if it did
+    dns             seconds resolving the host, when a connection was made
+    connect         seconds connecting, including the TLS handshake
+    ttfb            seconds from sending the request to the response headers
+    duration        seconds from the request starting until its response
+                    was read and closed
+    request_bytes   bytes sent, headers included
+    response_bytes  bytes of body read
+
+Requests to the stats server itself, and to the comma separated
+ignored_hosts, aren't profiled. With [trace] trace_enabled = true the
+connections are wrapped whether or not http_enabled is, to send the trace
+header on, see trace_context.py.
+"""
+import httplib
+import socket
+import time
+import urlparse
+
+from cherry_pyformance import cfg, stat_logger, get_server_address
+from overhead import add_overhead, timer
+from deep_capture import current_capture
+from trace_context import stamp, outbound_header
+from routes import collapse
+
+
+http_stats_buffer = {}
+
+_originals = {}
+
+
+def http_enabled():
+    return cfg.get('http', {}).get('http_enabled', 'false') == 'true'
+
+
+def normal_host(host):
+    """
+    Returns host[:port] lower cased, without the port if it's the default.
+    """
+    host = host.strip().lower()
+    for default in (httplib.HTTP_PORT, httplib.HTTPS_PORT):
+        if host.endswith(':{0}'.format(default)):
+            return host[:-len(str(default)) - 1]
+    return host
+
+
+def ignored(host):
+    hosts = cfg.get('http', {}).get('ignored_hosts', '').split(',')
+    # the location may be given with or without its scheme
+    hosts.append(urlparse.urlsplit(get_server_address()).netloc)
+    return normal_host(host) in [normal_host(ignored_host) for ignored_host in hosts if ignored_host]
+
+
+def host_name(connection):
+    if connection.port in (httplib.HTTP_PORT, httplib.HTTPS_PORT):
+        return connection.host
+    return '{0}:{1}'.format(connection.host, connection.port)
+
+
+def timed_create_connection(record):
+    """
+    Returns socket.create_connection, timing its name lookup into record.
+    """
+    def create_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        host, port = address
+        start = timer()
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        record['dns'] = timer() - start
+        error = None
+        for af, socktype, proto, canonname, sa in addresses:
+            sock = None
+            try:
+                sock = socket.socket(af, socktype, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sa)
+                return sock
+            except socket.error as e:
+                error = e
+                if sock is not None:
+                    sock.close()
+        if error is not None:
+            raise error
+        raise socket.error('getaddrinfo returns an empty list')
+    return create_connection
+
+
+def finish(record, error=None):
+    """
+    Ends record's request, once.
+    """
+    start = record.pop('_start', None)
+    if start is None:
+        return
+    record['duration'] = timer() - start
+    if error is not None:
+        record['error'] = type(error).__name__
+
+
+def putrequest(self, method, url, *args, **kwargs):
+    start = timer()
+    record = getattr(self, '_cpf_record', None)
+    if record is not None:
+        # the previous request never got its response
+        finish(record)
+    host = host_name(self)
+    if http_enabled() and not ignored(host):
+        record = {'datetime': time.time(),
+                  'host': host,
+                  'method': method,
+                  'path': collapse(urlparse.urlsplit(url).path or '/'),
+                  'status': None,
+                  'dns': None,
+                  'connect': None,
+                  'ttfb': None,
+                  'request_bytes': 0,
+                  'response_bytes': 0,
+                  '_start': start}
+        capture = current_capture()
+        if capture is not None:
+            record['metadata'] = dict(capture)
+        stamp(record)
+        http_stats_buffer[id(record)] = record
+        add_overhead('http', timer() - start)
+    else:
+        record = None
+    self._cpf_record = record
+    output = _originals['putrequest'](self, method, url, *args, **kwargs)
+    header = outbound_header()
+    if header is not None:
+        # the service called joins the trace of the request making the call
+        self.putheader(*header)
+    return output
+
+
+def wrap_connect(original):
+    def connect(self):
+        record = getattr(self, '_cpf_record', None)
+        if record is None or '_start' not in record or getattr(self, '_cpf_connecting', False):
+            return original(self)
+        # HTTPSConnection.connect calls HTTPConnection.connect, time the outer one
+        self._cpf_connecting = True
+        create_connection = self._create_connection
+        self._create_connection = timed_create_connection(record)
+        start = timer()
+        try:
+            return original(self)
+        except Exception as e:
+            finish(record, e)
+            raise
+        finally:
+            record['connect'] = timer() - start - (record['dns'] or 0)
+            self._cpf_connecting = False
+            self._create_connection = create_connection
+    return connect
+
+
+def send(self, data):
+    record = getattr(self, '_cpf_record', None)
+    try:
+        output = _originals['send'](self, data)
+    except Exception as e:
+        if record is not None:
+            finish(record, e)
+        raise
+    if record is not None and isinstance(data, basestring):
+        record['request_bytes'] += len(data)
+    return output
+
+
+def getresponse(self, *args, **kwargs):
+    record = getattr(self, '_cpf_record', None)
+    if record is None or '_start' not in record:
+        return _originals['getresponse'](self, *args, **kwargs)
+    wrapped_start = timer()
+    try:
+        response = _originals['getresponse'](self, *args, **kwargs)
+    except Exception as e:
+        finish(record, e)
+        raise
+    wrapped_end = timer()
+    record['ttfb'] = wrapped_end - wrapped_start
+    record['status'] = response.status
+    # finished when the response is closed, see responses_finished
+    response._cpf_record = record
+    self._cpf_record = None
+    add_overhead('http', timer() - wrapped_end, wrapped_end - wrapped_start, calls=0)
+    return response
+
+
+def read(self, *args, **kwargs):
+    # read closes the response once it has all been read
+    record = getattr(self, '_cpf_record', None)
+    data = _originals['read'](self, *args, **kwargs)
+    if record is not None:
+        record['response_bytes'] += len(data)
+    return data
+
+
+def close(self):
+    record = getattr(self, '_cpf_record', None)
+    if record is not None:
+        self._cpf_record = None
+        finish(record)
+    return _originals['close'](self)
+
+
+def responses_finished(record):
+    """
+    Returns True once record's response has been read, or it has waited
+    read_timeout seconds for it to be.
+    """
+    if '_start' not in record:
+        return True
+    return time.time() - record['datetime'] > float(cfg.get('http', {}).get('read_timeout', 60))
+
+
+def decorate_http():
+    if _originals:
+        return
+    stat_logger.info('Wrapping outbound http connections')
+    for name, wrapper in (('putrequest', putrequest), ('send', send), ('getresponse', getresponse)):
+        _originals[name] = getattr(httplib.HTTPConnection, name).__func__
+        setattr(httplib.HTTPConnection, name, wrapper)
+    for cls in (httplib.HTTPConnection, getattr(httplib, 'HTTPSConnection', None)):
+        if cls is not None:
+            setattr(cls, 'connect', wrap_connect(cls.__dict__['connect']))
+    for name, wrapper in (('read', read), ('close', close)):
+        _originals[name] = getattr(httplib.HTTPResponse, name).__func__
+        setattr(httplib.HTTPResponse, name, wrapper)
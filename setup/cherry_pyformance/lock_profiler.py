@@ -0,0 +1,280 @@
+"""
+Contention profiling of threading locks.
+
+cProfile shows a thread waiting on a lock as time spent in acquire, not
+which lock it was or who held it. With [locks] locks_enabled = true,
+threading.Lock, RLock and Condition are replaced by factories which, when
+called from a module matching one of the comma separated glob patterns in
+[locks] modules, return the lock wrapped so its waits and holds are timed.
+Locks made anywhere else are returned as they are.
+
+Timings are totalled per creation site, the module and line the lock was
+made on, and on each flush a 'lock' record is pushed for every site whose
+locks were acquired:
+
+    site, kind      where the lock was made and whether it is a Lock, RLock
+                    or the lock of a Condition
+    acquisitions    times its locks were acquired
+    contended       acquisitions which had to wait for another thread
+    wait, max_wait  seconds spent waiting on contended acquisitions
+    hold, max_hold  seconds its locks were held, a Condition's lock isn't
+                    held while waiting on the Condition
+    callers         [call site, contended acquisitions, wait] for the
+                    call sites which waited longest
+
+Acquiring an uncontended lock only costs a non-blocking acquire and a
+timer read. A thread woken by a Condition always counts as contended, as
+it has to take the lock back from the thread which notified it.
+
+Modules which did "from threading import Lock" before initialise keep the
+real Lock.
+"""
+import sys
+import threading
+import time
+from fnmatch import fnmatchcase
+from thread import allocate_lock
+
+from cherry_pyformance import cfg, stat_logger
+from overhead import timer
+
+
+lock_stats_buffer = {}
+
+# most call sites sent for each lock site
+MAX_CALLERS = 5
+
+_originals = {}
+# (module, line) -> LockSite
+_sites = {}
+_sites_lock = allocate_lock()
+# module name -> whether its locks are profiled, for the modules config string
+_matched = {}
+
+
+class LockSite(object):
+    """
+    Totals for the locks made at one place in the code.
+    """
+
+    def __init__(self, site, kind):
+        self.site = site
+        self.kind = kind
+        self._lock = allocate_lock()
+        self.reset()
+
+    def reset(self):
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait = 0.0
+        self.max_wait = 0.0
+        self.hold = 0.0
+        self.max_hold = 0.0
+        self.callers = {}
+
+    def add(self, wait, hold, caller):
+        with self._lock:
+            self.acquisitions += 1
+            self.hold += hold
+            self.max_hold = max(self.max_hold, hold)
+            if caller is not None:
+                self.contended += 1
+                self.wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                totals = self.callers.setdefault(caller, [0, 0.0])
+                totals[0] += 1
+                totals[1] += wait
+
+    def pop_record(self):
+        """
+        Returns a record of the totals since the last flush and resets
+        them, or None if the site's locks weren't acquired.
+        """
+        with self._lock:
+            if not self.acquisitions:
+                return None
+            callers = sorted(([caller] + totals for caller, totals in self.callers.items()),
+                             key=lambda caller: caller[2], reverse=True)
+            record = {'datetime': time.time(),
+                      'site': self.site,
+                      'kind': self.kind,
+                      'acquisitions': self.acquisitions,
+                      'contended': self.contended,
+                      'wait': self.wait,
+                      'max_wait': self.max_wait,
+                      'hold': self.hold,
+                      'max_hold': self.max_hold,
+                      'callers': callers[:MAX_CALLERS]}
+            self.reset()
+        return record
+
+
+def call_site(frame):
+    # a Condition's lock is acquired from inside the threading module
+    while frame.f_back is not None and frame.f_globals.get('__name__') == 'threading':
+        frame = frame.f_back
+    return '{0}:{1}'.format(frame.f_globals.get('__name__'), frame.f_lineno)
+
+
+class ProfiledLock(object):
+    """
+    A Lock which adds its waits and holds to its LockSite. The state of
+    the current hold is only changed by the thread holding the lock.
+    """
+
+    def __init__(self, lock, site):
+        self._cpf_lock = lock
+        self._cpf_site = site
+        self._cpf_acquired = None
+        self._cpf_wait = 0.0
+        self._cpf_caller = None
+
+    def acquire(self, blocking=1):
+        return self._cpf_acquire(blocking, sys._getframe(1))
+
+    def __enter__(self):
+        return self._cpf_acquire(1, sys._getframe(1))
+
+    def release(self):
+        self._cpf_released()
+        self._cpf_lock.release()
+
+    def __exit__(self, *args):
+        self.release()
+
+    def locked(self):
+        return self._cpf_lock.locked()
+
+    def _is_owned(self):
+        # as Condition's default, without counting an acquisition
+        if self._cpf_lock.acquire(0):
+            self._cpf_lock.release()
+            return False
+        return True
+
+    def _cpf_acquire(self, blocking, frame):
+        lock = self._cpf_lock
+        if lock.acquire(0):
+            self._cpf_acquired_at(0.0, None)
+            return True
+        if not blocking:
+            return False
+        start = timer()
+        lock.acquire()
+        self._cpf_acquired_at(timer() - start, call_site(frame))
+        return True
+
+    def _cpf_acquired_at(self, wait, caller):
+        self._cpf_acquired = timer()
+        self._cpf_wait = wait
+        self._cpf_caller = caller
+
+    def _cpf_released(self):
+        acquired = self._cpf_acquired
+        if acquired is not None:
+            self._cpf_acquired = None
+            self._cpf_site.add(self._cpf_wait, timer() - acquired, self._cpf_caller)
+
+
+class ProfiledRLock(ProfiledLock):
+    """
+    An RLock, a hold runs from its first acquire to its last release.
+    """
+
+    _cpf_depth = 0
+
+    def _is_owned(self):
+        return self._cpf_lock._is_owned()
+
+    def _cpf_acquired_at(self, wait, caller):
+        self._cpf_depth += 1
+        if self._cpf_depth == 1:
+            ProfiledLock._cpf_acquired_at(self, wait, caller)
+
+    def _cpf_released(self):
+        self._cpf_depth -= 1
+        if self._cpf_depth == 0:
+            ProfiledLock._cpf_released(self)
+
+    def _release_save(self):
+        # Condition.wait releases the lock however many times it was acquired
+        depth = self._cpf_depth
+        self._cpf_depth = 1
+        self._cpf_released()
+        return self._cpf_lock._release_save(), depth
+
+    def _acquire_restore(self, state):
+        state, depth = state
+        start = timer()
+        self._cpf_lock._acquire_restore(state)
+        # the caller of Condition.wait
+        self._cpf_acquired_at(timer() - start, call_site(sys._getframe(2)))
+        self._cpf_depth = depth
+
+
+def profiled_module(module):
+    patterns = cfg.get('locks', {}).get('modules', '')
+    key = (patterns, module)
+    if key not in _matched:
+        _matched[key] = any(fnmatchcase(module or '', pattern)
+                            for pattern in patterns.split(',') if pattern)
+    return _matched[key]
+
+
+def lock_site(frame, kind):
+    """
+    Returns the LockSite of a lock made in frame, or None if locks made
+    there aren't profiled.
+    """
+    module = frame.f_globals.get('__name__')
+    if not profiled_module(module):
+        return None
+    key = (module, frame.f_lineno)
+    with _sites_lock:
+        if key not in _sites:
+            _sites[key] = LockSite(call_site(frame), kind)
+        return _sites[key]
+
+
+def Lock(*args, **kwargs):
+    site = lock_site(sys._getframe(1), 'Lock')
+    if site is None:
+        return _originals['Lock'](*args, **kwargs)
+    return ProfiledLock(_originals['Lock'](*args, **kwargs), site)
+
+
+def RLock(*args, **kwargs):
+    site = lock_site(sys._getframe(1), 'RLock')
+    if site is None:
+        return _originals['RLock'](*args, **kwargs)
+    return ProfiledRLock(_originals['RLock'](*args, **kwargs), site)
+
+
+def Condition(lock=None, *args, **kwargs):
+    if lock is None:
+        site = lock_site(sys._getframe(1), 'Condition')
+        if site is not None:
+            lock = ProfiledRLock(_originals['RLock'](), site)
+    return _originals['Condition'](lock, *args, **kwargs)
+
+
+def collect_locks():
+    """
+    Puts a record of each lock site's totals since the last flush on the
+    lock_stats_buffer.
+    """
+    with _sites_lock:
+        sites = _sites.values()
+    for site in sites:
+        record = site.pop_record()
+        if record is not None:
+            lock_stats_buffer[id(record)] = record
+
+
+def hook_locks():
+    if _originals:
+        return
+    stat_logger.info('Wrapping threading locks')
+    for name, factory in (('Lock', Lock), ('RLock', RLock), ('Condition', Condition)):
+        _originals[name] = getattr(threading, name)
+        setattr(threading, name, factory)
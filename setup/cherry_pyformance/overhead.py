@@ -0,0 +1,101 @@
+"""
+Accounting of the time cherry_pyformance spends in its own code.
+
+Each wrapper adds the time it spends outside of the work it wraps to a
+running total for its stat type. The totals are taken off on each flush
+and sent to the server in the package metadata, so the cost of profiling
+can be seen per host.
+"""
+import cProfile
+from threading import Lock
+from timeit import default_timer as timer
+
+
+overhead_totals = {}
+# totals per (stat_type, name) for the governor, see governor.py
+name_totals = {}
+_overhead_lock = Lock()
+
+_profile_call_cost = []
+
+
+def add_overhead(stat_type, overhead, wrapped=0.0, calls=1, flush=0.0, name=None):
+    """
+    Adds time spent in profiler code to the totals for stat_type.
+
+    overhead is the time spent by the wrapper itself, wrapped is the time
+    spent in the wrapped work and flush is the time spent flushing and
+    pushing the stats buffer. name is the handler or function the time
+    was spent on, if there is one.
+    """
+    with _overhead_lock:
+        key = (stat_type, name)
+        if key not in name_totals:
+            name_totals[key] = [0, 0.0]
+        name_totals[key][0] += calls
+        name_totals[key][1] += overhead + flush
+        if stat_type not in overhead_totals:
+            overhead_totals[stat_type] = {'calls': 0,
+                                          'overhead': 0.0,
+                                          'wrapped': 0.0,
+                                          'flush': 0.0}
+        totals = overhead_totals[stat_type]
+        totals['calls'] += calls
+        totals['overhead'] += overhead
+        totals['wrapped'] += wrapped
+        totals['flush'] += flush
+
+
+def pop_overhead(stat_type):
+    """
+    Removes and returns the overhead totals for stat_type, or None if
+    nothing has been recorded since the last time they were taken.
+    """
+    with _overhead_lock:
+        return overhead_totals.pop(stat_type, None)
+
+
+def pop_name_totals():
+    """
+    Removes and returns the [calls, overhead] totals per (stat_type, name)
+    recorded since the last time they were taken.
+    """
+    global name_totals
+    with _overhead_lock:
+        totals = name_totals
+        name_totals = {}
+        return totals
+
+
+def profile_call_cost():
+    """
+    Returns the estimated cost, in seconds, that cProfile adds to each
+    function call it records. This time is spent inside the profiled call
+    so it can't be timed directly; instead it is calibrated once against a
+    trivial function and multiplied by the number of calls in a profile.
+    """
+    if not _profile_call_cost:
+        def _noop():
+            pass
+
+        def _loop(n=20000):
+            for i in xrange(n):
+                _noop()
+
+        start = timer()
+        _loop()
+        unprofiled = timer() - start
+
+        start = timer()
+        cProfile.Profile().runcall(_loop)
+        profiled = timer() - start
+
+        _profile_call_cost.append(max(profiled - unprofiled, 0.0) / 20000)
+    return _profile_call_cost[0]
+
+
+def profiled_calls(stats):
+    """
+    Returns the total number of calls recorded in a cProfile stats dict.
+    """
+    return sum(stat[1] for stat in stats.itervalues())
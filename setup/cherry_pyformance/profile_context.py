@@ -0,0 +1,63 @@
+"""
+Per-thread profiling context.
+
+cProfile can only run one profiler per thread: starting a second one
+inside a profiled call replaces the first one's hook and corrupts its
+profile. So while a handler or function is being profiled with cProfile,
+its record is made the active record for the thread. Wrapped functions
+called inside it don't start their own profiler, they add a span (name,
+start offset, duration and nesting depth) to the active record and make a
+timing only record of their own from it. The spans are pushed with the
+record and shown nested inside it on the server.
+"""
+import threading
+
+from overhead import timer
+
+
+_local = threading.local()
+
+
+def active():
+    """
+    Returns the record being profiled with cProfile on this thread, or None.
+    """
+    return getattr(_local, 'record', None)
+
+
+def start(record, started=None):
+    """
+    Makes record the active record for this thread. started is when its
+    profile started, if that was on another thread (see thread_profiler.py).
+    """
+    _local.record = record
+    _local.start = timer() if started is None else started
+    _local.depth = 0
+
+
+def started():
+    """
+    Returns when the active record's profile started.
+    """
+    return _local.start
+
+
+def stop():
+    _local.record = None
+
+
+def enter_span():
+    """
+    Returns the depth of a new span in the active record.
+    """
+    depth = _local.depth
+    _local.depth = depth + 1
+    return depth
+
+
+def exit_span(record, name, span_start, span_end, depth):
+    """
+    Adds a finished span to record, times are from the overhead timer.
+    """
+    _local.depth = depth
+    record.setdefault('spans', []).append([name, span_start - _local.start, span_end - span_start, depth])
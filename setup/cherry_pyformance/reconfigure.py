@@ -0,0 +1,142 @@
+"""
+Runtime reconfiguration of what is profiled.
+
+With [reconfigure] source = file the config file is re-read whenever it
+changes, with source = server the stats server's /clientconfig endpoint is
+polled for config sections matching this host's metadata. Either way the
+[functions], [handlers], [ignored_handlers], [sql] and [governor] sections
+are compared against the ones in use and the differences applied live:
+functions are wrapped and unwrapped, the stats tool is switched on and off
+per handler and the sql and governor settings take effect on the next call.
+"""
+import copy
+import json
+import os.path
+import socket
+from urllib import urlencode
+from urllib2 import urlopen, URLError
+
+from cherry_pyformance import cfg, stat_logger, load_config, apply_overwrites, get_server_address
+
+
+RECONFIGURABLE_SECTIONS = ('functions', 'handlers', 'ignored_handlers', 'sql', 'governor')
+
+# the config as it was before any server sections were applied
+base_cfg = copy.deepcopy(dict((section, cfg.get(section, {})) for section in RECONFIGURABLE_SECTIONS))
+
+_config_mtime = [None]
+
+
+def _read_file_config():
+    """
+    Returns the config file's sections if the file has changed since the
+    last read, otherwise None.
+    """
+    path = cfg['config_file_path']
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _config_mtime[0] is None:
+        # the first look, the file was read by initialise
+        _config_mtime[0] = mtime
+        return None
+    if mtime == _config_mtime[0]:
+        return None
+    try:
+        new_cfg = load_config(path)
+    except SystemExit:
+        # load_config gives up on an empty file, which is most likely one
+        # that's part way through being saved. Try again on the next poll.
+        return None
+    _config_mtime[0] = mtime
+    return apply_overwrites(new_cfg, cfg['config_overwrites'])
+
+
+def _read_server_config():
+    """
+    Returns the config sections the stats server has for this host merged
+    into the base config, or None if the server can't be reached.
+    """
+    params = dict(cfg['metadata'])
+    params['hostname'] = socket.gethostname()
+    address = '{0}/clientconfig?{1}'.format(get_server_address(), urlencode(params))
+    try:
+        server_sections = json.loads(urlopen(address, timeout=10).read())
+    except (URLError, socket.error, ValueError) as e:
+        stat_logger.error('Could not poll profiling config: {0}'.format(e))
+        return None
+
+    new_cfg = copy.deepcopy(base_cfg)
+    for section, values in server_sections.iteritems():
+        if section in RECONFIGURABLE_SECTIONS:
+            # the server's values are on top of the base section, any key
+            # it leaves out keeps its base value
+            new_cfg[section].update((str(k), str(v)) for k, v in values.iteritems())
+    return new_cfg
+
+
+def _apply_functions(old_section, new_section):
+    from function_profiler import function_targets, apply_function_targets, install_import_hook
+    stat_logger.info('Rewrapping functions for new targets {0}'.format(sorted(function_targets(new_section))))
+    targets = function_targets(new_section)
+    install_import_hook(targets)
+    apply_function_targets(targets)
+
+
+def _apply_handlers(old_handlers, old_ignored, new_handlers, new_ignored):
+    from handler_profiler import handler_states, set_handler_state
+    old_states = handler_states(old_handlers, old_ignored)
+    new_states = handler_states(new_handlers, new_ignored)
+    for root, handler in set(old_states) | set(new_states):
+        state = new_states.get((root, handler))
+        if old_states.get((root, handler)) != state:
+            stat_logger.info('Setting stats tool for {0}{1} to {2}'.format(root, handler, state))
+            try:
+                set_handler_state(root, handler, state)
+            except KeyError:
+                stat_logger.warning('No app mounted at {0}, could not change handler profiling.'.format(root))
+
+
+def apply_config(new_cfg):
+    """
+    Applies the differences between new_cfg and the config in use.
+    """
+    old_cfg = dict((section, cfg.get(section, {})) for section in RECONFIGURABLE_SECTIONS)
+    new_cfg = dict((section, new_cfg.get(section, {})) for section in RECONFIGURABLE_SECTIONS)
+    if new_cfg == old_cfg:
+        return
+
+    if new_cfg['functions'] != old_cfg['functions']:
+        _apply_functions(old_cfg['functions'], new_cfg['functions'])
+
+    if new_cfg['handlers'] != old_cfg['handlers'] or new_cfg['ignored_handlers'] != old_cfg['ignored_handlers']:
+        _apply_handlers(old_cfg['handlers'], old_cfg['ignored_handlers'],
+                        new_cfg['handlers'], new_cfg['ignored_handlers'])
+
+    if new_cfg['sql'].get('sql_enabled') != 'false' and old_cfg['sql'].get('sql_enabled') == 'false':
+        from sql_profiler import decorate_connections
+        decorate_connections()
+
+    # the profilers hold a reference to cfg, so it must be changed in place.
+    for section in RECONFIGURABLE_SECTIONS:
+        cfg[section] = new_cfg[section]
+    stat_logger.info('Applied new profiling config.')
+
+
+def poll_config():
+    """
+    Checks the configured source for a new config and applies it.
+    """
+    source = cfg['reconfigure'].get('source', 'none')
+    if source == 'file':
+        new_cfg = _read_file_config()
+    elif source == 'server':
+        new_cfg = _read_server_config()
+    else:
+        new_cfg = None
+    if new_cfg is not None:
+        try:
+            apply_config(new_cfg)
+        except Exception:
+            stat_logger.warning('Failed to apply new profiling config.')
@@ -0,0 +1,84 @@
+"""
+Route names for handler records.
+
+Handler records are named after the request path, so REST style paths
+like /core/device/12345 make a new name on the server for every id. Paths
+are normalised with the [routes] section of the config: a path matching
+one of the route templates is named after the template, otherwise with
+collapse_ids = true any numeric or uuid segment is replaced by {id} or
+{uuid}. On each flush, handler records beyond the max_names most common
+names are named 'other'.
+"""
+import re
+
+from cherry_pyformance import cfg
+
+
+NUMERIC_SEGMENT = re.compile(r'^\d+$')
+UUID_SEGMENT = re.compile(r'^[0-9a-fA-F]{8}-?(?:[0-9a-fA-F]{4}-?){3}[0-9a-fA-F]{12}$')
+TEMPLATE_FIELD = re.compile(r'\{[^/{}]*\}')
+OTHER = 'other'
+
+# templates config string -> [(template, compiled pattern)]
+_compiled = {}
+
+
+def compile_template(template):
+    """
+    Returns a regex matching the paths of a route template, each {field}
+    in the template matches one path segment.
+    """
+    parts = TEMPLATE_FIELD.split(template)
+    return re.compile('^' + '[^/]+'.join(re.escape(part) for part in parts) + '/?$')
+
+
+def templates():
+    raw = cfg.get('routes', {}).get('templates', '')
+    if raw not in _compiled:
+        _compiled[raw] = [(template, compile_template(template))
+                          for template in raw.split(',') if template]
+    return _compiled[raw]
+
+
+def normalise(path):
+    """
+    Returns the route name of a request path.
+    """
+    for template, pattern in templates():
+        if pattern.match(path):
+            return template
+    if cfg.get('routes', {}).get('collapse_ids', 'true') != 'true':
+        return path
+    return collapse(path)
+
+
+def collapse(path):
+    """
+    Returns path with its numeric and uuid segments replaced by {id} and
+    {uuid}.
+    """
+    segments = path.split('/')
+    for i, segment in enumerate(segments):
+        if NUMERIC_SEGMENT.match(segment):
+            segments[i] = '{id}'
+        elif UUID_SEGMENT.match(segment):
+            segments[i] = '{uuid}'
+    return '/'.join(segments)
+
+
+def cap_names(records):
+    """
+    Renames handler records beyond the max_names most common names in
+    records to 'other', keeping the number of names pushed per flush down.
+    """
+    max_names = int(cfg.get('routes', {}).get('max_names', 500))
+    counts = {}
+    for record in records:
+        name = (record['module'], record['class'], record['function'])
+        counts[name] = counts.get(name, 0) + 1
+    if len(counts) <= max_names:
+        return
+    kept = set(sorted(counts, key=counts.get, reverse=True)[:max_names])
+    for record in records:
+        if (record['module'], record['class'], record['function']) not in kept:
+            record['function'] = OTHER
@@ -0,0 +1,218 @@
+"""
+EXPLAIN plans of slow statements.
+
+With [sql] explain_threshold above 0, a statement which takes longer than
+it, in wall time, is explained on a side connection to the same database,
+at most once every explain_interval seconds for each statement. The side
+connection is made with the same arguments as the statement's connection,
+so the plan is the one the database would choose for any connection. The
+plan is attached to the statement's record as 'plan', a JSON string of:
+
+    sqlite      the rows of EXPLAIN QUERY PLAN, as [id, parent, detail]
+    postgres    the output of EXPLAIN (FORMAT JSON)
+
+Statements are told apart by their fingerprint, the sql string with its
+literals replaced by ?, so statements built with literal values share one
+interval. Nothing is explained on the request's thread: slow statements
+are queued, at most MAX_QUEUED of them, and explained at the next flush,
+which holds their records back until then. There is one side connection
+for each database, at most MAX_SIDE_CONNECTIONS of them, made with a short
+lock timeout so a locked database fails the EXPLAIN quickly.
+
+With explain_analyze_rate above 0, that fraction of the plans of postgres
+SELECT statements are taken with ANALYZE, which runs the statement again,
+and the record's 'plan_analyzed' is True. Other drivers, in-memory sqlite
+databases (which a side connection can't see) and the sqlalchemy backend
+aren't explained.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from Queue import Queue, Full, Empty
+
+from cherry_pyformance import cfg
+from overhead import timer, add_overhead
+
+
+# database -> prefix which explains a statement
+EXPLAIN = {'sqlite': 'EXPLAIN QUERY PLAN ',
+           'postgres': 'EXPLAIN (FORMAT JSON) ',
+           'pg8000': 'EXPLAIN (FORMAT JSON) '}
+EXPLAIN_ANALYZE = {'postgres': 'EXPLAIN (ANALYZE, FORMAT JSON) ',
+                   'pg8000': 'EXPLAIN (ANALYZE, FORMAT JSON) '}
+
+# statements with a plan, DDL and the like can't be explained
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+# run once on each side connection, the lock timeouts are in milliseconds
+SIDE_SETUP = {'sqlite': ('PRAGMA busy_timeout = 100',),
+              'postgres': ('SET lock_timeout = 100',),
+              'pg8000': ('SET lock_timeout = 100',)}
+
+# string and number literals, and lists of them once replaced
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+LITERAL_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+MAX_QUEUED = 100
+MAX_SIDE_CONNECTIONS = 4
+
+# (database, target, fingerprint) -> when it was last explained
+_explained = {}
+_explained_lock = threading.Lock()
+# statements waiting to be explained at the next flush
+_queue = Queue(MAX_QUEUED)
+# (database, target) -> side connection, least recently used first
+_side = OrderedDict()
+_side_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    return ' '.join(LITERAL_LISTS.sub('(?)', LITERALS.sub('?', sql)).split())
+
+
+def should_explain(connection, record):
+    """
+    Returns True if record's statement, run on the wrapped connection, is
+    slow enough and hasn't been explained in the last explain_interval.
+    """
+    threshold = float(cfg['sql'].get('explain_threshold', 0) or 0)
+    if threshold <= 0 or record is None:
+        return False
+    # the record's duration is clock time, which leaves out time spent waiting
+    # on the database server
+    if record.get('_wall_duration', record['duration']) < threshold:
+        return False
+    if connection is None or connection._cpf_reconnect is None:
+        return False
+    if connection._cpf_database not in EXPLAIN:
+        return False
+    words = record['sql_string'].split(None, 1)
+    if not words or words[0].upper() not in EXPLAINABLE:
+        return False
+    key = (connection._cpf_database, connection._cpf_target, fingerprint(record['sql_string']))
+    interval = float(cfg['sql'].get('explain_interval', 300))
+    now = time.time()
+    with _explained_lock:
+        if now - _explained.get(key, 0) < interval:
+            return False
+        # forget statements which could be explained again anyway
+        for old_key, explained in _explained.items():
+            if now - explained >= interval:
+                del _explained[old_key]
+        _explained[key] = now
+    return True
+
+
+def queue_explain(connection, record, args):
+    """
+    Queues record's statement, with its args, to be explained at the next
+    flush. Statements are dropped while the queue is full.
+    """
+    record['_explaining'] = True
+    try:
+        _queue.put_nowait((record, connection._cpf_database, connection._cpf_target,
+                           connection._cpf_reconnect, args))
+    except Full:
+        del record['_explaining']
+
+
+def explained(record):
+    """
+    Returns True once record's statement has been explained, if it was
+    queued to be.
+    """
+    return not record.get('_explaining')
+
+
+def explain_queued():
+    """
+    Explains the statements queued since the last flush.
+    """
+    while True:
+        try:
+            record, database, target, reconnect, args = _queue.get_nowait()
+        except Empty:
+            return
+        try:
+            explain(database, target, reconnect, record, args)
+        finally:
+            record.pop('_explaining', None)
+
+
+def side_connection(database, target, reconnect):
+    """
+    Returns the side connection to the database, connecting it if need be.
+    """
+    key = (database, target)
+    with _side_lock:
+        side = _side.pop(key, None)
+        if side is None:
+            side = reconnect()
+            try:
+                cursor = side.cursor()
+                for sql in SIDE_SETUP.get(database, ()):
+                    cursor.execute(sql)
+                side.commit()
+            except Exception:
+                side.close()
+                raise
+        _side[key] = side
+        # close the least recently used connections beyond the limit
+        while len(_side) > MAX_SIDE_CONNECTIONS:
+            _close(_side.popitem(last=False)[1])
+    return side
+
+
+def drop_side_connection(database, target):
+    with _side_lock:
+        side = _side.pop((database, target), None)
+    if side is not None:
+        _close(side)
+
+
+def _close(side):
+    try:
+        side.close()
+    except Exception:
+        pass
+
+
+def explain(database, target, reconnect, record, args):
+    """
+    Explains record's statement, with its args, on the side connection to
+    the database and adds the plan to record.
+    """
+    start = timer()
+    analyze = (database in EXPLAIN_ANALYZE and
+               record['sql_string'].lstrip()[:6].upper() == 'SELECT' and
+               random.random() < float(cfg['sql'].get('explain_analyze_rate', 0) or 0))
+    sql = (EXPLAIN_ANALYZE if analyze else EXPLAIN)[database] + record['sql_string']
+    try:
+        side = side_connection(database, target, reconnect)
+        try:
+            cursor = side.cursor()
+            cursor.execute(sql, *args)
+            rows = cursor.fetchall()
+        finally:
+            # never commit, ANALYZE ran the statement
+            side.rollback()
+    except Exception:
+        # e.g. the statement uses a temporary table only its own connection can
+        # see, or the database is locked. Reconnect next time in case the
+        # connection is broken.
+        drop_side_connection(database, target)
+    else:
+        record['plan'] = json.dumps(plan(database, rows))
+        record['plan_analyzed'] = analyze
+    add_overhead('database', 0.0, calls=0, flush=timer() - start)
+
+
+def plan(database, rows):
+    if database == 'sqlite':
+        return [[row[0], row[1], row[-1]] for row in rows]
+    # a single row holding the JSON plan, drivers without a json type give it as text
+    output = rows[0][0]
+    return json.loads(output) if isinstance(output, basestring) else output
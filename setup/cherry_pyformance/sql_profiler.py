@@ -1,14 +1,34 @@
 import time
 import inspect
+import importlib
+from functools import partial
 from cherry_pyformance import cfg, stat_logger
+from overhead import add_overhead, timer
+from deep_capture import current_capture
+from trace_context import stamp
+from sql_explain import should_explain, queue_explain
+from sqlite_locks import sqlite_locks_enabled, profile_locked, commit_locked
 
 
 sql_stats_buffer = {}
+transaction_stats_buffer = {}
 
 
 ###============================================================###
 
 class CursorWrapper(object):
+    """
+    Profiles the statements run on a cursor. The rows fetched for the last
+    statement, and the time spent fetching them, are added to its record
+    until the cursor runs another statement, is closed or runs out of rows.
+    """
+
+    # the record of the statement whose rows are being fetched
+    _cpf_record = None
+    # the wrapped connection the cursor was made from
+    _cpf_connection_wrapper = None
+    # the driver's DB-API paramstyle, how the statement's args are keyed
+    _cpf_paramstyle = None
 
     def __setattr__(self, name, value):
         setattr(self._cpf_cursor, name, value)
@@ -17,21 +37,133 @@ class CursorWrapper(object):
         return getattr(self._cpf_cursor, name)
 
     def __iter__(self):
-        return iter(self._cpf_cursor)
+        if self._cpf_record is None:
+            return iter(self._cpf_cursor)
+        return self._cpf_iter(iter(self._cpf_cursor))
+
+    def __del__(self):
+        self._cpf_finish()
 
     def execute(self, sql, *args, **kwargs):
+        self._cpf_finish()
+        self._cpf_begin()
         if not sql.startswith('PRAGMA'):
-            return profile_sql(self._cpf_cursor.execute, sql, *args, **kwargs)
+            output, record = self._cpf_profile(self._cpf_cursor.execute, sql, *args, **kwargs)
+            self._cpf_start(record)
+            if should_explain(self._cpf_connection_wrapper, record):
+                queue_explain(self._cpf_connection_wrapper, record, args)
         else:
-            return self._cpf_cursor.execute(sql, *args, **kwargs)
+            output = self._cpf_cursor.execute(sql, *args, **kwargs)
+        # sqlite returns the cursor, keep fetches from it profiled
+        return self if output is self._cpf_cursor else output
 
     def executemany(self, sql, *args, **kwargs):
+        self._cpf_finish()
+        self._cpf_begin()
         if not sql.startswith('PRAGMA'):
-            return profile_sql(self._cpf_cursor.executemany, sql, *args, **kwargs)
+            output, record = self._cpf_profile(self._cpf_cursor.executemany, sql, *args, **kwargs)
+            self._cpf_start(record)
+            if record is not None and args and hasattr(args[0], '__len__'):
+                record['batch_size'] = len(args[0])
+        else:
+            output = self._cpf_cursor.executemany(sql, *args, **kwargs)
+        return self if output is self._cpf_cursor else output
+
+    def callproc(self, procname, *args, **kwargs):
+        self._cpf_finish()
+        self._cpf_begin()
+        output, record = self._cpf_profile(self._cpf_cursor.callproc, procname, *args, **kwargs)
+        self._cpf_start(record)
+        return output
+
+    def fetchone(self):
+        return self._cpf_fetch(self._cpf_cursor.fetchone, False)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._cpf_fetch(self._cpf_cursor.fetchmany, True, *args, **kwargs)
+
+    def fetchall(self):
+        rows = self._cpf_fetch(self._cpf_cursor.fetchall, True)
+        self._cpf_finish()
+        return rows
+
+    def close(self):
+        self._cpf_finish()
+        return self._cpf_cursor.close()
+
+    def _cpf_profile(self, action, sql, *args, **kwargs):
+        return profile_statement(action, sql, *args, **kwargs)
+
+    def _cpf_begin(self):
+        if self._cpf_connection_wrapper is not None:
+            self._cpf_connection_wrapper._cpf_statement()
+
+    def _cpf_start(self, record):
+        if record is None:
+            return
+        record['paramstyle'] = self._cpf_paramstyle
+        rowcount = getattr(self._cpf_cursor, 'rowcount', -1)
+        record['rowcount'] = rowcount if rowcount >= 0 else None
+        record['rows_fetched'] = 0
+        record['fetch_duration'] = 0.0
+        if getattr(self._cpf_cursor, 'description', None) is None:
+            # the statement returns no rows
+            return
+        # held on the buffer until its rows have been fetched, see fetches_finished
+        record['_fetching'] = True
+        object.__setattr__(self, '_cpf_record', record)
+
+    def _cpf_finish(self):
+        record = self._cpf_record
+        if record is not None:
+            record.pop('_fetching', None)
+            object.__setattr__(self, '_cpf_record', None)
+
+    def _cpf_fetch(self, fetch, many, *args, **kwargs):
+        record = self._cpf_record
+        if record is None:
+            return fetch(*args, **kwargs)
+        start = timer()
+        start_clock = time.clock()
+        wrapped_start = timer()
+        rows = fetch(*args, **kwargs)
+        wrapped_end = timer()
+        record['fetch_duration'] += time.clock() - start_clock
+        if not rows:
+            # no rows left
+            self._cpf_finish()
         else:
-            return self._cpf_cursor.executemany(sql, *args, **kwargs)
+            record['rows_fetched'] += len(rows) if many else 1
+        add_overhead('database', (wrapped_start - start) + (timer() - wrapped_end),
+                     wrapped_end - wrapped_start, calls=0)
+        return rows
+
+    def _cpf_iter(self, rows):
+        record = self._cpf_record
+        try:
+            while True:
+                start_clock = time.clock()
+                try:
+                    row = next(rows)
+                finally:
+                    record['fetch_duration'] += time.clock() - start_clock
+                record['rows_fetched'] += 1
+                yield row
+        finally:
+            if self._cpf_record is record:
+                self._cpf_finish()
 
 class ConnectionWrapper(object):
+    """
+    Times commits and rollbacks, and the transaction each one ends: from
+    its first statement to the end of the commit or rollback.
+    """
+
+    # timer value the open transaction's first statement started at
+    _cpf_transaction_start = None
+    _cpf_statements = 0
+    # makes a side connection to the same database, see sql_explain.py
+    _cpf_reconnect = None
 
     def __enter__(self):
         self._cpf_connection.__enter__()
@@ -40,44 +172,72 @@ class ConnectionWrapper(object):
     def __getattr__(self, name):
         return getattr(self._cpf_connection, name)
         
-    def __exit__(self, *args, **kwargs):
-        return self._cpf_connection.__exit__(*args, **kwargs)
+    def __exit__(self, exc_type, *args, **kwargs):
+        # leaving the with block commits, or rolls back after an exception
+        event = 'commit' if exc_type is None else 'rollback'
+        return self._cpf_end_transaction(event, self._cpf_connection.__exit__, exc_type, *args, **kwargs)
 
     def cursor(self, *args, **kwargs):
-        return Psycopg2CursorWrapper(self._cpf_connection.cursor(*args, **kwargs), self._cpf_connect_params, (args, kwargs))
+        return Psycopg2CursorWrapper(self._cpf_connection.cursor(*args, **kwargs), self._cpf_connect_params, (args, kwargs), self)
 
     def commit(self):
-        return self._cpf_connection.commit()
+        return self._cpf_end_transaction('commit', self._cpf_connection.commit)
 
     def rollback(self):
-        return self._cpf_connection.rollback()
+        return self._cpf_end_transaction('rollback', self._cpf_connection.rollback)
+
+    def _cpf_statement(self):
+        if self._cpf_transaction_start is None:
+            object.__setattr__(self, '_cpf_transaction_start', timer())
+        object.__setattr__(self, '_cpf_statements', self._cpf_statements + 1)
+
+    def _cpf_end_transaction(self, event, action, *args, **kwargs):
+        if not transactions_enabled() or not self._cpf_statements:
+            # no transaction to end
+            return action(*args, **kwargs)
+        start = timer()
+        try:
+            return action(*args, **kwargs)
+        finally:
+            end = timer()
+            transaction_start = self._cpf_transaction_start
+            record_transaction(event, self._cpf_database, self._cpf_target, end - start,
+                               end - transaction_start, self._cpf_statements)
+            object.__setattr__(self, '_cpf_transaction_start', None)
+            object.__setattr__(self, '_cpf_statements', 0)
+            add_overhead('transaction', timer() - end, end - start)
+
+class ConnectionFactory(object):
+    """
+    Replaces a driver's connect, wrapping the connections it makes.
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
 
 ###============================================================###
 
 class Psycopg2CursorWrapper(CursorWrapper):
 
-    def __init__(self, cursor, connect_params=None, cursor_params=None):
+    _cpf_paramstyle = 'pyformat'
+
+    def __init__(self, cursor, connect_params=None, cursor_params=None, connection=None):
         object.__setattr__(self, '_cpf_cursor', cursor)
         object.__setattr__(self, '_cpf_connect_params', connect_params)
         object.__setattr__(self, '_cpf_cursor_params', cursor_params)
-        object.__setattr__(self, 'fetchone', cursor.fetchone)
-        object.__setattr__(self, 'fetchmany', cursor.fetchmany)
-        object.__setattr__(self, 'fetchall', cursor.fetchall)
-
-    def callproc(self, procname, *args, **kwargs):
-        if not script.startswith('PRAGMA'):
-            return profile_sql(self._cpf_cursor.executescript, script, *args, **kwargs)
-        else:
-            return self._cpf_cursor.executescript(script, *args, **kwargs)
+        object.__setattr__(self, '_cpf_connection_wrapper', connection)
 
 class Psycopg2ConnectionWrapper(ConnectionWrapper):
 
+    _cpf_database = 'postgres'
+
     def __init__(self, connection, connect_params=None):
         object.__setattr__(self, '_cpf_connection', connection)
         object.__setattr__(self, '_cpf_connect_params', connect_params)
+        object.__setattr__(self, '_cpf_target', postgres_target(connection, connect_params))
 
     def cursor(self, *args, **kwargs):
-        return Psycopg2CursorWrapper(self._cpf_connection.cursor(*args, **kwargs), self._cpf_connect_params, (args, kwargs))
+        return Psycopg2CursorWrapper(self._cpf_connection.cursor(*args, **kwargs), self._cpf_connect_params, (args, kwargs), self)
     
     def status(self):
         return self._cpf_connection.status
@@ -88,108 +248,338 @@ class Psycopg2ConnectionWrapper(ConnectionWrapper):
     def autocommit(self):
         return self._cpf_connection.autocommit
 
-class Psycopg2ConnectionFactory(object):
-
-    def __init__(self, connect):
-        self.__connect = connect
+class Psycopg2ConnectionFactory(ConnectionFactory):
 
     def __call__(self, *args, **kwargs):
-        return Psycopg2ConnectionWrapper(self.__connect(*args, **kwargs), (args, kwargs))
+        start = timer()
+        connection = Psycopg2ConnectionWrapper(self._connect(*args, **kwargs), (args, kwargs))
+        object.__setattr__(connection, '_cpf_reconnect', partial(self._connect, *args, **kwargs))
+        if transactions_enabled():
+            record_transaction('connect', 'postgres', connection._cpf_target, timer() - start)
+        return connection
 
 ###============================================================###
 
 class SqliteCursorWrapper(CursorWrapper):
 
-    def __init__(self, cursor):
+    _cpf_paramstyle = 'qmark'
+
+    def __init__(self, cursor, connection=None):
         object.__setattr__(self, '_cpf_cursor', cursor)
-        object.__setattr__(self, 'fetchone', cursor.fetchone)
-        object.__setattr__(self, 'fetchmany', cursor.fetchmany)
-        object.__setattr__(self, 'fetchall', cursor.fetchall)
+        object.__setattr__(self, '_cpf_connection_wrapper', connection)
+
+    def _cpf_profile(self, action, sql, *args, **kwargs):
+        timeout = getattr(self._cpf_connection_wrapper, '_cpf_busy_timeout', None)
+        if timeout is None:
+            return profile_statement(action, sql, *args, **kwargs)
+        return profile_locked(timeout, action, sql, *args, **kwargs)
 
     def executescript(self, script, *args, **kwargs):
         if not script.startswith('PRAGMA'):
-            return profile_sql(self._cpf_cursor.executescript, script, *args, **kwargs)
+            self._cpf_begin()
+            return profile_sql(self._cpf_script, script, *args, **kwargs)
         else:
+            return self._cpf_script(script, *args, **kwargs)
+
+    def _cpf_script(self, script, *args, **kwargs):
+        if self._cpf_connection_wrapper is None:
             return self._cpf_cursor.executescript(script, *args, **kwargs)
+        return self._cpf_connection_wrapper._cpf_busy(self._cpf_cursor.executescript, script, *args, **kwargs)
 
 class SqliteConnectionWrapper(ConnectionWrapper):
 
-    def __init__(self, connection):
+    _cpf_database = 'sqlite'
+    # the connection's busy timeout when the wrapper waits for locks, see sqlite_locks.py
+    _cpf_busy_timeout = None
+
+    def __init__(self, connection, target=None):
         self._cpf_connection = connection
+        self._cpf_target = target
 
     def cursor(self, *args, **kwargs):
-        return SqliteCursorWrapper(self._cpf_connection.cursor(*args, **kwargs))
+        return SqliteCursorWrapper(self._cpf_connection.cursor(*args, **kwargs), self)
 
     def execute(self, sql, *args, **kwargs):
-        if not sql.startswith('PRAGMA'):
-            return profile_sql(self._cpf_connection.execute, sql, *args, **kwargs)
-        else:
-            return self._cpf_connection.execute(sql, *args, **kwargs)
+        # the shortcut makes a cursor, profile it so its fetches are profiled
+        return self.cursor().execute(sql, *args, **kwargs)
 
     def executemany(self, sql, *args, **kwargs):
-        if not sql.startswith('PRAGMA'):
-            return profile_sql(self._cpf_connection.executemany, sql, *args, **kwargs)
+        return self.cursor().executemany(sql, *args, **kwargs)
+
+    def commit(self):
+        if self._cpf_busy_timeout is None:
+            return ConnectionWrapper.commit(self)
+        return self._cpf_end_transaction('commit', commit_locked, self._cpf_busy_timeout, self._cpf_connection.commit)
+
+    def __exit__(self, exc_type, *args, **kwargs):
+        if self._cpf_busy_timeout is None:
+            return ConnectionWrapper.__exit__(self, exc_type, *args, **kwargs)
+        # as sqlite3's __exit__, but the commit waits for the lock here
+        if exc_type is None:
+            self.commit()
         else:
-            return self._cpf_connection.executemany(sql, *args, **kwargs)
+            self.rollback()
+        return False
 
     def executescript(self, script, *args, **kwargs):
         if not script.startswith('PRAGMA'):
-            return profile_sql(self._cpf_connection.executescript, script, *args, **kwargs)
+            self._cpf_statement()
+            return profile_sql(partial(self._cpf_busy, self._cpf_connection.executescript), script, *args, **kwargs)
         else:
-            return self._cpf_connection.executescript(script, *args, **kwargs)
+            return self._cpf_busy(self._cpf_connection.executescript, script, *args, **kwargs)
 
-class SqliteConnectionFactory(object):
+    def _cpf_busy(self, action, *args, **kwargs):
+        if self._cpf_busy_timeout is None:
+            return action(*args, **kwargs)
+        # part of a script may have run when it finds a lock, so it can't
+        # be retried, let sqlite wait for the lock as usual
+        self._cpf_connection.execute('PRAGMA busy_timeout = {0}'.format(int(1000 * self._cpf_busy_timeout)))
+        try:
+            return action(*args, **kwargs)
+        finally:
+            self._cpf_connection.execute('PRAGMA busy_timeout = 0')
 
-    def __init__(self, connect):
-        self.__connect = connect
+class SqliteConnectionFactory(ConnectionFactory):
+
+    def __call__(self, *args, **kwargs):
+        start = timer()
+        target = args[0] if args else kwargs.get('database')
+        connection = SqliteConnectionWrapper(self._connect(*args, **kwargs), target)
+        if sqlite_locks_enabled():
+            # wait for locks in the wrapper, where the wait can be measured
+            connection._cpf_connection.execute('PRAGMA busy_timeout = 0')
+            connection._cpf_busy_timeout = float(args[1] if len(args) > 1 else kwargs.get('timeout', 5.0))
+        if target not in (':memory:', '') and 'mode=memory' not in str(target):
+            # a side connection to an in-memory database would open a new one
+            connection._cpf_reconnect = partial(self._connect, *args, **kwargs)
+        if transactions_enabled():
+            record_transaction('connect', 'sqlite', target, timer() - start)
+        return connection
+
+###============================================================###
+
+class DbapiCursorWrapper(CursorWrapper):
+
+    def __init__(self, cursor, paramstyle, connection=None):
+        object.__setattr__(self, '_cpf_cursor', cursor)
+        object.__setattr__(self, '_cpf_paramstyle', paramstyle)
+        object.__setattr__(self, '_cpf_connection_wrapper', connection)
+
+class DbapiConnectionWrapper(ConnectionWrapper):
+
+    def __init__(self, connection, database, paramstyle, target=None):
+        object.__setattr__(self, '_cpf_connection', connection)
+        object.__setattr__(self, '_cpf_database', database)
+        object.__setattr__(self, '_cpf_paramstyle', paramstyle)
+        object.__setattr__(self, '_cpf_target', target)
+
+    def cursor(self, *args, **kwargs):
+        return DbapiCursorWrapper(self._cpf_connection.cursor(*args, **kwargs), self._cpf_paramstyle, self)
+
+class DbapiConnectionFactory(ConnectionFactory):
+    """
+    Wraps the connect of any DB-API 2 driver, see register_driver.
+    """
+
+    def __init__(self, connect, database, paramstyle):
+        ConnectionFactory.__init__(self, connect)
+        self._database = database
+        self._paramstyle = paramstyle
 
     def __call__(self, *args, **kwargs):
-        return SqliteConnectionWrapper(self.__connect(*args, **kwargs))
+        start = timer()
+        connection = DbapiConnectionWrapper(self._connect(*args, **kwargs), self._database,
+                                            self._paramstyle, connect_target(args, kwargs))
+        object.__setattr__(connection, '_cpf_reconnect', partial(self._connect, *args, **kwargs))
+        if transactions_enabled():
+            record_transaction('connect', self._database, connection._cpf_target, timer() - start)
+        return connection
 
 ###============================================================###
 
 def profile_sql(action, sql, *args, **kwargs):
+    return profile_statement(action, sql, *args, **kwargs)[0]
+
+def profile_statement(action, sql, *args, **kwargs):
+    """
+    Runs a statement, returning its output and its record on the
+    sql_stats_buffer, or None if it wasn't recorded.
+    """
+    capture = current_capture()
+    # sql profiling can be switched off at runtime, see reconfigure.py
+    if cfg['sql'].get('sql_enabled') == 'false' and capture is None:
+        return action(sql, *args, **kwargs), None
+    start = timer()
     start_time = time.time()
     start_clock = time.clock()
+    wrapped_start = timer()
     output = action(sql, *args, **kwargs)
+    wrapped_end = timer()
     end_clock = time.clock()
     time_diff = end_clock-start_clock
-    if time_diff > 0:
-        stack = inspect.stack()
-        for i in range(len(stack)):
-            stack[i] = {'module': stack[i][1], 'function': stack[i][3]}
-        _id = id(start_time)
-        sql_stats_buffer[_id] = {'datetime':start_time,
-                                 'duration':time_diff,
-                                 'stack':stack,
-                                 'sql_string':sql,
-                                 'args':args[0] if len(args)>0 else {}
-                                }
-        del stack
-    return output
+    record = add_statement(sql, args[0] if len(args)>0 else {}, start_time, time_diff, capture)
+    if record is not None:
+        # slow statements are explained by how long they took to come back
+        record['_wall_duration'] = wrapped_end - wrapped_start
+    add_overhead('database', (wrapped_start - start) + (timer() - wrapped_end),
+                 wrapped_end - wrapped_start)
+    return output, record
+
+def add_statement(sql, args, start_time, time_diff, capture):
+    """
+    Puts a statement which took time_diff seconds on the sql_stats_buffer
+    and returns its record, or None if it was too quick to record.
+    """
+    # every statement of a deep captured request is kept, however quick
+    if time_diff <= 0 and capture is None:
+        return None
+    stack = inspect.stack()
+    for i in range(len(stack)):
+        stack[i] = {'module': stack[i][1], 'function': stack[i][3]}
+    record = {'datetime':start_time,
+              'duration':time_diff,
+              'stack':stack,
+              'sql_string':sql,
+              'args':args
+             }
+    if capture is not None:
+        record['metadata'] = dict(capture)
+    stamp(record)
+    sql_stats_buffer[id(record)] = record
+    del stack
+    return record
+
+def fetches_finished(record):
+    """
+    Returns True once the rows of record's statement have been fetched, or
+    it has waited fetch_timeout seconds for them.
+    """
+    if not record.get('_fetching'):
+        return True
+    return time.time() - record['datetime'] > float(cfg['sql'].get('fetch_timeout', 60))
+
+def transactions_enabled():
+    return cfg['sql'].get('transactions_enabled', 'false') == 'true'
+
+def record_transaction(event, database, target, duration, transaction_duration=None, statements=None):
+    """
+    Puts a connect, commit or rollback on the transaction_stats_buffer.
+    """
+    record = {'datetime': float(time.time()),
+              'event': event,
+              'database': database,
+              'target': target,
+              'duration': duration,
+              'transaction_duration': transaction_duration,
+              'statements': statements}
+    capture = current_capture()
+    if capture is not None:
+        record['metadata'] = dict(capture)
+    stamp(record)
+    transaction_stats_buffer[id(record)] = record
+
+def postgres_target(connection, connect_params):
+    """
+    Returns host/dbname of a psycopg2 connection, never its password.
+    """
+    params = dict(item.split('=', 1) for item in getattr(connection, 'dsn', '').split() if '=' in item)
+    if connect_params is not None:
+        params.update((key, value) for key, value in connect_params[1].items()
+                      if key in ('host', 'dbname', 'database'))
+    return '{0}/{1}'.format(params.get('host', 'localhost'),
+                            params.get('dbname', params.get('database', '')))
+
+def connect_target(args, kwargs):
+    """
+    Returns host/database from the arguments to a driver's connect, never
+    its password.
+    """
+    database = kwargs.get('database', kwargs.get('db', kwargs.get('dbname', '')))
+    if 'host' in kwargs:
+        return '{0}/{1}'.format(kwargs['host'], database)
+    dsn = kwargs.get('dsn', args[0] if args and isinstance(args[0], basestring) else '')
+    # e.g. user/password@host:port/service
+    return dsn.rsplit('@', 1)[-1] or database
+
+# placeholder of the nth positional arg for each DB-API paramstyle
+PLACEHOLDERS = {'qmark': '?',
+                'numeric': ':{0}',
+                'format': '%s',
+                'pyformat': '%s'}
+
+def arg_pairs(args, paramstyle, batch=False):
+    """
+    Returns a statement's args as [key, value] string pairs, keyed by name
+    for mappings and by the paramstyle's placeholder for sequences. The
+    parameter sets of an executemany are keyed by their index.
+    """
+    if batch:
+        return [[str(i), str(params)] for i, params in enumerate(args)]
+    if isinstance(args, dict):
+        return [[str(key), str(value)] for key, value in sorted(args.items())]
+    placeholder = PLACEHOLDERS.get(paramstyle, '?')
+    return [[placeholder.format(i + 1), str(value)] for i, value in enumerate(args)]
+
+def decorate_sqlite(sqlite3, name):
+    setattr(sqlite3,'connect', SqliteConnectionFactory(sqlite3.connect))
+    setattr(sqlite3.dbapi2,'connect', SqliteConnectionFactory(sqlite3.dbapi2.connect))
+
+def decorate_psycopg2(psycopg2, name):
+    _register_type = psycopg2.extensions.register_type
+
+    def _register_type_wrapper(type, obj=None):
+        if obj is not None:
+            if hasattr(obj, '_cpf_cursor'):
+                obj = obj._cpf_cursor
+            elif hasattr(obj, '_cpf_connection'):
+                obj = obj._cpf_connection
+            return _register_type(type, obj)
+        else:
+            return _register_type(type)
+
+    psycopg2.extensions.register_type = _register_type_wrapper
+
+    setattr(psycopg2,'connect', Psycopg2ConnectionFactory(psycopg2.connect))
+
+def decorate_dbapi(module, name):
+    factory = DbapiConnectionFactory(module.connect, name, getattr(module, 'paramstyle', None))
+    if getattr(module, 'Connect', None) is module.connect:
+        setattr(module, 'Connect', factory)
+    setattr(module, 'connect', factory)
+
+# name in the [sql] database list -> (driver module, function which wraps its connect)
+drivers = {'sqlite': ('sqlite3', decorate_sqlite),
+           'postgres': ('psycopg2', decorate_psycopg2)}
+
+def register_driver(name, module_name, decorate=decorate_dbapi):
+    """
+    Lets a DB-API 2 driver be profiled by listing name in [sql] database.
+    decorate is called with the driver module and name to wrap its
+    connect, by default with the generic DB-API wrappers.
+    """
+    drivers[name] = (module_name, decorate)
+
+for _driver in ('pymysql', 'MySQLdb', 'cx_Oracle', 'pg8000'):
+    register_driver(_driver, _driver)
+
+def decorate_driver(name):
+    # unregistered names are taken to be the name of a DB-API module
+    module_name, decorate = drivers.get(name, (name, decorate_dbapi))
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        raise Exception('Unknown/Unsupported database profile type: {0}'.format(name))
+    if isinstance(module.connect, ConnectionFactory):
+        return
+    decorate(module, name)
 
 def decorate_connections():
-    if cfg['sql']['database'] == 'sqlite':
-        import sqlite3
-        setattr(sqlite3,'connect', SqliteConnectionFactory(sqlite3.connect))
-        setattr(sqlite3.dbapi2,'connect', SqliteConnectionFactory(sqlite3.dbapi2.connect))
-    elif cfg['sql']['database'] == 'postgres':
-        import psycopg2
-        _register_type = psycopg2.extensions.register_type
-    
-        def _register_type_wrapper(type, obj=None):
-            if obj is not None:
-                if hasattr(obj, '_cpf_cursor'):
-                    obj = obj._cpf_cursor
-                elif hasattr(obj, '_cpf_connection'):
-                    obj = obj._cpf_connection
-                return _register_type(type, obj)
-            else:
-                return _register_type(type)
-    
-        psycopg2.extensions.register_type = _register_type_wrapper
-        
-        setattr(psycopg2,'connect', Psycopg2ConnectionFactory(psycopg2.connect))
-    else:
-        raise Exception('Unknown/Unsupported database profile type.')
-
+    if cfg['sql'].get('backend', 'dbapi') == 'sqlalchemy':
+        # profile through sqlalchemy's engine events instead of wrapping the driver
+        from sqlalchemy_profiler import listen_engines
+        listen_engines()
+        return
+    # several drivers can be profiled at once, comma separated
+    for name in cfg['sql']['database'].split(','):
+        if name.strip():
+            decorate_driver(name.strip())
@@ -0,0 +1,65 @@
+"""
+SQL profiling through SQLAlchemy engine events.
+
+With [sql] backend = sqlalchemy, the database driver isn't wrapped. Every
+sqlalchemy Engine is listened to instead, before_cursor_execute and
+after_cursor_execute time each statement it runs in wall time, and the
+statement goes on the sql_stats_buffer in the same format as the wrapped
+drivers give. So any dialect sqlalchemy supports is profiled, without a
+wrapper around each connection and cursor. Fetches and transactions aren't profiled this way.
+"""
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from cherry_pyformance import cfg
+from overhead import add_overhead, timer
+from deep_capture import current_capture
+from sql_profiler import add_statement
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        # sqlalchemy doesn't send after_cursor_execute for every statement
+        # run outside an execution context
+        return
+    # the starts are kept on the context, so those of statements which fail,
+    # or which never get an after_cursor_execute, go with it. Statements can
+    # nest in one context, e.g. a column default run before its insert.
+    starts = getattr(context, '_cpf_starts', None)
+    if starts is None:
+        starts = context._cpf_starts = []
+    starts.append((timer(), time.time()))
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    wrapped_end = timer()
+    starts = getattr(context, '_cpf_starts', None)
+    if not starts:
+        return
+    wrapped_start, start_time = starts.pop()
+    capture = current_capture()
+    # sql profiling can be switched off at runtime, see reconfigure.py
+    if cfg['sql'].get('sql_enabled') == 'false' and capture is None:
+        return
+    record = add_statement(statement, parameters if parameters is not None else {},
+                           start_time, wrapped_end - wrapped_start, capture)
+    if record is not None:
+        record['paramstyle'] = conn.dialect.paramstyle
+        rowcount = getattr(cursor, 'rowcount', -1)
+        record['rowcount'] = rowcount if rowcount >= 0 else None
+        if executemany:
+            record['batch_size'] = len(parameters)
+    add_overhead('database', timer() - wrapped_end, wrapped_end - wrapped_start)
+
+
+def listen_engines():
+    """
+    Profiles the statements of every sqlalchemy engine, including ones
+    already created.
+    """
+    if event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        return
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
@@ -0,0 +1,131 @@
+"""
+Lock contention of sqlite databases.
+
+sqlite waits on another connection's lock inside its busy handler, so a
+statement's profile only shows the execute which finally got the lock.
+With [sql] sqlite_locks_enabled = true, connections get a zero busy
+timeout and the wrapper does the waiting itself: a statement which finds
+the database locked is retried, backing off the way sqlite's busy handler
+does, until the connection's timeout (5 seconds by default) has passed.
+The statement's record is given:
+
+    lock_wait       seconds from its first attempt to the one which ran
+    lock_retries    times it found the database locked
+    lock_timeout    True if it gave up, raising 'database is locked'
+
+Commits which had to wait are recorded as COMMIT statements. Scripts run
+with executescript can't be retried, part of the script may have run, so
+they wait inside sqlite as usual and aren't measured.
+"""
+import time
+import sqlite3
+
+from cherry_pyformance import cfg
+from overhead import timer
+from deep_capture import current_capture
+
+
+# sqlite's own busy handler delays, the last is repeated
+DELAYS = (0.001, 0.002, 0.005, 0.01, 0.015, 0.02, 0.025, 0.025, 0.025, 0.05, 0.05, 0.1)
+
+
+def sqlite_locks_enabled():
+    return cfg['sql'].get('sqlite_locks_enabled', 'false') == 'true'
+
+
+def is_locked(error):
+    return 'locked' in str(error)
+
+
+class LockWaits(object):
+    """
+    The lock waits of one statement, see retrying.
+    """
+
+    def __init__(self):
+        self.retries = 0
+        self.wait = 0.0
+        self.timed_out = False
+
+    def add_to(self, record):
+        record['lock_wait'] = self.wait
+        record['lock_retries'] = self.retries
+        record['lock_timeout'] = self.timed_out
+
+
+def retrying(action, timeout, waits):
+    """
+    Returns action, retried while the database is locked for at most
+    timeout seconds, counting its retries and wait in waits.
+    """
+    def retry(*args, **kwargs):
+        start = timer()
+        while True:
+            try:
+                return action(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                waited = timer() - start
+                if not is_locked(e):
+                    raise
+                if waited >= timeout:
+                    waits.timed_out = True
+                    raise
+                time.sleep(min(DELAYS[min(waits.retries, len(DELAYS) - 1)], timeout - waited))
+                waits.retries += 1
+                waits.wait = timer() - start
+    return retry
+
+
+def add_locked(sql, args, start_time, waits):
+    """
+    Records a statement which was blocked but has no record of its own,
+    with its wait as its duration.
+    """
+    from sql_profiler import add_statement
+    capture = current_capture()
+    # sql profiling can be switched off at runtime, see reconfigure.py
+    if cfg['sql'].get('sql_enabled') == 'false' and capture is None:
+        return None
+    record = add_statement(sql, args, start_time, waits.wait, capture)
+    if record is not None:
+        waits.add_to(record)
+    return record
+
+
+def profile_locked(timeout, action, sql, *args, **kwargs):
+    """
+    profile_statement for a connection with a zero busy timeout, adding
+    the statement's lock waits to its record.
+    """
+    # imported here, sql_profiler imports this module
+    from sql_profiler import profile_statement
+    waits = LockWaits()
+    start_time = time.time()
+    try:
+        output, record = profile_statement(retrying(action, timeout, waits), sql, *args, **kwargs)
+    except sqlite3.OperationalError:
+        if waits.timed_out:
+            # a statement which gave up is recorded too
+            add_locked(sql, args[0] if args else {}, start_time, waits)
+        raise
+    if waits.retries:
+        if record is None:
+            # too quick to record, but it was blocked
+            record = add_locked(sql, args[0] if args else {}, start_time, waits)
+        else:
+            waits.add_to(record)
+    return output, record
+
+
+def commit_locked(timeout, action, *args, **kwargs):
+    """
+    Runs a commit on a connection with a zero busy timeout, recording it as
+    a COMMIT statement if it had to wait for the lock.
+    """
+    waits = LockWaits()
+    start_time = time.time()
+    try:
+        return retrying(action, timeout, waits)(*args, **kwargs)
+    finally:
+        if waits.retries or waits.timed_out:
+            add_locked('COMMIT', {}, start_time, waits)
@@ -0,0 +1,122 @@
+"""
+An import time profiler for application start up.
+
+With [startup] startup_enabled = true, initialise installs a sys.meta_path
+hook which times every module imported until the cherrypy engine has
+started. Each import is put on the startup_stats_buffer with its total
+wall time, the time spent executing the module itself (the total less the
+imports it made) and the chain of imports that led to it, then pushed to
+the server as the 'startup' stat type.
+
+initialise is often called after the application's own imports. To
+measure those too, install the hook first thing in the main script:
+
+    import cherry_pyformance.startup_profiler
+    cherry_pyformance.startup_profiler.install()
+
+This module doesn't need the config, so it can be imported before
+initialise is called.
+"""
+import imp
+import sys
+import time
+from functools import partial
+
+from overhead import timer
+
+
+startup_stats_buffer = {}
+
+
+def load_found(found, fullname):
+    """
+    Loads the module imp.find_module found.
+    """
+    file, pathname, description = found
+    try:
+        return imp.load_module(fullname, file, pathname, description)
+    finally:
+        if file is not None:
+            file.close()
+
+
+class StartupImportHook(object):
+    """
+    A sys.meta_path hook which times imports. The hook finds each module
+    itself, or through a hook after it such as the function profiler's,
+    and times it being loaded, so nested imports are timed inside their
+    parent's import.
+    """
+
+    def __init__(self):
+        # [module name, time spent importing children] for each import in progress
+        self._stack = []
+
+    def find_module(self, fullname, path=None):
+        if fullname in sys.modules:
+            return None
+        hooks = sys.meta_path[sys.meta_path.index(self) + 1:] if self in sys.meta_path else []
+        for hook in hooks:
+            loader = hook.find_module(fullname, path)
+            if loader is not None:
+                return StartupLoader(self, loader.load_module)
+        try:
+            found = imp.find_module(fullname.rpartition('.')[2], path)
+        except ImportError:
+            # let the normal import machinery fail in the normal way, this is
+            # often python 2 trying a relative import first.
+            return None
+        return StartupLoader(self, partial(load_found, found))
+
+
+class StartupLoader(object):
+
+    def __init__(self, hook, load):
+        self.hook = hook
+        self.load = load
+
+    def load_module(self, fullname):
+        stack = self.hook._stack
+        parent = stack[-1] if stack else None
+        frame = [fullname, 0.0]
+        chain = [name for name, children in stack] + [fullname]
+        stack.append(frame)
+        datetime = time.time()
+        start = timer()
+        try:
+            # errors raised by the module itself propagate as normal
+            module = self.load(fullname)
+        finally:
+            duration = timer() - start
+            stack.pop()
+            if parent is not None:
+                parent[1] += duration
+
+        record = {'datetime': datetime,
+                  'module': fullname,
+                  'parent': parent[0] if parent is not None else None,
+                  'chain': ' > '.join(chain),
+                  'depth': len(chain) - 1,
+                  'duration': duration,
+                  'exec_duration': max(duration - frame[1], 0.0)}
+        startup_stats_buffer[id(record)] = record
+        return module
+
+
+def installed():
+    return any(isinstance(hook, StartupImportHook) for hook in sys.meta_path)
+
+
+def install():
+    """
+    Starts timing imports.
+    """
+    if not installed():
+        sys.meta_path.insert(0, StartupImportHook())
+
+
+def uninstall():
+    """
+    Stops timing imports, called once the engine has started.
+    """
+    sys.meta_path[:] = [hook for hook in sys.meta_path if not isinstance(hook, StartupImportHook)]
@@ -1,12 +1,23 @@
 from cherry_pyformance import stat_logger, push_stats, stats_package_template, cfg
 from handler_profiler import handler_stats_buffer
 from function_profiler import function_stats_buffer
-from sql_profiler import sql_stats_buffer
+from sql_profiler import sql_stats_buffer, transaction_stats_buffer, fetches_finished, arg_pairs
+from sql_explain import explain_queued, explained
 from file_profiler import file_stats_buffer
 from decorator import decorator_stats_buffer
+from overhead import add_overhead, pop_overhead, timer
+from governor import governor_stats_buffer, evaluate
+from startup_profiler import startup_stats_buffer
+import deep_capture
+from thread_profiler import threads_finished, release_threads
+from routes import cap_names
+from http_profiler import http_stats_buffer, responses_finished
+from lock_profiler import lock_stats_buffer, collect_locks
+from subprocess_profiler import subprocess_stats_buffer
 
 
 def _flush_stats(stats_buffer, stat_type):
+    start = timer()
     stat_logger.info('Flushing {0} stats buffer.'.format(stat_type))
     # initialise a package of stats to push, not all stats may be ready to be pushed
     stats_to_push = []
@@ -14,19 +25,35 @@ def _flush_stats(stats_buffer, stat_type):
         # sometimes stat has already gone by this point.
         try:
             if stat_type in ('function','handler'):
-                # only push pickled items from the buffer
-                if type(stats_buffer[_id]['profile'])==str:
+                # only push pickled items, or finished timing only items, from the buffer
+                profile = stats_buffer[_id]['profile']
+                if type(profile)==str or (profile is None and 'duration' in stats_buffer[_id]):
+                    # wait for threads it started to add their profiles
+                    if not threads_finished(stats_buffer[_id]):
+                        continue
+                    release_threads(stats_buffer[_id])
                     stats_to_push.append(stats_buffer[_id])
                     del stats_buffer[_id] 
             elif stat_type == 'database':
-                # convert all args to strings, allows for easier filtering when single instancing
-                # having a mix of numbers and strings is not ideal
-                # if you have a better solution please let me know!
-                if isinstance(stats_buffer[_id]['args'], dict): # for sql args (they have keys used for sql string insertion)
-                    for key in stats_buffer[_id]['args']:
-                        stats_buffer[_id]['args'][key] = str(stats_buffer[_id]['args'][key])
-                else:
-                    stats_buffer[_id]['args'] = [str(arg) for arg in stats_buffer[_id]['args']]
+                # wait for the rows of the statement to be fetched, and its plan
+                if not fetches_finished(stats_buffer[_id]) or not explained(stats_buffer[_id]):
+                    continue
+                stats_buffer[_id].pop('_fetching', None)
+                stats_buffer[_id].pop('_wall_duration', None)
+                # convert all args to [key, value] string pairs, keyed the way the
+                # driver's paramstyle says, allows for easier filtering when single instancing
+                record = stats_buffer[_id]
+                record.setdefault('paramstyle', None)
+                record['args'] = arg_pairs(record['args'], record['paramstyle'], 'batch_size' in record)
+                stats_to_push.append(stats_buffer[_id])
+                del stats_buffer[_id]
+            elif stat_type == 'http':
+                # wait for the response to be read
+                if not responses_finished(stats_buffer[_id]):
+                    continue
+                if stats_buffer[_id].pop('_start', None) is not None:
+                    # never read or closed
+                    stats_buffer[_id]['duration'] = None
                 stats_to_push.append(stats_buffer[_id])
                 del stats_buffer[_id]
             else:
@@ -35,24 +62,51 @@ def _flush_stats(stats_buffer, stat_type):
         except KeyError:
             # if does not exist, assume a flusher on another thread has taken care of it
             pass
+    if stat_type == 'handler':
+        # keep the number of handler names on the server down
+        cap_names(stats_to_push)
     length = len(stats_to_push)
     if length != 0:
         stats_package = stats_package_template.copy()
         stats_package['stats'] = stats_to_push
         stats_package['type'] = stat_type
+        # report the cost of profiling since the last push, this includes
+        # the time spent on the previous flush of this buffer.
+        stats_package['metadata'] = stats_package['metadata'].copy()
+        overhead = pop_overhead(stat_type)
+        if overhead:
+            stats_package['metadata']['overhead'] = overhead
         push_stats(stats_package)
         stat_logger.info('Flushed {0} stats from the {1} buffer'.format(length,stat_type))
     else:
         stat_logger.info('No stats on the {0} buffer to flush.'.format(stat_type))
+    add_overhead(stat_type, 0.0, calls=0, flush=timer() - start)
 
 
 def flush_stats():
+    # let the governor adjust profiling depth before the buffers are emptied
+    evaluate(len(handler_stats_buffer) + len(function_stats_buffer) +
+             len(sql_stats_buffer) + len(file_stats_buffer) + len(http_stats_buffer) +
+             len(subprocess_stats_buffer))
+    # pick up any new deep captures asked for on the server
+    if deep_capture.enabled():
+        deep_capture.poll_captures()
     if cfg['handlers']:
         _flush_stats(handler_stats_buffer, 'handler')
     if cfg['functions']:
         _flush_stats(function_stats_buffer, 'function')
-    if cfg['sql']['database']:
+    if cfg['sql'].get('database'):
+        # slow statements are explained here, off the threads that ran them
+        explain_queued()
         _flush_stats(sql_stats_buffer, 'database')
-    if cfg['files']['files_enabled']:
-        _flush_stats(file_stats_buffer, 'file')
+    # files opened by deep captured requests are recorded with files_enabled off
+    _flush_stats(file_stats_buffer, 'file')
     _flush_stats(decorator_stats_buffer, 'function')
+    _flush_stats(governor_stats_buffer, 'governor')
+    _flush_stats(startup_stats_buffer, 'startup')
+    _flush_stats(transaction_stats_buffer, 'transaction')
+    _flush_stats(http_stats_buffer, 'http')
+    if cfg.get('locks', {}).get('locks_enabled', 'false') == 'true':
+        collect_locks()
+    _flush_stats(lock_stats_buffer, 'lock')
+    _flush_stats(subprocess_stats_buffer, 'subprocess')
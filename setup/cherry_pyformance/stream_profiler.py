@@ -0,0 +1,108 @@
+"""
+Profiling of generator and streaming handlers and functions.
+
+A handler or function which returns a generator does its work as the
+generator is iterated, after the wrapped call has returned. CherryPy
+handlers with response.stream = True are iterated as the body is written
+to the client. So when a wrapped call returns a generator it is wrapped in
+another which times every next() until the generator is exhausted, running
+it under the record's profile too if it has one. The record is given:
+
+    first_chunk     seconds from the call to its first chunk
+    stream_duration seconds from the call until it was exhausted or closed
+    stream_bytes    length of the str chunks it yielded, unicode chunks are
+                    counted in characters
+
+The record's duration is the time spent in the call and its next()s, not
+the time spent waiting on the client between chunks.
+"""
+import types
+
+from overhead import timer
+import deep_capture
+import profile_context
+
+
+def is_stream(result):
+    return isinstance(result, types.GeneratorType)
+
+
+class ProfiledStream(object):
+    """
+    An iterator over the chunks of body, which adds its timings to record.
+    started is the timer value the call started at and wrapped the time
+    spent in the call. finish is called with the total time spent in the
+    call and body once body is exhausted, closed or dropped.
+    """
+
+    def __init__(self, body, record, profiled, started, wrapped, finish):
+        self.body = body
+        self.record = record
+        self.profiled = profiled
+        self.started = started
+        self.total = wrapped
+        self.size = 0
+        self.finish = finish
+        self.finished = False
+        # the deep capture of the request which made the generator
+        self.capture = deep_capture.current_capture()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        record = self.record
+        # a profile may already be running on this thread, e.g. when a
+        # profiled handler iterates a profiled function's generator
+        profiling = self.profiled and profile_context.active() is None
+        if profiling:
+            profile_context.start(record, self.started)
+            deep_capture.set_current_capture(self.capture)
+        chunk_start = timer()
+        exhausted = False
+        try:
+            if profiling:
+                chunk = record['profile'].runcall(next, self.body)
+            else:
+                chunk = next(self.body)
+        except StopIteration:
+            exhausted = True
+        finally:
+            chunk_end = timer()
+            self.total += chunk_end - chunk_start
+            if profiling:
+                profile_context.stop()
+                deep_capture.set_current_capture(None)
+        if exhausted:
+            self.close()
+            raise StopIteration
+        if 'first_chunk' not in record:
+            record['first_chunk'] = chunk_end - self.started
+        if isinstance(chunk, basestring):
+            self.size += len(chunk)
+        return chunk
+
+    def close(self):
+        if self.finished:
+            return
+        self.finished = True
+        # closes body too if it was abandoned part way through
+        self.body.close()
+        self.record['stream_duration'] = timer() - self.started
+        self.record['stream_bytes'] = self.size
+        self.record.pop('_stream', None)
+        self.finish(self.total)
+
+    def __del__(self):
+        # a generator which is dropped, even unstarted, still finishes its record
+        self.close()
+
+
+def close_stream(record):
+    """
+    Closes record's stream if it wasn't iterated to the end, e.g. when the
+    client went away.
+    """
+    stream = record.pop('_stream', None)
+    if stream is not None:
+        stream.close()
@@ -0,0 +1,190 @@
+"""
+Profiling of child processes.
+
+With [subprocess] subprocess_enabled = true, subprocess.Popen and
+os.system are wrapped, which covers call, check_call, check_output and
+anything else built on Popen. Each child is put on the
+subprocess_stats_buffer once it has been reaped and pushed to the server
+as the 'subprocess' stat type, with:
+
+    command     the file name of argv[0], or the first word of a shell
+                command line
+    exit_code   the child's exit code, negative if it was killed by a
+                signal, None if it couldn't be started
+    error       the exception starting it failed with, if it did
+    duration    seconds from starting the child until it was reaped by
+                wait, poll or communicate
+    cpu         user and system seconds used by the child
+    max_rss     the child's peak resident memory, in kilobytes
+
+Children of Popen are reaped with os.wait4, which gives the resource usage
+of that child alone. os.system reaps its child itself, so its cpu is the
+difference in the usage of all reaped children over the call, which takes
+in any other child reaped at the same time, and its max_rss is None.
+Neither is known on Windows. A Popen which is never waited on is recorded
+when subprocess cleans it up.
+"""
+import errno
+import os
+import re
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+from cherry_pyformance import cfg, stat_logger
+from overhead import add_overhead, timer
+from deep_capture import current_capture
+from trace_context import stamp
+
+
+subprocess_stats_buffer = {}
+
+# splits a shell command line into its words
+SHELL_WORDS = re.compile(r'[\s;&|()<>]+')
+
+_originals = {}
+
+
+def subprocess_enabled():
+    return cfg.get('subprocess', {}).get('subprocess_enabled', 'false') == 'true'
+
+
+def command_name(args):
+    if isinstance(args, basestring):
+        # a shell command line, or a program run without arguments,
+        # skipping any variables set for the command
+        args = [word for word in SHELL_WORDS.split(args) if word]
+        while args and '=' in args[0]:
+            args.pop(0)
+    return os.path.basename(args[0]) if args else ''
+
+
+def max_rss(rusage):
+    # bytes on OS X, kilobytes everywhere else
+    if sys.platform == 'darwin':
+        return rusage.ru_maxrss // 1024
+    return rusage.ru_maxrss
+
+
+def new_record(args):
+    record = {'datetime': time.time(),
+              'command': command_name(args),
+              'exit_code': None,
+              'cpu': None,
+              'max_rss': None}
+    capture = current_capture()
+    if capture is not None:
+        record['metadata'] = dict(capture)
+    stamp(record)
+    return record
+
+
+def finish(record, exit_code, error=None):
+    """
+    Ends record's child and puts it on the buffer, once.
+    """
+    start = record.pop('_start', None)
+    if start is None:
+        return
+    record['duration'] = timer() - start
+    record['exit_code'] = exit_code
+    if error is not None:
+        record['error'] = type(error).__name__
+    subprocess_stats_buffer[id(record)] = record
+
+
+def popen_init(self, args, *popen_args, **popen_kwargs):
+    start = timer()
+    if subprocess_enabled():
+        record = new_record(args)
+        record['_start'] = start
+        add_overhead('subprocess', timer() - start)
+    else:
+        record = None
+    self._cpf_record = record
+    try:
+        _originals['__init__'](self, args, *popen_args, **popen_kwargs)
+    except Exception as e:
+        if record is not None:
+            finish(record, None, e)
+        raise
+
+
+def reap(popen, options):
+    """
+    Reaps popen's child with os.wait4 if it has exited, adding its resource
+    usage to its record. Anything unexpected is left to subprocess.
+    """
+    while True:
+        try:
+            pid, status, rusage = os.wait4(popen.pid, options)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            return
+        break
+    if pid == popen.pid:
+        popen._handle_exitstatus(status)
+        record = popen._cpf_record
+        record['cpu'] = rusage.ru_utime + rusage.ru_stime
+        record['max_rss'] = max_rss(rusage)
+
+
+def waited(wait, options):
+    def wrapper(self, *args, **kwargs):
+        record = getattr(self, '_cpf_record', None)
+        if record is None:
+            return wait(self, *args, **kwargs)
+        if self.returncode is None and hasattr(os, 'wait4') and getattr(self, '_child_created', False):
+            reap(self, options)
+        returncode = wait(self, *args, **kwargs)
+        if returncode is not None:
+            finish(record, returncode)
+        return returncode
+    return wrapper
+
+
+def exit_code(status):
+    if sys.platform == 'win32':
+        return status
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def system(command):
+    if not subprocess_enabled():
+        return _originals['system'](command)
+    record = new_record(command)
+    record['_start'] = timer()
+    before = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+    try:
+        status = _originals['system'](command)
+    except Exception as e:
+        finish(record, None, e)
+        raise
+    if before is not None:
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        record['cpu'] = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    finish(record, exit_code(status))
+    return status
+
+
+def decorate_subprocess():
+    if _originals:
+        return
+    stat_logger.info('Wrapping subprocess.Popen and os.system')
+    _originals['__init__'] = subprocess.Popen.__init__.__func__
+    subprocess.Popen.__init__ = popen_init
+    # poll and __del__ reap through _internal_poll
+    for name, options in (('wait', 0), ('_internal_poll', getattr(os, 'WNOHANG', 0))):
+        _originals[name] = getattr(subprocess.Popen, name).__func__
+        setattr(subprocess.Popen, name, waited(_originals[name], options))
+    _originals['system'] = os.system
+    os.system = system
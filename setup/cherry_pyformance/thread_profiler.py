@@ -0,0 +1,142 @@
+"""
+Profiling of threads started during a profiled call.
+
+cProfile only sees the thread it runs on, so a handler which hands its
+work to other threads shows almost nothing in its profile. With [threads]
+profile_threads = true, threading.Thread.start is hooked: a thread started
+while a handler or function is being profiled on the starting thread is
+itself run under cProfile. When it finishes its profile, wall time and CPU
+time are added to the parent record's 'threads', and the server merges the
+profile into the parent's. The parent record is held on the buffer until
+its threads have finished, or for thread_timeout seconds at most. A thread
+still running when its parent is pushed, a worker which lives on after the
+call, stops being profiled then and its profile is dropped.
+
+Thread pools are only covered when the pool's threads are started during
+the profiled call.
+"""
+import cProfile
+import cPickle
+import sys
+import threading
+import time
+
+from cherry_pyformance import cfg
+from overhead import timer
+import profile_context
+import deep_capture
+import trace_context
+
+try:
+    import resource
+    # per thread CPU time, only on linux
+    RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD', 1 if sys.platform.startswith('linux') else None)
+except ImportError:
+    resource = None
+    RUSAGE_THREAD = None
+
+
+_thread_lock = threading.Lock()
+_original_start = threading.Thread.start
+
+
+def thread_cpu_time():
+    """
+    Returns the CPU time used by the current thread, or None if the
+    platform can't tell.
+    """
+    if RUSAGE_THREAD is None:
+        return None
+    try:
+        usage = resource.getrusage(RUSAGE_THREAD)
+    except (ValueError, resource.error):
+        return None
+    return usage.ru_utime + usage.ru_stime
+
+
+def threads_finished(record):
+    """
+    Returns True once the threads started during record's profile have
+    finished, or it has waited thread_timeout seconds for them.
+    """
+    if not record.get('_threads', 0):
+        return True
+    timeout = float(cfg.get('threads', {}).get('thread_timeout', 60))
+    return time.time() - record['datetime'] > timeout
+
+
+def released(record):
+    """
+    Returns True once record has been pushed without the threads it is
+    waiting on.
+    """
+    return '_threads' not in record
+
+
+def release_threads(record):
+    """
+    Takes the count of running threads off record as it is pushed.
+    """
+    with _thread_lock:
+        record.pop('_threads', None)
+
+
+def _stop_contexts():
+    profile_context.stop()
+    deep_capture.set_current_capture(None)
+    trace_context.set_current_trace(None)
+
+
+def _profiled_run(thread, run, record, started, capture, trace):
+    def profile_timer():
+        # cProfile calls its timer on each call and return made on the
+        # thread, a profiler can only be turned off from its own thread
+        if released(record):
+            sys.setprofile(None)
+            _stop_contexts()
+        return timer()
+
+    def profiled_run():
+        # nested wrapped functions add spans to the parent record
+        profile_context.start(record, started)
+        deep_capture.set_current_capture(capture)
+        trace_context.set_current_trace(trace)
+        profile = cProfile.Profile(profile_timer)
+        wall_start = timer()
+        cpu_start = thread_cpu_time()
+        try:
+            profile.runcall(run)
+        finally:
+            wall = timer() - wall_start
+            cpu_end = thread_cpu_time()
+            _stop_contexts()
+            with _thread_lock:
+                # the record may have been pushed without it after thread_timeout
+                if not released(record):
+                    profile.create_stats()
+                    record.setdefault('threads', []).append({
+                        'name': thread.name,
+                        'wall': wall,
+                        'cpu': cpu_end - cpu_start if cpu_start is not None and cpu_end is not None else None,
+                        'profile': cPickle.dumps(profile.stats)})
+                    record['_threads'] -= 1
+    return profiled_run
+
+
+def _start(self):
+    record = profile_context.active()
+    if record is not None:
+        with _thread_lock:
+            record['_threads'] = record.get('_threads', 0) + 1
+        # the instance attribute is called by Thread's bootstrap instead of the method
+        self.run = _profiled_run(self, self.run, record, profile_context.started(),
+                                 deep_capture.current_capture(), trace_context.current_trace())
+    return _original_start(self)
+
+
+def hook_threads():
+    threading.Thread.start = _start
+
+
+def unhook_threads():
+    threading.Thread.start = _original_start
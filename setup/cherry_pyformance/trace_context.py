@@ -0,0 +1,99 @@
+"""
+Trace context passed between services.
+
+With [trace] trace_enabled = true, a request to a handler with the stats
+tool on starts a span. If the request carries the trace header (X-CPF-Trace
+by default) as trace_id:span_id, the new span joins that trace with the
+caller's span as its parent, otherwise it starts a new trace. Every record
+made on the thread while the request is handled (its handler, functions,
+SQL, files, outbound requests and child processes) is tagged with its
+trace_id and span_id, and the handler's record with parent_span as well.
+These are fields of the record rather than metadata, the server keeps them
+in columns of its own so they don't make metadata per request. The trace
+header is sent back on the response, and added to outbound httplib and
+urllib2 requests so the services they call join the trace. The stats
+server joins the handler records of a trace into a tree, see its /traces
+report.
+"""
+import re
+import threading
+import uuid
+
+from cherry_pyformance import cfg
+
+
+# hex ids, anything else in the header is ignored
+TRACE_VALUE = re.compile(r'^([0-9a-f]{16,32}):([0-9a-f]{16})$')
+
+_local = threading.local()
+
+
+def enabled():
+    return cfg.get('trace', {}).get('trace_enabled', 'false') == 'true'
+
+
+def header_name():
+    return cfg.get('trace', {}).get('trace_header', '') or 'X-CPF-Trace'
+
+
+def current_trace():
+    """
+    Returns the trace of the request being handled on this thread, as a
+    dict of trace_id, span_id and parent_span, otherwise None.
+    """
+    return getattr(_local, 'trace', None)
+
+
+def set_current_trace(trace):
+    _local.trace = trace
+
+
+def start_span(header):
+    """
+    Returns a new span for a request with the trace header value header,
+    which may be None.
+    """
+    match = TRACE_VALUE.match((header or '').strip().lower())
+    if match:
+        trace_id, parent_span = match.groups()
+    else:
+        trace_id, parent_span = uuid.uuid4().hex, None
+    return {'trace_id': trace_id,
+            'span_id': uuid.uuid4().hex[:16],
+            'parent_span': parent_span}
+
+
+def header_value(trace):
+    return '{0}:{1}'.format(trace['trace_id'], trace['span_id'])
+
+
+def outbound_header():
+    """
+    Returns the header name and value to send on requests made by the
+    current span, or None if there isn't one.
+    """
+    trace = current_trace()
+    if trace is None:
+        return None
+    return header_name(), header_value(trace)
+
+
+def stamp(record, trace=None):
+    """
+    Tags record with the trace and span it was made in, if any.
+    """
+    if trace is None:
+        trace = current_trace()
+        if trace is None:
+            return
+    record['trace_id'] = trace['trace_id']
+    record['span_id'] = trace['span_id']
+
+
+def stamp_span(record, trace):
+    """
+    Tags the record of the handler which is trace's span, with its parent.
+    """
+    stamp(record, trace)
+    if trace['parent_span'] is not None:
+        record['parent_span'] = trace['parent_span']
@@ -0,0 +1,82 @@
+"""
+Adaptive capture of handlers with ids in their paths.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import time
+import unittest
+from StringIO import StringIO
+
+import cherrypy
+from cherrypy.lib import httputil
+
+import cherry_pyformance
+
+
+class Devices(object):
+
+    @cherrypy.expose
+    def default(self, *path, **params):
+        time.sleep(float(params.get('delay', 0.001)))
+        return path[-1]
+
+
+class AdaptiveRouteTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'adaptive': {'adaptive_enabled': 'true',
+                                                           'quantile': '0.99',
+                                                           'threshold': '3',
+                                                           'capture_requests': '2',
+                                                           'warmup': '5'},
+                                              'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import adaptive, handler_profiler
+        self.adaptive = adaptive
+        self.buffer = handler_profiler.handler_stats_buffer
+        adaptive.estimates.clear()
+        adaptive.pending_captures.clear()
+        cherrypy.tools.stats = handler_profiler.StatsTool()
+        self.app = cherrypy.Application(Devices(), '/core', {'/': {'tools.stats.on': True}})
+
+    def get(self, path):
+        """
+        Runs a request to the app without a server and returns its record.
+        """
+        self.buffer.clear()
+        local = httputil.Host('127.0.0.1', 8080, '')
+        remote = httputil.Host('127.0.0.1', 50000, '')
+        request, response = self.app.get_serving(local, remote, 'http', 'HTTP/1.1')
+        try:
+            path, _, query_string = path.partition('?')
+            request.run('GET', '/core' + path, query_string, 'HTTP/1.1', [('Host', '127.0.0.1')], StringIO(''))
+            response.collapse_body()
+            self.assertEqual(response.output_status, '200 OK')
+        finally:
+            self.app.release_serving()
+        self.assertEqual(len(self.buffer), 1)
+        return self.buffer.values()[0]
+
+    def test_breach_captures_the_route_not_the_path(self):
+        for device_id in range(5):
+            record = self.get('/device/{0}/logs'.format(device_id))
+            self.assertIsNone(record['profile'])
+        record = self.get('/device/5/logs?delay=0.05')
+        self.assertEqual(record['metadata'], {'latency_breach': 'true'})
+        self.assertEqual(self.adaptive.pending_captures, {'/core/device/{id}/logs': 2})
+
+        # the next calls to the route are profiled, whichever device they are for
+        for device_id in (6, 7):
+            record = self.get('/device/{0}/logs'.format(device_id))
+            self.assertEqual(record['metadata'], {'adaptive_capture': 'true'})
+            self.assertIsInstance(record['profile'], str)
+        self.assertEqual(self.adaptive.pending_captures, {})
+        self.assertIsNone(self.get('/device/8/logs')['profile'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Deep capture of requests to a handler, asked for on the stats server or
+with the profile header.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import json
+import os
+import unittest
+from StringIO import StringIO
+
+import cherrypy
+from cherrypy.lib import httputil
+
+import cherry_pyformance
+
+
+class Root(object):
+
+    @cherrypy.expose
+    def item(self):
+        return 'item'
+
+
+class DeepCaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'deep_capture': {'deep_capture_enabled': 'true',
+                                                               'profile_header_secret': 'letmein'},
+                                              'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import deep_capture, handler_profiler
+        self.deep_capture = deep_capture
+        self.buffer = handler_profiler.handler_stats_buffer
+        self.buffer.clear()
+        deep_capture.captures.clear()
+        deep_capture._seen.clear()
+        self.server_captures = []
+        deep_capture.urlopen = lambda address, timeout: StringIO(json.dumps(self.server_captures))
+        cherrypy.tools.stats = handler_profiler.StatsTool()
+        # captures look handlers up on the tree
+        self.app = cherrypy.tree.mount(Root(), '/cap', {'/': {}})
+        self.app.log.screen = False
+
+    def tearDown(self):
+        from urllib2 import urlopen
+        self.deep_capture.urlopen = urlopen
+        self.deep_capture.captures.clear()
+        del cherrypy.tree.apps['/cap']
+        self.buffer.clear()
+
+    def get(self, headers=()):
+        """
+        Runs a request to the app without a server and returns its record,
+        or None if it wasn't recorded, and the response headers.
+        """
+        self.buffer.clear()
+        local = httputil.Host('127.0.0.1', 8080, '')
+        remote = httputil.Host('127.0.0.1', 50000, '')
+        request, response = self.app.get_serving(local, remote, 'http', 'HTTP/1.1')
+        try:
+            request.run('GET', '/cap/item', '', 'HTTP/1.1', [('Host', '127.0.0.1')] + list(headers), StringIO(''))
+            response.collapse_body()
+            self.assertEqual(response.output_status, '200 OK')
+        finally:
+            self.app.release_serving()
+        records = self.buffer.values()
+        return (records[0] if records else None), response.headers
+
+    def test_server_captures_the_next_requests(self):
+        self.assertIsNone(self.get()[0])
+        self.server_captures = [{'id': 7, 'handler': '/cap/item', 'requests': 2}]
+        self.deep_capture.poll_captures()
+        for i in range(2):
+            record, headers = self.get()
+            self.assertEqual(record['metadata'], {'deep_capture': 7})
+            self.assertIsInstance(record['profile'], str)
+        # the handler goes back to how it was once the requests are captured
+        self.assertEqual(self.deep_capture.captures, {})
+        self.assertIsNone(self.get()[0])
+
+        # a capture is only picked up once
+        self.deep_capture.poll_captures()
+        self.assertEqual(self.deep_capture.captures, {})
+
+    def test_removed_captures_stop(self):
+        self.server_captures = [{'id': 8, 'handler': '/cap/item', 'requests': 5}]
+        self.deep_capture.poll_captures()
+        self.assertEqual(self.get()[0]['metadata'], {'deep_capture': 8})
+        self.server_captures = []
+        self.deep_capture.poll_captures()
+        self.assertIsNone(self.get()[0])
+
+    def test_profile_header_needs_the_secret(self):
+        cherrypy.tree.apps['/cap'].merge({'/': {'tools.stats.on': True}})
+        record, headers = self.get([(self.deep_capture.PROFILE_HEADER, 'letmein')])
+        profile_id = headers[self.deep_capture.PROFILE_ID_HEADER]
+        self.assertEqual(record['metadata'], {'profile_id': profile_id})
+
+        record, headers = self.get([(self.deep_capture.PROFILE_HEADER, 'guess')])
+        self.assertNotIn('metadata', record)
+        self.assertNotIn(self.deep_capture.PROFILE_ID_HEADER, headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Profiling of files opened through the wrapped open, and the profile header
+secret check.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import cherry_pyformance
+
+
+class OpenTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {},
+                                              'files': {'files_enabled': 'false',
+                                                        'ignored_directories': ''}})
+        from cherry_pyformance import cfg, deep_capture, file_profiler
+        self.cfg = cfg
+        self.deep_capture = deep_capture
+        self.file_profiler = file_profiler
+        file_profiler.file_stats_buffer.clear()
+        # the builtin file type takes the same arguments as open
+        self.open = file_profiler.OpenFn(file)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'data')
+        with file(self.path, 'w') as f:
+            f.write('data')
+
+    def tearDown(self):
+        self.deep_capture.set_current_capture(None)
+        self.file_profiler.file_stats_buffer.clear()
+        shutil.rmtree(self.directory)
+
+    def test_passes_every_argument_through_when_off(self):
+        f = self.open(self.path, 'rb', 0)
+        self.assertIsInstance(f, file)
+        self.assertEqual(f.read(), 'data')
+        f.close()
+        f = self.open(name=self.path, mode='rb', buffering=0)
+        self.assertEqual(f.read(), 'data')
+        f.close()
+        self.assertEqual(self.file_profiler.file_stats_buffer, {})
+
+    def test_records_files_when_on(self):
+        self.cfg['files']['files_enabled'] = 'true # an inline comment'
+        with self.open(self.path, 'rb', 0) as f:
+            self.assertEqual(f.read(), 'data')
+        records = self.file_profiler.file_stats_buffer.values()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['mode'], 'rb')
+        self.assertNotIn('metadata', records[0])
+
+    def test_records_files_of_captured_requests_when_off(self):
+        self.deep_capture.set_current_capture({'deep_capture': '7'})
+        f = self.open(self.path, 'ab', 0)
+        f.write('more')
+        f.close()
+        records = self.file_profiler.file_stats_buffer.values()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['data_written'], 4)
+        self.assertEqual(records[0]['metadata'], {'deep_capture': '7'})
+
+
+class CompareDigestTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+
+    def test_fallback_compares_whole_strings(self):
+        from cherry_pyformance.deep_capture import _compare_digest
+        self.assertTrue(_compare_digest('secret', 'secret'))
+        self.assertFalse(_compare_digest('secret', 'secreT'))
+        self.assertFalse(_compare_digest('secret', 'secrets'))
+        self.assertFalse(_compare_digest('', 'secret'))
+        self.assertTrue(_compare_digest('', ''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Wrapping functions and every kind of method with decorate_function.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import unittest
+
+import cherry_pyformance
+
+
+def handle(x):
+    return x
+
+
+class Base(object):
+
+    def save(self, x):
+        return (self, x)
+
+    @classmethod
+    def create(cls, x):
+        return (cls, x)
+
+    @staticmethod
+    def check(x):
+        return x
+
+
+class Child(Base):
+
+    def save(self, x):
+        return Base.save(self, x)
+
+
+class FunctionWrapperTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import function_profiler
+        self.function_profiler = function_profiler
+        function_profiler.function_stats_buffer.clear()
+
+    def tearDown(self):
+        for module_str, func_str in self.function_profiler.wrapped_functions.keys():
+            self.function_profiler.undecorate_function(module_str, func_str)
+        self.function_profiler.function_stats_buffer.clear()
+
+    def wrap(self, *func_strs):
+        for func_str in func_strs:
+            self.function_profiler.decorate_function(__name__, func_str)
+
+    def names(self):
+        """
+        Returns the class and function names of the records made so far.
+        """
+        return sorted((record['class'], record['function'])
+                      for record in self.function_profiler.function_stats_buffer.values())
+
+    def test_function(self):
+        self.wrap('handle')
+        self.assertTrue(hasattr(handle, '_cpf_wrapped'))
+        self.assertEqual(handle(1), 1)
+        self.assertEqual(self.names(), [(None, 'handle')])
+
+    def test_instance_method(self):
+        self.wrap('Base.save')
+        base = Base()
+        self.assertEqual(base.save(1), (base, 1))
+        self.assertEqual(Base.save(base, 2), (base, 2))
+        self.assertEqual(self.names(), [('Base', 'save'), ('Base', 'save')])
+
+    def test_class_method(self):
+        self.wrap('Base.create')
+        self.assertIsInstance(vars(Base)['create'], classmethod)
+        self.assertEqual(Base.create(1), (Base, 1))
+        self.assertEqual(Base().create(1), (Base, 1))
+        self.assertEqual(Child.create(1), (Child, 1))
+
+    def test_static_method(self):
+        self.wrap('Base.check')
+        self.assertIsInstance(vars(Base)['check'], staticmethod)
+        self.assertEqual(Base.check(1), 1)
+        self.assertEqual(Base().check(1), 1)
+        self.assertEqual(self.names(), [('Base', 'check'), ('Base', 'check')])
+
+    def test_inherited_methods(self):
+        self.wrap('Child.create', 'Child.check')
+        self.assertIsInstance(vars(Child)['create'], classmethod)
+        self.assertIsInstance(vars(Child)['check'], staticmethod)
+        self.assertEqual(Child.create(1), (Child, 1))
+        self.assertEqual(Child().create(1), (Child, 1))
+        self.assertEqual(Child.check(1), 1)
+        self.assertEqual(Child().check(1), 1)
+        # the base class is left alone
+        self.assertFalse(hasattr(vars(Base)['check'].__func__, '_cpf_wrapped'))
+        self.assertEqual(self.names(), [('Child', 'check'), ('Child', 'check'),
+                                        ('Child', 'create'), ('Child', 'create')])
+
+        # unwrapping inherits them again
+        self.function_profiler.undecorate_function(__name__, 'Child.create')
+        self.function_profiler.undecorate_function(__name__, 'Child.check')
+        self.assertNotIn('create', vars(Child))
+        self.assertNotIn('check', vars(Child))
+
+    def test_methods_wrapped_on_a_base_class_are_rewrapped_for_the_child(self):
+        self.wrap('Base.check', 'Child.check')
+        self.assertIs(vars(Child)['check'].__func__._cpf_wrapped,
+                      vars(Base)['check'].__func__._cpf_wrapped)
+        Child.check(1)
+        self.assertEqual(self.names(), [('Child', 'check')])
+
+    def test_overrides_have_their_own_names(self):
+        self.wrap('Base.save', 'Child.save')
+        Child().save(1)
+        self.assertEqual(self.names(), [('Base', 'save'), ('Child', 'save')])
+
+    def test_rewrapping_is_idempotent(self):
+        original = vars(Base)['save']
+        self.wrap('Base.save', 'Base.save')
+        self.wrap('Base.save')
+        self.assertIs(vars(Base)['save']._cpf_wrapped, original)
+        self.assertEqual(self.function_profiler.wrapped_functions[(__name__, 'Base.save')][2], original)
+        Base().save(1)
+        self.assertEqual(self.names(), [('Base', 'save')])
+
+        self.function_profiler.undecorate_function(__name__, 'Base.save')
+        self.assertIs(vars(Base)['save'], original)
+
+
+if __name__ == '__main__':
+    unittest.main()
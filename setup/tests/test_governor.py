@@ -0,0 +1,77 @@
+"""
+Stepping the profiling level of handlers and functions with the governor.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import threading
+import unittest
+
+import cherry_pyformance
+
+
+class GovernorTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'governor': {'governor_enabled': 'true',
+                                                           'overhead_budget': '0.01',
+                                                           'buffer_budget': '10000',
+                                                           'sample_rate': '5'},
+                                              'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import governor, overhead
+        self.governor = governor
+        self.overhead = overhead
+        governor.levels.clear()
+        governor._sample_counts.clear()
+        governor.governor_stats_buffer.clear()
+        overhead.pop_name_totals()
+
+    def tearDown(self):
+        self.governor.levels.clear()
+        self.governor.governor_stats_buffer.clear()
+        self.overhead.pop_name_totals()
+
+    def test_sampled_calls_are_counted_across_threads(self):
+        self.governor.levels[('function', 'app.handle')] = self.governor.SAMPLED
+        modes = []
+        def call():
+            modes.extend(self.governor.profile_mode('function', 'app.handle') for i in range(5000))
+        interval = sys.getcheckinterval()
+        # switch threads as often as possible
+        sys.setcheckinterval(1)
+        try:
+            threads = [threading.Thread(target=call) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setcheckinterval(interval)
+        self.assertEqual(modes.count(self.governor.FULL), 8 * 5000 / 5)
+        self.assertEqual(modes.count(self.governor.TIMING), 8 * 5000 * 4 / 5)
+
+    def test_steps_down_over_budget_and_back_up(self):
+        self.overhead.add_overhead('function', 0.5, calls=1000, name='app.handle')
+        self.overhead.add_overhead('function', 0.001, name='app.cheap')
+        self.governor._last_evaluated[0] = self.overhead.timer() - 1.0
+        self.governor.evaluate(0)
+        # the most expensive target is stepped down first, which fits the budget
+        self.assertEqual(self.governor.levels, {('function', 'app.handle'): self.governor.SAMPLED})
+        transition, = self.governor.governor_stats_buffer.values()
+        self.assertEqual((transition['name'], transition['from_level'], transition['to_level']),
+                         ('app.handle', self.governor.FULL, self.governor.SAMPLED))
+
+        self.overhead.add_overhead('function', 0.0001, name='app.handle')
+        self.governor._last_evaluated[0] = self.overhead.timer() - 1.0
+        self.governor.evaluate(0)
+        self.assertEqual(self.governor.levels, {})
+        self.assertEqual(self.governor.profile_mode('function', 'app.handle'), self.governor.FULL)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Records of requests to handlers with the stats tool on.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import time
+import unittest
+from StringIO import StringIO
+
+import cherrypy
+from cherrypy.lib import httputil
+
+import cherry_pyformance
+
+
+class Root(object):
+
+    @cherrypy.expose
+    def slow(self, **params):
+        time.sleep(0.02)
+        return 'slow'
+
+    @cherrypy.expose
+    def echo(self, **params):
+        return ','.join(sorted(params))
+
+    @cherrypy.expose
+    def stream(self):
+        yield 'abc'
+        yield 'de'
+    stream._cp_config = {'response.stream': True}
+
+
+class HandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import handler_profiler
+        self.handler_profiler = handler_profiler
+        self.buffer = handler_profiler.handler_stats_buffer
+        self.buffer.clear()
+        cherrypy.tools.stats = handler_profiler.StatsTool()
+        self.app = cherrypy.Application(Root(), '/core', {'/': {'tools.stats.on': True}})
+
+    def tearDown(self):
+        self.buffer.clear()
+
+    def request(self, path, method='GET', body='', headers=()):
+        """
+        Runs a request to the app without a server and returns its record
+        and response.
+        """
+        self.buffer.clear()
+        local = httputil.Host('127.0.0.1', 8080, '')
+        remote = httputil.Host('127.0.0.1', 50000, '')
+        request, response = self.app.get_serving(local, remote, 'http', 'HTTP/1.1')
+        try:
+            path, _, query_string = path.partition('?')
+            headers = [('Host', '127.0.0.1')] + list(headers)
+            if body:
+                headers += [('Content-Type', 'application/x-www-form-urlencoded'),
+                            ('Content-Length', str(len(body)))]
+            request.run(method, '/core' + path, query_string, 'HTTP/1.1', headers, StringIO(body))
+            response.collapse_body()
+        finally:
+            self.app.release_serving()
+        record, = self.buffer.values()
+        return record, response
+
+    def test_time_is_split_into_phases(self):
+        start = time.time()
+        record, response = self.request('/slow')
+        elapsed = time.time() - start
+        phases = record['phases']
+        self.assertEqual(sorted(phases), sorted(self.handler_profiler.PHASES[:-1]))
+        # the handler runs between before_handler and before_finalize
+        self.assertGreaterEqual(phases['before_handler'], 0.02)
+        self.assertLessEqual(sum(phases.values()), elapsed)
+
+    def test_sizes_and_status(self):
+        record, response = self.request('/echo?a=1&b=2', 'POST', 'c=3&d=4')
+        self.assertEqual(response.body, ['a,b,c,d'])
+        self.assertEqual(record['request_bytes'], 7)
+        self.assertEqual(record['response_bytes'], 7)
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['query_params'], 2)
+
+        record, response = self.request('/missing')
+        self.assertEqual(record['status'], 404)
+        self.assertIsNone(record['request_bytes'])
+
+    def test_streamed_bodies_are_counted_as_written(self):
+        record, response = self.request('/stream')
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertEqual(record['response_bytes'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Profiling of outbound requests made with httplib and urllib2.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import BaseHTTPServer
+import os
+import socket
+import threading
+import unittest
+import urllib2
+
+import cherry_pyformance
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = 'hello'
+        self.server.headers.append(self.headers)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'http': {'http_enabled': 'true',
+                                                       'ignored_hosts': '',
+                                                       'read_timeout': '60'},
+                                              'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import cfg, http_profiler, trace_context
+        self.cfg = cfg
+        self.http_profiler = http_profiler
+        self.trace_context = trace_context
+        self.buffer = http_profiler.http_stats_buffer
+        self.buffer.clear()
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        self.server.headers = []
+        self.host = '127.0.0.1:{0}'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,))
+        self.thread.start()
+
+    def tearDown(self):
+        self.trace_context.set_current_trace(None)
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.buffer.clear()
+
+    def get(self, path):
+        response = urllib2.urlopen('http://{0}{1}'.format(self.host, path), timeout=5)
+        try:
+            return response.read()
+        finally:
+            response.close()
+
+    def test_requests_are_recorded(self):
+        self.assertEqual(self.get('/items/123?full=1'), 'hello')
+        record, = self.buffer.values()
+        self.assertEqual((record['host'], record['method'], record['path'], record['status']),
+                         (self.host, 'GET', '/items/{id}', 200))
+        self.assertEqual(record['response_bytes'], 5)
+        self.assertGreater(record['request_bytes'], 0)
+        for timing in ('dns', 'connect', 'ttfb'):
+            self.assertGreaterEqual(record[timing], 0.0)
+        self.assertGreaterEqual(record['duration'], record['ttfb'])
+        self.assertTrue(self.http_profiler.responses_finished(record))
+
+    def test_ignored_hosts_are_not_recorded(self):
+        self.cfg['http']['ignored_hosts'] = 'example.com,' + self.host
+        self.get('/')
+        self.assertEqual(self.buffer, {})
+
+    def test_failed_requests_record_their_error(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        # nothing listens on it
+        sock.close()
+        self.assertRaises(urllib2.URLError, urllib2.urlopen, 'http://127.0.0.1:{0}/'.format(port), timeout=5)
+        record, = self.buffer.values()
+        self.assertEqual(record['error'], 'error')
+        self.assertIsNone(record['status'])
+        self.assertTrue(self.http_profiler.responses_finished(record))
+
+    def test_traced_requests_send_the_trace_on(self):
+        self.trace_context.set_current_trace({'trace_id': 'a' * 32, 'span_id': 'b' * 16, 'parent_span': None})
+        self.get('/')
+        self.assertEqual(self.server.headers[0]['X-CPF-Trace'], 'a' * 32 + ':' + 'b' * 16)
+        record, = self.buffer.values()
+        self.assertEqual((record['trace_id'], record['span_id']), ('a' * 32, 'b' * 16))
+
+
+if __name__ == '__main__':
+    unittest.main()
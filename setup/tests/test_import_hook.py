@@ -0,0 +1,70 @@
+"""
+Wrapping of [functions] targets as their modules are imported.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import cherry_pyformance
+
+
+MODULES = {
+    'cpf_hook_good.py': 'def handle():\n    return 1\n',
+    'cpf_hook_bad.py': ('import cpf_hook_runs\n'
+                        'cpf_hook_runs.count += 1\n'
+                        'import cpf_hook_missing\n'),
+    'cpf_hook_runs.py': 'count = 0\n',
+}
+
+
+class ImportHookTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import function_profiler
+        self.function_profiler = function_profiler
+        function_profiler.install_import_hook(function_profiler.function_targets({'cpf_hook_*': 'handle'}))
+        self.directory = tempfile.mkdtemp()
+        for name, source in MODULES.items():
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write(source)
+        sys.path.insert(0, self.directory)
+
+    def tearDown(self):
+        sys.path.remove(self.directory)
+        shutil.rmtree(self.directory)
+        for name in list(sys.modules):
+            if name.startswith('cpf_hook_'):
+                del sys.modules[name]
+        for module_str, func_str in self.function_profiler.wrapped_functions.keys():
+            self.function_profiler.undecorate_function(module_str, func_str)
+        self.function_profiler.install_import_hook(set())
+
+    def test_targets_are_wrapped_on_import(self):
+        import cpf_hook_good
+        self.assertIn(('cpf_hook_good', 'handle'), self.function_profiler.wrapped_functions)
+        self.assertEqual(cpf_hook_good.handle(), 1)
+
+    def test_import_errors_propagate_after_one_run(self):
+        with self.assertRaises(ImportError) as raised:
+            import cpf_hook_bad
+        self.assertIn('cpf_hook_missing', str(raised.exception))
+        self.assertNotIn('cpf_hook_bad', sys.modules)
+        self.assertEqual(sys.modules['cpf_hook_runs'].count, 1)
+
+    def test_reinstalling_replaces_the_targets(self):
+        self.function_profiler.install_import_hook(set())
+        import cpf_hook_good
+        self.assertNotIn(('cpf_hook_good', 'handle'), self.function_profiler.wrapped_functions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Contention profiling of the threading locks made by configured modules.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import threading
+import time
+import unittest
+
+import cherry_pyformance
+
+
+class LockTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'locks': {'locks_enabled': 'true',
+                                                        'modules': 'test_lock*'},
+                                              'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import lock_profiler
+        self.lock_profiler = lock_profiler
+        lock_profiler._sites.clear()
+        lock_profiler.lock_stats_buffer.clear()
+
+    def tearDown(self):
+        # put the real locks back for the other tests
+        for name, factory in self.lock_profiler._originals.items():
+            setattr(threading, name, factory)
+        self.lock_profiler._originals.clear()
+        self.lock_profiler._sites.clear()
+        self.lock_profiler.lock_stats_buffer.clear()
+
+    def records(self):
+        self.lock_profiler.collect_locks()
+        records = self.lock_profiler.lock_stats_buffer.values()
+        self.lock_profiler.lock_stats_buffer.clear()
+        return records
+
+    def test_waits_are_totalled_per_site(self):
+        lock = threading.Lock()
+        self.assertIsInstance(lock, self.lock_profiler.ProfiledLock)
+        held = threading.Event()
+        def hold():
+            with lock:
+                held.set()
+                time.sleep(0.05)
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        with lock:
+            pass
+        thread.join()
+
+        record, = self.records()
+        self.assertEqual(record['kind'], 'Lock')
+        self.assertTrue(record['site'].startswith(__name__ + ':'))
+        self.assertEqual((record['acquisitions'], record['contended']), (2, 1))
+        self.assertGreaterEqual(record['wait'], 0.03)
+        self.assertGreaterEqual(record['max_hold'], 0.04)
+        caller, contended, wait = record['callers'][0]
+        self.assertTrue(caller.startswith(__name__ + ':'))
+        self.assertEqual((contended, wait), (1, record['wait']))
+
+        # each flush only has what happened since the last
+        self.assertEqual(self.records(), [])
+
+    def test_locks_of_other_modules_are_left_alone(self):
+        namespace = {'__name__': 'app.other', 'threading': threading}
+        exec 'lock = threading.Lock()\nrlock = threading.RLock()' in namespace
+        self.assertNotIsInstance(namespace['lock'], self.lock_profiler.ProfiledLock)
+        self.assertNotIsInstance(namespace['rlock'], self.lock_profiler.ProfiledLock)
+
+    def test_conditions_and_reentrant_holds(self):
+        condition = threading.Condition()
+        ready = []
+        def notify():
+            with condition:
+                ready.append(True)
+                condition.notify()
+        with condition:
+            # held twice, one hold is recorded when it's released for good
+            with condition:
+                threading.Thread(target=notify).start()
+                while not ready:
+                    condition.wait(5)
+        record, = self.records()
+        self.assertEqual(record['kind'], 'Condition')
+        # the waiting thread takes the lock back from the one which notified it
+        self.assertGreaterEqual(record['contended'], 1)
+        self.assertGreaterEqual(record['acquisitions'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
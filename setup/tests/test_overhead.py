@@ -0,0 +1,77 @@
+"""
+Accounting of the time spent in cherry_pyformance's own code.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import time
+import unittest
+
+import cherry_pyformance
+
+
+def handle():
+    return sum(range(1000))
+
+
+class OverheadTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import function_profiler, overhead, stats_flushers
+        self.function_profiler = function_profiler
+        self.overhead = overhead
+        self.stats_flushers = stats_flushers
+        function_profiler.function_stats_buffer.clear()
+        overhead.pop_overhead('function')
+        self.pushed = []
+        stats_flushers.push_stats = self.pushed.append
+
+    def tearDown(self):
+        self.stats_flushers.push_stats = cherry_pyformance.push_stats
+        for module_str, func_str in self.function_profiler.wrapped_functions.keys():
+            self.function_profiler.undecorate_function(module_str, func_str)
+        self.function_profiler.function_stats_buffer.clear()
+
+    def test_totals_are_taken_off_once(self):
+        self.overhead.add_overhead('governor', 0.25, 1.0)
+        self.overhead.add_overhead('governor', 0.25, 1.0, flush=0.5)
+        self.assertEqual(self.overhead.pop_overhead('governor'),
+                         {'calls': 2, 'overhead': 0.5, 'wrapped': 2.0, 'flush': 0.5})
+        self.assertIsNone(self.overhead.pop_overhead('governor'))
+
+    def call(self):
+        """
+        Calls handle and flushes its record once its profile is pickled,
+        returns the overhead reported with it.
+        """
+        handle()
+        buffer = self.function_profiler.function_stats_buffer
+        for i in range(100):
+            if all(isinstance(record['profile'], str) for record in buffer.values()):
+                break
+            time.sleep(0.01)
+        self.stats_flushers._flush_stats(buffer, 'function')
+        return self.pushed[-1]['metadata']['overhead']
+
+    def test_profiled_functions_report_their_overhead_per_flush(self):
+        self.function_profiler.decorate_function(__name__, 'handle')
+        overhead = self.call()
+        self.assertEqual(overhead['calls'], 1)
+        # the estimated cost of cProfile counts as overhead, not as the function's time
+        self.assertGreater(overhead['overhead'], self.overhead.profile_call_cost())
+        self.assertGreaterEqual(overhead['wrapped'], 0.0)
+        self.assertEqual(overhead['flush'], 0.0)
+
+        # the next push reports the calls since, and the time spent on the last flush
+        overhead = self.call()
+        self.assertEqual(len(self.pushed), 2)
+        self.assertEqual(overhead['calls'], 1)
+        self.assertGreater(overhead['flush'], 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
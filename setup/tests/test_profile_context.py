@@ -0,0 +1,78 @@
+"""
+Wrapped functions called inside a profiled call, recorded as spans of its
+profile.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import unittest
+
+import cherry_pyformance
+
+
+def inner():
+    return 1
+
+
+def middle():
+    return inner() + inner()
+
+
+def outer():
+    return middle()
+
+
+class SpanTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import function_profiler, profile_context
+        self.function_profiler = function_profiler
+        self.profile_context = profile_context
+        self.buffer = function_profiler.function_stats_buffer
+        self.buffer.clear()
+        for func_str in ('inner', 'middle', 'outer'):
+            function_profiler.decorate_function(__name__, func_str)
+
+    def tearDown(self):
+        for module_str, func_str in self.function_profiler.wrapped_functions.keys():
+            self.function_profiler.undecorate_function(module_str, func_str)
+        self.buffer.clear()
+
+    def records(self):
+        return dict((function, [record for record in self.buffer.values() if record['function'] == function])
+                    for function in ('inner', 'middle', 'outer'))
+
+    def test_nested_calls_are_spans_of_the_outer_profile(self):
+        self.assertEqual(outer(), 2)
+        self.assertIsNone(self.profile_context.active())
+        records = self.records()
+        record, = records['outer']
+        self.assertEqual([(name, depth) for name, offset, duration, depth in record['spans']],
+                         [(__name__ + '.inner', 1), (__name__ + '.inner', 1), (__name__ + '.middle', 0)])
+        inner_span, second_span, middle_span = record['spans']
+        # offsets are from the start of the outer profile
+        self.assertLessEqual(middle_span[1], inner_span[1])
+        self.assertLessEqual(inner_span[1] + inner_span[2], second_span[1])
+        self.assertGreaterEqual(middle_span[2], inner_span[2] + second_span[2])
+
+        # the nested calls get timing only records of their own
+        self.assertEqual(len(records['inner']), 2)
+        for nested in records['inner'] + records['middle']:
+            self.assertIsNone(nested['profile'])
+            self.assertIn('duration', nested)
+            self.assertNotIn('spans', nested)
+
+    def test_calls_outside_a_profile_are_profiled(self):
+        self.assertEqual(inner(), 1)
+        record, = self.records()['inner']
+        self.assertIsNotNone(record['profile'])
+        self.assertNotIn('spans', record)
+
+
+if __name__ == '__main__':
+    unittest.main()
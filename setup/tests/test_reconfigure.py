@@ -0,0 +1,111 @@
+"""
+Runtime reconfiguration from the stats server and the config file.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import copy
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from StringIO import StringIO
+
+import cherry_pyformance
+
+
+def handle():
+    return 1
+
+
+class ServerConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import cfg, reconfigure, stats_flushers
+        self.cfg = cfg
+        self.reconfigure = reconfigure
+        self.stats_flushers = stats_flushers
+        reconfigure.base_cfg = copy.deepcopy(dict((section, cfg.get(section, {}))
+                                                  for section in reconfigure.RECONFIGURABLE_SECTIONS))
+        cfg['reconfigure']['source'] = 'server'
+        self.server_sections = {}
+        reconfigure.urlopen = lambda address, timeout: StringIO(json.dumps(self.server_sections))
+        self.pushed = []
+        stats_flushers.push_stats = self.pushed.append
+
+    def tearDown(self):
+        from urllib2 import urlopen
+        self.reconfigure.urlopen = urlopen
+        self.stats_flushers.push_stats = cherry_pyformance.push_stats
+        from cherry_pyformance import function_profiler
+        for module_str, func_str in function_profiler.wrapped_functions.keys():
+            function_profiler.undecorate_function(module_str, func_str)
+
+    def test_partial_section_keeps_base_values(self):
+        self.server_sections = {'sql': {'sql_enabled': 'false'}}
+        self.reconfigure.poll_config()
+        self.assertEqual(self.cfg['sql']['sql_enabled'], 'false')
+        self.assertEqual(self.cfg['sql']['database'], 'sqlite')
+
+        # flushing carries on after the new config is applied
+        from cherry_pyformance.subprocess_profiler import subprocess_stats_buffer
+        record = {'command': 'true', 'exit_code': 0}
+        subprocess_stats_buffer[id(record)] = record
+        self.stats_flushers.flush_stats()
+        self.assertEqual([package['stats'] for package in self.pushed if package['type'] == 'subprocess'],
+                         [[record]])
+
+    def test_functions_are_wrapped_and_unwrapped(self):
+        import sys
+        module = sys.modules[__name__]
+        self.server_sections = {'functions': {__name__: 'handle'}}
+        self.reconfigure.poll_config()
+        self.assertTrue(hasattr(module.handle, '_cpf_wrapped'))
+
+        self.server_sections = {}
+        self.reconfigure.poll_config()
+        self.assertFalse(hasattr(module.handle, '_cpf_wrapped'))
+
+
+class FileConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'config.cfg')
+        default = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        shutil.copyfile(default, self.path)
+        cherry_pyformance.initialise(self.path, {'handlers': {},
+                                                 'ignored_handlers': {},
+                                                 'functions': {}})
+        from cherry_pyformance import cfg, reconfigure
+        self.cfg = cfg
+        self.reconfigure = reconfigure
+        reconfigure._config_mtime[0] = None
+        cfg['reconfigure']['source'] = 'file'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_changed_file_is_applied(self):
+        # the first poll only notes the file's mtime
+        self.reconfigure.poll_config()
+        self.assertEqual(self.cfg['governor']['sample_rate'], '10')
+
+        with open(self.path) as f:
+            source = f.read()
+        with open(self.path, 'w') as f:
+            f.write(source.replace('sample_rate = 10', 'sample_rate = 4'))
+        later = time.time() + 5
+        os.utime(self.path, (later, later))
+        self.reconfigure.poll_config()
+        self.assertEqual(self.cfg['governor']['sample_rate'], '4')
+
+
+if __name__ == '__main__':
+    unittest.main()
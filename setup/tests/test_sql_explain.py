@@ -0,0 +1,137 @@
+"""
+EXPLAIN plans of slow statements, taken at flush on a side connection.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import cherry_pyformance
+
+
+class Connection(object):
+    """
+    Stands in for a wrapped connection.
+    """
+    _cpf_database = 'sqlite'
+    _cpf_target = 'stats.db'
+    _cpf_reconnect = None
+
+
+class SideConnection(object):
+
+    closed = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ExplainTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import cfg, sql_explain, sql_profiler, stats_flushers
+        self.sql_explain = sql_explain
+        self.sql_profiler = sql_profiler
+        self.stats_flushers = stats_flushers
+        cfg['sql'].update({'sql_enabled': 'true',
+                           'database': 'sqlite',
+                           'explain_threshold': '0.1',
+                           'explain_interval': '300'})
+        sql_explain._explained.clear()
+        sql_profiler.sql_stats_buffer.clear()
+        self.pushed = []
+        stats_flushers.push_stats = self.pushed.append
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.stats_flushers.push_stats = cherry_pyformance.push_stats
+        for key in self.sql_explain._side.keys():
+            self.sql_explain.drop_side_connection(*key)
+        self.sql_profiler.sql_stats_buffer.clear()
+        shutil.rmtree(self.directory)
+
+    def test_threshold_is_wall_time(self):
+        connection = Connection()
+        connection._cpf_reconnect = SideConnection
+        # waiting on the database takes next to no clock time
+        record = {'duration': 0.0001, '_wall_duration': 0.5, 'sql_string': 'SELECT * FROM t'}
+        self.assertTrue(self.sql_explain.should_explain(connection, record))
+        record = {'duration': 0.5, '_wall_duration': 0.01, 'sql_string': 'SELECT * FROM u'}
+        self.assertFalse(self.sql_explain.should_explain(connection, record))
+
+    def test_statements_are_explained_at_flush(self):
+        path = os.path.join(self.directory, 'stats.db')
+        connection = self.sql_profiler.SqliteConnectionFactory(sqlite3.connect)(path)
+        connection.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)')
+        connection.executemany('INSERT INTO t (name) VALUES (?)', [('name',)] * 2000)
+        connection.commit()
+
+        cherry_pyformance.cfg['sql']['explain_threshold'] = '0.000001'
+        cursor = connection.cursor()
+        cursor.execute('SELECT count(*) FROM t a, t b WHERE a.id < b.id AND a.name = ?', ('name',))
+        cursor.fetchall()
+        records = [record for record in self.sql_profiler.sql_stats_buffer.values()
+                   if record['sql_string'].startswith('SELECT count(*)')]
+        self.assertEqual(len(records), 1)
+        # nothing is explained on the thread which ran the statement
+        self.assertNotIn('plan', records[0])
+
+        self.stats_flushers.flush_stats()
+        pushed = [record for package in self.pushed if package['type'] == 'database'
+                  for record in package['stats'] if record['sql_string'].startswith('SELECT count(*)')]
+        self.assertEqual(len(pushed), 1)
+        self.assertEqual(len(json.loads(pushed[0]['plan'])), 2)
+        self.assertNotIn('_explaining', pushed[0])
+        self.assertNotIn('_wall_duration', pushed[0])
+        connection.close()
+
+    def test_queued_records_wait_for_their_plan(self):
+        connection = Connection()
+        record = {'sql_string': 'SELECT 1'}
+        self.sql_explain.queue_explain(connection, record, ())
+        self.assertFalse(self.sql_explain.explained(record))
+        self.sql_explain.explain_queued()
+        self.assertTrue(self.sql_explain.explained(record))
+
+    def test_queue_is_bounded(self):
+        connection = Connection()
+        records = [{'sql_string': 'SELECT 1'} for i in range(self.sql_explain.MAX_QUEUED + 5)]
+        for record in records:
+            self.sql_explain.queue_explain(connection, record, ())
+        self.assertEqual(len([record for record in records if not self.sql_explain.explained(record)]),
+                         self.sql_explain.MAX_QUEUED)
+        self.sql_explain.explain_queued()
+
+    def test_side_connections_are_bounded(self):
+        sides = []
+        def reconnect():
+            sides.append(SideConnection())
+            return sides[-1]
+        for target in range(self.sql_explain.MAX_SIDE_CONNECTIONS + 2):
+            self.sql_explain.side_connection('sqlite', target, reconnect)
+        # reusing a connection doesn't make a new one
+        self.sql_explain.side_connection('sqlite', 2, reconnect)
+        self.assertEqual(len(sides), self.sql_explain.MAX_SIDE_CONNECTIONS + 2)
+        self.assertEqual([side.closed for side in sides], [True, True, False, False, False, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+"""
+Profiling of statements, fetches and transactions on wrapped DB-API
+connections.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import sys
+import types
+import unittest
+
+import cherry_pyformance
+
+
+class SqlTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import cfg, deep_capture, sql_profiler, stats_flushers
+        self.cfg = cfg
+        self.deep_capture = deep_capture
+        self.sql_profiler = sql_profiler
+        self.stats_flushers = stats_flushers
+        cfg['sql'].update({'sql_enabled': 'true', 'database': 'sqlite'})
+        sql_profiler.sql_stats_buffer.clear()
+        sql_profiler.transaction_stats_buffer.clear()
+        self.pushed = []
+        stats_flushers.push_stats = self.pushed.append
+        # every statement of a captured request is recorded, however quick
+        deep_capture.set_current_capture({'deep_capture': '1'})
+        self.connection = sql_profiler.SqliteConnectionFactory(sqlite3.connect)(':memory:')
+        self.connection.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)')
+        self.connection.executemany('INSERT INTO t (name) VALUES (?)', [('a',), ('b',), ('c',)])
+
+    def tearDown(self):
+        self.deep_capture.set_current_capture(None)
+        self.stats_flushers.push_stats = cherry_pyformance.push_stats
+        self.connection.close()
+        self.sql_profiler.sql_stats_buffer.clear()
+        self.sql_profiler.transaction_stats_buffer.clear()
+
+    def record(self, sql):
+        record, = [record for record in self.sql_profiler.sql_stats_buffer.values() if record['sql_string'] == sql]
+        return record
+
+    def test_executemany_records_its_batch(self):
+        record = self.record('INSERT INTO t (name) VALUES (?)')
+        self.assertEqual(record['batch_size'], 3)
+        self.assertEqual(record['rowcount'], 3)
+        self.assertTrue(self.sql_profiler.fetches_finished(record))
+        self.stats_flushers._flush_stats(self.sql_profiler.sql_stats_buffer, 'database')
+        pushed = [record for package in self.pushed for record in package['stats']
+                  if record['sql_string'] == 'INSERT INTO t (name) VALUES (?)']
+        self.assertEqual(pushed[0]['args'], [['0', "('a',)"], ['1', "('b',)"], ['2', "('c',)"]])
+
+    def test_rows_are_counted_as_they_are_fetched(self):
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT name FROM t WHERE id > ?', (0,))
+        record = self.record('SELECT name FROM t WHERE id > ?')
+        # held back from the flush until the rows have been fetched
+        self.assertFalse(self.sql_profiler.fetches_finished(record))
+        self.stats_flushers._flush_stats(self.sql_profiler.sql_stats_buffer, 'database')
+        self.assertIn(id(record), self.sql_profiler.sql_stats_buffer)
+
+        self.assertEqual(cursor.fetchone(), ('a',))
+        self.assertEqual(cursor.fetchmany(5), [('b',), ('c',)])
+        self.assertEqual(record['rows_fetched'], 3)
+        self.assertFalse(self.sql_profiler.fetches_finished(record))
+        self.assertEqual(cursor.fetchmany(5), [])
+        self.assertTrue(self.sql_profiler.fetches_finished(record))
+
+    def test_iterated_rows_are_counted(self):
+        rows = list(self.connection.execute('SELECT name FROM t'))
+        self.assertEqual(len(rows), 3)
+        record = self.record('SELECT name FROM t')
+        self.assertEqual(record['rows_fetched'], 3)
+        self.assertTrue(self.sql_profiler.fetches_finished(record))
+
+    def test_a_new_statement_ends_the_fetches_of_the_last(self):
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT name FROM t')
+        cursor.fetchone()
+        cursor.execute('SELECT id FROM t')
+        record = self.record('SELECT name FROM t')
+        self.assertEqual(record['rows_fetched'], 1)
+        self.assertTrue(self.sql_profiler.fetches_finished(record))
+
+
+class TransactionTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import cfg, sql_profiler
+        self.sql_profiler = sql_profiler
+        cfg['sql'].update({'sql_enabled': 'true', 'database': 'sqlite', 'transactions_enabled': 'true'})
+        sql_profiler.sql_stats_buffer.clear()
+        self.buffer = sql_profiler.transaction_stats_buffer
+        self.buffer.clear()
+        self.connection = sql_profiler.SqliteConnectionFactory(sqlite3.connect)(':memory:')
+
+    def tearDown(self):
+        self.connection.close()
+        self.sql_profiler.sql_stats_buffer.clear()
+        self.buffer.clear()
+
+    def events(self):
+        return sorted((record['datetime'], record) for record in self.buffer.values())
+
+    def test_connect_and_transactions_are_timed(self):
+        connect, = [record for datetime, record in self.events()]
+        self.assertEqual((connect['event'], connect['database'], connect['target']),
+                         ('connect', 'sqlite', ':memory:'))
+        self.buffer.clear()
+
+        self.connection.execute('CREATE TABLE t (id INTEGER PRIMARY KEY)')
+        self.connection.execute('INSERT INTO t VALUES (1)')
+        self.connection.commit()
+        commit, = [record for datetime, record in self.events()]
+        self.assertEqual((commit['event'], commit['statements']), ('commit', 2))
+        self.assertGreaterEqual(commit['transaction_duration'], commit['duration'])
+
+        # nothing was run since, so there is no transaction to end
+        self.connection.commit()
+        self.assertEqual(len(self.buffer), 1)
+
+    def test_with_block_rolls_back_on_error(self):
+        self.buffer.clear()
+        try:
+            with self.connection:
+                self.connection.execute('CREATE TABLE u (id INTEGER PRIMARY KEY)')
+                raise ValueError()
+        except ValueError:
+            pass
+        rollback, = [record for datetime, record in self.events()]
+        self.assertEqual((rollback['event'], rollback['statements']), ('rollback', 1))
+
+
+class DriverTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import cfg, deep_capture, sql_profiler, stats_flushers
+        self.deep_capture = deep_capture
+        self.sql_profiler = sql_profiler
+        self.stats_flushers = stats_flushers
+        cfg['sql'].update({'sql_enabled': 'true', 'database': 'cpf_testdb'})
+        sql_profiler.sql_stats_buffer.clear()
+        self.pushed = []
+        stats_flushers.push_stats = self.pushed.append
+        deep_capture.set_current_capture({'deep_capture': '1'})
+        # a driver which isn't registered, with sqlite underneath
+        self.module = types.ModuleType('cpf_testdb')
+        self.module.paramstyle = 'named'
+        self.module.connect = lambda host, database, password: sqlite3.connect(':memory:')
+        sys.modules['cpf_testdb'] = self.module
+
+    def tearDown(self):
+        del sys.modules['cpf_testdb']
+        self.deep_capture.set_current_capture(None)
+        self.stats_flushers.push_stats = cherry_pyformance.push_stats
+        self.sql_profiler.sql_stats_buffer.clear()
+
+    def test_unregistered_drivers_are_wrapped_by_module_name(self):
+        self.sql_profiler.decorate_connections()
+        factory = self.module.connect
+        self.assertIsInstance(factory, self.sql_profiler.DbapiConnectionFactory)
+        # wrapping again leaves it alone
+        self.sql_profiler.decorate_connections()
+        self.assertIs(self.module.connect, factory)
+
+        connection = self.module.connect(host='db1', database='app', password='secret')
+        self.assertEqual(connection._cpf_target, 'db1/app')
+        cursor = connection.cursor()
+        cursor.execute('SELECT :a, :b', {'b': 2, 'a': 1})
+        self.assertEqual(cursor.fetchall(), [(1, 2)])
+        connection.close()
+
+        self.stats_flushers._flush_stats(self.sql_profiler.sql_stats_buffer, 'database')
+        record, = [record for package in self.pushed for record in package['stats']]
+        self.assertEqual(record['paramstyle'], 'named')
+        self.assertEqual(record['args'], [['a', '1'], ['b', '2']])
+
+    def test_sequence_args_are_keyed_by_placeholder(self):
+        arg_pairs = self.sql_profiler.arg_pairs
+        self.assertEqual(arg_pairs((1, 'x'), 'qmark'), [['?', '1'], ['?', 'x']])
+        self.assertEqual(arg_pairs((1, 'x'), 'numeric'), [[':1', '1'], [':2', 'x']])
+        self.assertEqual(arg_pairs((1, 'x'), 'format'), [['%s', '1'], ['%s', 'x']])
+        self.assertEqual(arg_pairs([(1,), (2,)], 'format', True), [['0', '(1,)'], ['1', '(2,)']])
+
+    def test_connect_targets_never_hold_passwords(self):
+        connect_target = self.sql_profiler.connect_target
+        self.assertEqual(connect_target(('scott/tiger@dbhost:1521/orcl',), {}), 'dbhost:1521/orcl')
+        self.assertEqual(connect_target((), {'host': 'h', 'db': 'd', 'passwd': 'p'}), 'h/d')
+
+
+if __name__ == '__main__':
+    unittest.main()
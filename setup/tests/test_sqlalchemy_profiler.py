@@ -0,0 +1,68 @@
+"""
+SQL profiling through sqlalchemy's engine events.
+
+Run from the setup directory, with cherrypy and sqlalchemy importable:
+    python -m unittest discover tests
+"""
+import os
+import time
+import unittest
+
+import cherry_pyformance
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+
+
+class SqlalchemyTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import cfg, sqlalchemy_profiler, sql_profiler
+        cfg['sql'].update({'sql_enabled': 'true', 'backend': 'sqlalchemy'})
+        self.buffer = sql_profiler.sql_stats_buffer
+        self.buffer.clear()
+        sqlalchemy_profiler.listen_engines()
+        self.engine = create_engine('sqlite://')
+
+        @event.listens_for(self.engine, 'connect')
+        def connect(dbapi_connection, connection_record):
+            dbapi_connection.create_function('pause', 1, time.sleep)
+
+        self.connection = self.engine.connect()
+
+    def tearDown(self):
+        self.connection.close()
+        self.buffer.clear()
+
+    def records(self, sql):
+        return [record for record in self.buffer.values() if record['sql_string'] == sql]
+
+    def test_statements_are_recorded(self):
+        self.connection.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)')
+        self.connection.execute('INSERT INTO t (name) VALUES (?)', [('a',), ('b',)])
+        record, = self.records('INSERT INTO t (name) VALUES (?)')
+        self.assertEqual(record['paramstyle'], 'qmark')
+        self.assertEqual(record['batch_size'], 2)
+
+    def test_duration_is_wall_time(self):
+        # sleeping takes no clock time
+        self.connection.execute('SELECT pause(0.05)').fetchall()
+        record, = self.records('SELECT pause(0.05)')
+        self.assertGreaterEqual(record['duration'], 0.05)
+
+    def test_failed_statements_leave_nothing_behind(self):
+        for i in range(3):
+            self.assertRaises(OperationalError, self.connection.execute, 'SELECT * FROM missing')
+        self.assertEqual(self.connection.info.get('_cpf_statements', []), [])
+        start = time.time()
+        self.connection.execute('SELECT 1').fetchall()
+        record, = self.records('SELECT 1')
+        self.assertLessEqual(record['duration'], time.time() - start)
+
+
+if __name__ == '__main__':
+    unittest.main()
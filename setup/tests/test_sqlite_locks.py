@@ -0,0 +1,90 @@
+"""
+Lock waits of statements on sqlite databases locked by another connection.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import cherry_pyformance
+
+
+class SqliteLockTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import cfg, sql_profiler
+        self.sql_profiler = sql_profiler
+        cfg['sql'].update({'sql_enabled': 'true', 'database': 'sqlite', 'sqlite_locks_enabled': 'true'})
+        sql_profiler.sql_stats_buffer.clear()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'locks.db')
+        # the other connection, which holds the lock
+        self.other = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.other.execute('CREATE TABLE t (id INTEGER PRIMARY KEY)')
+
+    def tearDown(self):
+        self.other.close()
+        self.sql_profiler.sql_stats_buffer.clear()
+        shutil.rmtree(self.directory)
+
+    def connect(self, timeout):
+        return self.sql_profiler.SqliteConnectionFactory(sqlite3.connect)(self.path, timeout)
+
+    def release_after(self, delay):
+        timer = threading.Timer(delay, self.other.execute, ('COMMIT',))
+        timer.start()
+        return timer
+
+    def record(self, sql):
+        record, = [record for record in self.sql_profiler.sql_stats_buffer.values() if record['sql_string'] == sql]
+        return record
+
+    def test_statements_wait_for_the_lock(self):
+        connection = self.connect(2.0)
+        self.other.execute('BEGIN EXCLUSIVE')
+        self.release_after(0.05)
+        self.assertEqual(connection.execute('SELECT count(*) FROM t').fetchall(), [(0,)])
+        record = self.record('SELECT count(*) FROM t')
+        self.assertGreater(record['lock_retries'], 0)
+        self.assertGreaterEqual(record['lock_wait'], 0.04)
+        self.assertFalse(record['lock_timeout'])
+        connection.close()
+
+    def test_statements_give_up_after_the_timeout(self):
+        connection = self.connect(0.05)
+        self.other.execute('BEGIN EXCLUSIVE')
+        try:
+            with self.assertRaises(sqlite3.OperationalError):
+                connection.execute('SELECT count(*) FROM t')
+        finally:
+            self.other.execute('COMMIT')
+        record = self.record('SELECT count(*) FROM t')
+        self.assertTrue(record['lock_timeout'])
+        self.assertGreaterEqual(record['lock_wait'], 0.04)
+        connection.close()
+
+    def test_commits_which_wait_are_recorded(self):
+        connection = self.connect(2.0)
+        connection.execute('INSERT INTO t VALUES (1)')
+        # a reader stops the commit taking its exclusive lock
+        self.other.execute('BEGIN')
+        self.other.execute('SELECT * FROM t').fetchall()
+        self.release_after(0.05)
+        connection.commit()
+        record = self.record('COMMIT')
+        self.assertGreater(record['lock_retries'], 0)
+        self.assertGreaterEqual(record['duration'], 0.04)
+        connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
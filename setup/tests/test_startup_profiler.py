@@ -0,0 +1,91 @@
+"""
+Timing of the imports made while the application starts up.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import cherry_pyformance
+
+
+MODULES = {
+    'cpf_startup_parent.py': 'import cpf_startup_child\n\ndef handle():\n    return 1\n',
+    'cpf_startup_child.py': 'value = 1\n',
+    'cpf_startup_bad.py': ('import cpf_startup_runs\n'
+                           'cpf_startup_runs.count += 1\n'
+                           'import cpf_startup_missing\n'),
+    'cpf_startup_runs.py': 'count = 0\n',
+}
+
+
+class StartupImportTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import function_profiler, startup_profiler
+        self.function_profiler = function_profiler
+        self.startup_profiler = startup_profiler
+        startup_profiler.startup_stats_buffer.clear()
+        self.directory = tempfile.mkdtemp()
+        for name, source in MODULES.items():
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write(source)
+        sys.path.insert(0, self.directory)
+        startup_profiler.install()
+
+    def tearDown(self):
+        self.startup_profiler.uninstall()
+        sys.path.remove(self.directory)
+        shutil.rmtree(self.directory)
+        for name in list(sys.modules):
+            if name.startswith('cpf_startup_'):
+                del sys.modules[name]
+        for module_str, func_str in self.function_profiler.wrapped_functions.keys():
+            self.function_profiler.undecorate_function(module_str, func_str)
+        self.function_profiler.install_import_hook(set())
+        self.startup_profiler.startup_stats_buffer.clear()
+
+    def records(self):
+        return dict((record['module'], record)
+                    for record in self.startup_profiler.startup_stats_buffer.values()
+                    if record['module'].startswith('cpf_startup_'))
+
+    def test_nested_imports_are_timed_in_their_parent(self):
+        import cpf_startup_parent
+        records = self.records()
+        self.assertEqual(sorted(records), ['cpf_startup_child', 'cpf_startup_parent'])
+        child = records['cpf_startup_child']
+        self.assertEqual(child['parent'], 'cpf_startup_parent')
+        self.assertEqual(child['chain'], 'cpf_startup_parent > cpf_startup_child')
+        self.assertEqual(child['depth'], 1)
+        parent = records['cpf_startup_parent']
+        self.assertIsNone(parent['parent'])
+        self.assertGreaterEqual(parent['duration'], child['duration'])
+        self.assertLessEqual(parent['exec_duration'], parent['duration'] - child['duration'] + 1e-6)
+
+    def test_import_errors_propagate_after_one_run(self):
+        with self.assertRaises(ImportError) as raised:
+            import cpf_startup_bad
+        self.assertIn('cpf_startup_missing', str(raised.exception))
+        self.assertNotIn('cpf_startup_bad', sys.modules)
+        self.assertEqual(sys.modules['cpf_startup_runs'].count, 1)
+        self.assertNotIn('cpf_startup_bad', self.records())
+
+    def test_modules_the_function_hook_loads_are_timed_and_wrapped(self):
+        self.function_profiler.install_import_hook(
+            self.function_profiler.function_targets({'cpf_startup_parent': 'handle'}))
+        import cpf_startup_parent
+        self.assertIn(('cpf_startup_parent', 'handle'), self.function_profiler.wrapped_functions)
+        self.assertEqual(sorted(self.records()), ['cpf_startup_child', 'cpf_startup_parent'])
+
+
+if __name__ == '__main__':
+    unittest.main()
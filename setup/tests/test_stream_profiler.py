@@ -0,0 +1,84 @@
+"""
+Profiling of wrapped functions which return generators.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import time
+import unittest
+
+import cherry_pyformance
+
+
+def chunks(count, delay):
+    for i in range(count):
+        time.sleep(delay)
+        yield 'ab'
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import function_profiler, governor
+        self.function_profiler = function_profiler
+        self.governor = governor
+        self.buffer = function_profiler.function_stats_buffer
+        self.buffer.clear()
+        governor.levels.clear()
+        function_profiler.decorate_function(__name__, 'chunks')
+
+    def tearDown(self):
+        for module_str, func_str in self.function_profiler.wrapped_functions.keys():
+            self.function_profiler.undecorate_function(module_str, func_str)
+        self.governor.levels.clear()
+        self.buffer.clear()
+
+    def record(self):
+        record, = self.buffer.values()
+        return record
+
+    def wait_for_profile(self, record):
+        for i in range(100):
+            if isinstance(record['profile'], str):
+                return
+            time.sleep(0.01)
+        self.fail('the profile was not pickled')
+
+    def test_generators_are_profiled_as_they_are_iterated(self):
+        stream = chunks(3, 0.01)
+        record = self.record()
+        self.assertNotIn('stream_duration', record)
+        self.assertEqual(list(stream), ['ab', 'ab', 'ab'])
+        self.assertEqual(record['stream_bytes'], 6)
+        self.assertGreaterEqual(record['first_chunk'], 0.01)
+        self.assertGreaterEqual(record['stream_duration'], 0.03)
+        self.wait_for_profile(record)
+
+    def test_abandoned_generators_finish_their_record(self):
+        stream = chunks(3, 0)
+        next(stream)
+        record = self.record()
+        del stream
+        self.assertEqual(record['stream_bytes'], 2)
+        self.assertIn('stream_duration', record)
+        self.wait_for_profile(record)
+
+    def test_timed_generators_get_their_duration_once_exhausted(self):
+        self.governor.levels[('function', __name__ + '.chunks')] = self.governor.TIMING
+        stream = chunks(2, 0.01)
+        record = self.record()
+        self.assertIsNone(record['profile'])
+        # not ready to flush until it has been iterated
+        self.assertNotIn('duration', record)
+        list(stream)
+        self.assertGreaterEqual(record['duration'], 0.02)
+        self.assertEqual(record['stream_bytes'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
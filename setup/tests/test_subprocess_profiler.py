@@ -0,0 +1,84 @@
+"""
+Profiling of child processes started with subprocess and os.system.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import subprocess
+import sys
+import unittest
+
+import cherry_pyformance
+
+
+class SubprocessTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'subprocess': {'subprocess_enabled': 'true'},
+                                              'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import cfg, subprocess_profiler
+        self.cfg = cfg
+        self.subprocess_profiler = subprocess_profiler
+        self.buffer = subprocess_profiler.subprocess_stats_buffer
+        self.buffer.clear()
+
+    def tearDown(self):
+        # put subprocess and os.system back for the other tests
+        originals = self.subprocess_profiler._originals
+        os.system = originals.pop('system')
+        for name, method in originals.items():
+            setattr(subprocess.Popen, name, method)
+        originals.clear()
+        self.buffer.clear()
+
+    def record(self):
+        record, = self.buffer.values()
+        return record
+
+    def test_popen_children_are_recorded_when_reaped(self):
+        process = subprocess.Popen([sys.executable, '-c', 'sum(range(100000)); raise SystemExit(3)'])
+        self.assertEqual(self.buffer, {})
+        self.assertEqual(process.wait(), 3)
+        record = self.record()
+        self.assertEqual(record['command'], os.path.basename(sys.executable))
+        self.assertEqual(record['exit_code'], 3)
+        self.assertGreater(record['duration'], 0.0)
+        self.assertGreater(record['cpu'], 0.0)
+        self.assertGreater(record['max_rss'], 0)
+        # waiting again doesn't record it twice
+        process.wait()
+        self.assertEqual(len(self.buffer), 1)
+
+    def test_killed_children_have_the_signal_as_exit_code(self):
+        process = subprocess.Popen(['sleep', '5'])
+        process.kill()
+        process.wait()
+        self.assertEqual(self.record()['exit_code'], -9)
+
+    def test_children_which_cant_start_record_their_error(self):
+        self.assertRaises(OSError, subprocess.call, ['cpf-no-such-program'])
+        record = self.record()
+        self.assertEqual(record['command'], 'cpf-no-such-program')
+        self.assertIsNone(record['exit_code'])
+        self.assertEqual(record['error'], 'OSError')
+
+    def test_system(self):
+        self.assertNotEqual(os.system('CPF_TEST=1 sleep 0.05; exit 2'), 0)
+        record = self.record()
+        self.assertEqual((record['command'], record['exit_code']), ('sleep', 2))
+        self.assertGreaterEqual(record['duration'], 0.05)
+        self.assertIsNone(record['max_rss'])
+
+    def test_nothing_is_recorded_when_off(self):
+        self.cfg['subprocess']['subprocess_enabled'] = 'false'
+        subprocess.call(['true'])
+        os.system('true')
+        self.assertEqual(self.buffer, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
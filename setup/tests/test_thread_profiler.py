@@ -0,0 +1,102 @@
+"""
+Profiling of threads started during a profiled function.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+import cherry_pyformance
+
+
+def work():
+    return sum(range(100))
+
+
+def spawn(target, join):
+    thread = threading.Thread(target=target, name='cpf-worker')
+    thread.start()
+    if join:
+        thread.join()
+    return thread
+
+
+class ThreadProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'threads': {'profile_threads': 'true',
+                                                          'thread_timeout': '60'},
+                                              'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import cfg, function_profiler, stats_flushers, thread_profiler
+        self.cfg = cfg
+        self.function_profiler = function_profiler
+        self.stats_flushers = stats_flushers
+        self.thread_profiler = thread_profiler
+        self.buffer = function_profiler.function_stats_buffer
+        self.buffer.clear()
+        self.pushed = []
+        stats_flushers.push_stats = self.pushed.append
+        function_profiler.decorate_function(__name__, 'spawn')
+
+    def tearDown(self):
+        self.thread_profiler.unhook_threads()
+        self.stats_flushers.push_stats = cherry_pyformance.push_stats
+        for module_str, func_str in self.function_profiler.wrapped_functions.keys():
+            self.function_profiler.undecorate_function(module_str, func_str)
+        self.buffer.clear()
+
+    def record(self):
+        """
+        Returns the record of spawn once its profile has been pickled.
+        """
+        for i in range(100):
+            records = [record for record in self.buffer.values() if record['function'] == 'spawn']
+            if records and isinstance(records[0]['profile'], str):
+                return records[0]
+            time.sleep(0.01)
+        self.fail('spawn was not profiled')
+
+    def flush(self):
+        self.stats_flushers._flush_stats(self.buffer, 'function')
+        return [record for package in self.pushed for record in package['stats']
+                if record['function'] == 'spawn']
+
+    def test_threads_finished_in_time_are_added(self):
+        spawn(work, True)
+        self.record()
+        pushed, = self.flush()
+        thread, = pushed['threads']
+        self.assertEqual(thread['name'], 'cpf-worker')
+        self.assertIsInstance(thread['profile'], str)
+        self.assertNotIn('_threads', pushed)
+
+    def test_threads_still_running_at_push_stop_being_profiled(self):
+        self.cfg['threads']['thread_timeout'] = '0'
+        go = threading.Event()
+        seen = []
+        def worker():
+            go.wait()
+            work()
+            seen.append((sys.getprofile(), self.thread_profiler.profile_context.active()))
+        thread = spawn(worker, False)
+        record = self.record()
+        time.sleep(0.01)
+        pushed, = self.flush()
+        self.assertIs(pushed, record)
+
+        go.set()
+        thread.join()
+        self.assertEqual(seen, [(None, None)])
+        self.assertNotIn('threads', record)
+        self.assertNotIn('_threads', record)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Trace and span ids on the records made while a traced request is handled.
+
+Run from the setup directory, with cherrypy importable:
+    python -m unittest discover tests
+"""
+import os
+import time
+import unittest
+from StringIO import StringIO
+
+import cherrypy
+from cherrypy.lib import httputil
+
+import cherry_pyformance
+
+
+class Root(object):
+
+    @cherrypy.expose
+    def index(self):
+        from cherry_pyformance import sql_profiler
+        sql_profiler.add_statement('SELECT 1', (), time.time(), 0.001, None)
+        return 'ok'
+
+
+class TraceTest(unittest.TestCase):
+
+    def setUp(self):
+        config = os.path.join(os.path.dirname(cherry_pyformance.__file__), 'default_config.cfg')
+        cherry_pyformance.initialise(config, {'trace': {'trace_enabled': 'true',
+                                                        'trace_header': ''},
+                                              'handlers': {},
+                                              'ignored_handlers': {},
+                                              'functions': {}})
+        from cherry_pyformance import handler_profiler, sql_profiler, trace_context
+        self.trace_context = trace_context
+        self.handler_buffer = handler_profiler.handler_stats_buffer
+        self.sql_buffer = sql_profiler.sql_stats_buffer
+        self.handler_buffer.clear()
+        self.sql_buffer.clear()
+        cherrypy.tools.stats = handler_profiler.StatsTool()
+        self.app = cherrypy.Application(Root(), '/core', {'/': {'tools.stats.on': True}})
+
+    def tearDown(self):
+        self.handler_buffer.clear()
+        self.sql_buffer.clear()
+
+    def get(self, headers=()):
+        """
+        Runs a request to the app without a server and returns the trace
+        header sent back.
+        """
+        local = httputil.Host('127.0.0.1', 8080, '')
+        remote = httputil.Host('127.0.0.1', 50000, '')
+        request, response = self.app.get_serving(local, remote, 'http', 'HTTP/1.1')
+        try:
+            request.run('GET', '/core/', '', 'HTTP/1.1', [('Host', '127.0.0.1')] + list(headers), StringIO(''))
+            response.collapse_body()
+            self.assertEqual(response.output_status, '200 OK')
+            return response.headers['X-CPF-Trace']
+        finally:
+            self.app.release_serving()
+
+    def test_start_span(self):
+        trace = self.trace_context.start_span('ABCDEFABCDEFABCDEFABCDEFABCDEF12:0123456789abcdef')
+        self.assertEqual(trace['trace_id'], 'abcdefabcdefabcdefabcdefabcdef12')
+        self.assertEqual(trace['parent_span'], '0123456789abcdef')
+        self.assertNotEqual(trace['span_id'], trace['parent_span'])
+        for header in (None, '', 'abc:def', 'abcdefabcdefabcdef:0123456789abcdef:1'):
+            trace = self.trace_context.start_span(header)
+            self.assertEqual(len(trace['trace_id']), 32)
+            self.assertIsNone(trace['parent_span'])
+
+    def test_records_carry_ids_not_metadata(self):
+        header = self.get([('X-CPF-Trace', 'abcdefabcdefabcdefabcdefabcdef12:0123456789abcdef')])
+        trace_id, span_id = header.split(':')
+        self.assertEqual(trace_id, 'abcdefabcdefabcdefabcdefabcdef12')
+
+        handler, = self.handler_buffer.values()
+        self.assertEqual((handler['trace_id'], handler['span_id'], handler['parent_span']),
+                         (trace_id, span_id, '0123456789abcdef'))
+        statement, = self.sql_buffer.values()
+        self.assertEqual((statement['trace_id'], statement['span_id']), (trace_id, span_id))
+        self.assertNotIn('parent_span', statement)
+        for record in (handler, statement):
+            self.assertFalse(set(record.get('metadata', {})) & set(['trace_id', 'span_id', 'parent_span']))
+        self.assertIsNone(self.trace_context.current_trace())
+
+    def test_new_traces_have_no_parent(self):
+        trace_id, span_id = self.get().split(':')
+        handler, = self.handler_buffer.values()
+        self.assertEqual((handler['trace_id'], handler['span_id']), (trace_id, span_id))
+        self.assertNotIn('parent_span', handler)
+
+
+if __name__ == '__main__':
+    unittest.main()